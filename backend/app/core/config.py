@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -12,6 +12,39 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: str = "admin@bookapp.com"
     ADMIN_PASSWORD: str = "admin123"
     
+    # Most users one /api/recommend/batch job may process; larger runs
+    # resume from the returned next_cursor
+    BATCH_RECOMMENDATION_MAX_USERS: int = 5000
+    
+    # Recommender serving: when set, workers memory-map one shared copy of
+    # the model arrays published under this directory
+    SHARED_MODEL_DIR: Optional[str] = None
+    SHARED_MODEL_CHECK_SECONDS: int = 30
+    
+    # Mood index search mode: None for a vectorized scan, or "kd_tree" /
+    # "ball_tree" for exact tree search over unfiltered and per-country queries;
+    # any other value fails at startup
+    MOOD_INDEX_TREE: Optional[Literal["kd_tree", "ball_tree"]] = None
+    
+    # Outbound HTTP (Google Books, Open Library, cover images): one pooled
+    # keep-alive client per upstream; HTTP/2 is used when the h2 package is installed
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP2_ENABLED: bool = True
+    # Deadline per source when several external searches run concurrently;
+    # a slower source is left out of the merged results
+    EXTERNAL_SOURCE_DEADLINE_SECONDS: float = 4.0
+    
+    # In-memory cache of external API responses (LRU, bounded by entries and size)
+    EXTERNAL_CACHE_MAX_ENTRIES: int = 2048
+    EXTERNAL_CACHE_MAX_MB: int = 64
+    EXTERNAL_CACHE_TTL_HOURS: float = 24.0
+    # Optional SQLite file (WAL mode) persisting those responses across
+    # workers and restarts; unset to keep the cache in memory only
+    EXTERNAL_CACHE_SQLITE_PATH: Optional[str] = None
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -1,5 +1,6 @@
 from typing import Any, List, Optional, cast
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
 import random
@@ -8,7 +9,7 @@ from app.core.security import get_current_user, get_current_admin_user
 from app.models import Book, Genre, User, Rating
 from app.schemas import (
     BookCreate, BookUpdate, Book as BookSchema, 
-    PaginatedResponse, BookSearchParams
+    PaginatedResponse, BookSearchParams, BookWithRecommendationScore
 )
 
 router = APIRouter()
@@ -22,6 +23,12 @@ def _safe_int(raw: Any, default: int = 0) -> int:
     return int(value) if value is not None else default
 
 
+def _contains_pattern(text: str) -> str:
+    """LIKE pattern matching `text` literally anywhere; use with escape='\\'"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
 
 @router.post("/", response_model=BookSchema)
 async def create_book(
@@ -50,6 +57,11 @@ async def create_book(
     db.commit()
     db.refresh(db_book)
     
+    # Make the book visible to content similarity without a retrain; vectorizing
+    # is CPU work, so it runs off the event loop
+    from app.routers.recommendations import recommendation_service
+    await run_in_threadpool(recommendation_service.add_books, [db_book])
+    
     return db_book
 
 
@@ -175,6 +187,38 @@ async def search_books_autocomplete(
     return books
 
 
+@router.get("/semantic-search", response_model=List[BookWithRecommendationScore])
+async def semantic_search_books(
+    q: str = Query(..., min_length=1, description="Free-text description of what to read"),
+    limit: int = Query(10, ge=1, le=50, description="Number of results"),
+    db: Session = Depends(get_db)
+):
+    """
+    Rank books by content similarity to a free-text query
+    Uses the recommender's content model; falls back to keyword matching
+    (with a zero score) when no model is loaded
+    """
+    from app.routers.recommendations import recommendation_service, build_scored_books
+    
+    matches = recommendation_service.semantic_search(q, limit)
+    if matches is None:
+        pattern = _contains_pattern(q)
+        fallback = (
+            db.query(Book.id)
+            .filter(or_(
+                Book.title.ilike(pattern, escape='\\'),
+                Book.author.ilike(pattern, escape='\\'),
+                Book.description.ilike(pattern, escape='\\')
+            ))
+            .order_by(Book.average_rating.desc())
+            .limit(limit)
+            .all()
+        )
+        matches = [(book_id, 0.0) for book_id, in fallback]
+    
+    return build_scored_books(db, matches)
+
+
 @router.get("/surprise", response_model=List[BookSchema])
 async def surprise_me(
     count: int = Query(5, ge=1, le=20, description="Number of random books"),
@@ -3,12 +3,14 @@ Enhanced Book Router with External API Integration
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
 
 from app.core.database import get_db
-from app.models import Book, Genre
+from app.core.security import get_current_admin_user
+from app.models import Book, Genre, User
 from app.schemas import BookCreate, Book as BookSchema
 from app.services.external_apis import ExternalBookAPI, BookDataEnricher
 
@@ -40,9 +42,7 @@ async def search_external_books(
         elif source == "openlibrary":
             books = await ExternalBookAPI.search_open_library(query, limit=limit)
         else:  # both
-            google_books = await ExternalBookAPI.search_google_books(query, max_results=limit // 2)
-            open_books = await ExternalBookAPI.search_open_library(query, limit=limit // 2)
-            books = google_books + open_books
+            books = await ExternalBookAPI.search_all_sources(query, limit=limit)
         
         return books
     except Exception as e:
@@ -50,6 +50,12 @@ async def search_external_books(
         raise HTTPException(status_code=500, detail="Error fetching books from external APIs")
 
 
+@router.get("/external/cache-stats")
+async def get_external_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Size and hit/miss/eviction counters of this worker's external API cache (admin only)"""
+    return ExternalBookAPI.cache_stats()
+
+
 @router.get("/external/trending", response_model=List[dict])
 async def get_trending_books():
     """Get trending books from external APIs"""
@@ -160,6 +166,11 @@ async def import_external_book(
         
         db.commit()
         
+        # Make the book visible to content similarity without a retrain; vectorizing
+        # is CPU work, so it runs off the event loop
+        from app.routers.recommendations import recommendation_service
+        await run_in_threadpool(recommendation_service.add_books, [new_book])
+        
         return {
             "message": "Book imported successfully",
             "book_id": new_book.id,
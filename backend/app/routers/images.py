@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 import httpx
 from urllib.parse import unquote
+from app.services.http_clients import IMAGES, HTTPClients
 
 router = APIRouter()
 
@@ -37,27 +38,27 @@ async def proxy_book_cover(url: str):
             'Referer': 'https://www.google.com/',
         }
         
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(decoded_url, headers=headers)
-            
-            if response.status_code != 200:
-                # If Google Books fails, try OpenLibrary as fallback
-                raise HTTPException(
-                    status_code=404,
-                    detail="Image not found or unavailable"
-                )
-            
-            # Return image with appropriate content type
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            
-            return Response(
-                content=response.content,
-                media_type=content_type,
-                headers={
-                    "Cache-Control": "public, max-age=86400",  # Cache for 24 hours
-                    "Access-Control-Allow-Origin": "*",
-                }
+        client = HTTPClients.get(IMAGES)
+        response = await client.get(decoded_url, headers=headers)
+        
+        if response.status_code != 200:
+            # If Google Books fails, try OpenLibrary as fallback
+            raise HTTPException(
+                status_code=404,
+                detail="Image not found or unavailable"
             )
+        
+        # Return image with appropriate content type
+        content_type = response.headers.get('content-type', 'image/jpeg')
+        
+        return Response(
+            content=response.content,
+            media_type=content_type,
+            headers={
+                "Cache-Control": "public, max-age=86400",  # Cache for 24 hours
+                "Access-Control-Allow-Origin": "*",
+            }
+        )
     
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Image source timeout")
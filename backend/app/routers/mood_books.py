@@ -1,20 +1,36 @@
 """
 API routes for mood-based book recommendations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import codecs
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.security import get_current_admin_user
+from app.models import User
 from app.models.whichbook import MoodBook
 from app.schemas.whichbook import (
     MoodBookCreate, MoodBookResponse, MoodRecommendRequest, 
-    WorldMapCountryResponse
+    WorldMapCountryResponse, MoodAutoTagBulkRequest, MapTilesResponse
 )
+from app.services.country_stats import CountryStatsCache
+from app.services.geo_index import MoodGeoIndex
+from app.services.mood_ingest import DEFAULT_BATCH_SIZE, INGEST_FORMATS, MoodBookIngestor, ingest_format_for
 from app.services.mood_recommender import MoodRecommender
+from app.services.mood_tagger import MOOD_LABELS
 
 router = APIRouter()
 
 
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Set the ETag and report whether the client's cached copy is current"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+
+
 @router.post("/recommend", response_model=List[MoodBookResponse])
 async def get_mood_recommendations(
     request: MoodRecommendRequest,
@@ -111,24 +127,112 @@ async def create_mood_book(
     db.add(db_book)
     db.commit()
     db.refresh(db_book)
+    MoodRecommender.books_changed(added_countries=[db_book.country])
     return db_book
 
 
+@router.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_mood_book(
+    book_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Delete a mood book (admin only)"""
+    book = db.query(MoodBook).filter(MoodBook.id == book_id).first()
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    
+    country = book.country
+    db.delete(book)
+    db.commit()
+    MoodRecommender.books_changed(removed_countries=[country])
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/books/bulk")
+async def bulk_create_mood_books(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Bulk-load mood books from an NDJSON or CSV upload (admin only)
+    
+    The upload is read line by line and inserted in batches with one commit
+    each; rows without a mood_vector are auto-tagged from their description.
+    Invalid rows are skipped and reported with their line numbers.
+    """
+    ingest_format = format or ingest_format_for(file.filename, file.content_type)
+    if ingest_format not in INGEST_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown upload format. Use a .ndjson/.jsonl or .csv file, or format={'|'.join(INGEST_FORMATS)}"
+        )
+    if not 1 <= batch_size <= 50000:
+        raise HTTPException(status_code=400, detail="batch_size must be between 1 and 50000")
+    
+    # The upload is already spooled to disk; stream it as text lines
+    lines = codecs.iterdecode(file.file, 'utf-8-sig')
+    ingestor = MoodBookIngestor(db, batch_size=batch_size)
+    ingest = ingestor.ingest_csv if ingest_format == 'csv' else ingestor.ingest_ndjson
+    try:
+        return await run_in_threadpool(ingest, lines)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=f"Upload must be UTF-8 text ({ingestor.inserted} rows were inserted before the error)")
+
+
 @router.get("/worldmap/countries", response_model=List[WorldMapCountryResponse])
 async def get_world_map_countries(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """Get all countries with book counts for world map visualization"""
-    from app.models.whichbook import WorldMapCountry
-    countries = db.query(WorldMapCountry).all()
-    return countries
+    etag = CountryStatsCache.get_countries_etag(db)
+    if not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return CountryStatsCache.get_countries(db)
+
+
+@router.get("/worldmap/tiles", response_model=MapTilesResponse)
+async def get_world_map_tiles(
+    bbox: str,
+    zoom: int,
+    limit: int = 5000,
+    db: Session = Depends(get_db)
+):
+    """
+    Clustered book markers for a map viewport
+    
+    bbox is "west,south,east,north" in degrees (west > east crosses the
+    antimeridian); zoom follows web map tile levels. Each marker is a
+    precomputed grid-cell cluster, or a single book at deep zoom.
+    """
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be 'west,south,east,north'")
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise HTTPException(status_code=400, detail="bbox is outside valid longitude/latitude ranges")
+    if not 0 <= zoom <= 22:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 22")
+    
+    index = MoodGeoIndex.current(db)
+    return index.tiles((west, south, east, north), zoom, limit=min(max(limit, 1), 20000))
 
 
 @router.get("/worldmap/books-by-country")
 async def get_books_by_country_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """Get statistics about books grouped by country"""
+    etag = CountryStatsCache.get_book_counts_etag(db)
+    if not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
     stats = MoodRecommender.get_country_books_stats(db)
     return {
         "total_countries": len(stats),
@@ -149,7 +253,27 @@ async def auto_tag_book_mood(
     
     return {
         "mood_vector": mood_vector,
-        "mood_labels": ["happy", "sad", "calm", "thrilling", "dark", "funny", "emotional", "optimistic"],
+        "mood_labels": MOOD_LABELS,
         "description": "Mood vector generated from description using keyword matching"
     }
 
+
+@router.post("/auto-tag-mood/bulk")
+async def auto_tag_book_moods_bulk(
+    request: MoodAutoTagBulkRequest,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Auto-generate mood vectors for up to 5000 descriptions in one call (admin only)
+    Tagging runs off the event loop
+    """
+    mood_vectors = await run_in_threadpool(
+        MoodRecommender.auto_tag_moods_from_descriptions, request.descriptions
+    )
+    
+    return {
+        "mood_vectors": mood_vectors,
+        "mood_labels": MOOD_LABELS,
+        "count": len(mood_vectors)
+    }
+
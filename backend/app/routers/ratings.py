@@ -66,6 +66,15 @@ async def create_rating(
     book.rating_count = rating_count or 0  # type: ignore[assignment]
     db.commit()
     
+    # Keep trending counters and genre leaderboards current without waiting for a retrain;
+    # a re-rating must not count toward trending a second time
+    from app.routers.recommendations import recommendation_service
+    recommendation_service.record_rating(
+        current_user.id, rating.book_id, rating.rating, None,  # type: ignore[arg-type]
+        book.average_rating, book.rating_count,  # type: ignore[arg-type]
+        is_new=existing_rating is None
+    )
+    
     # Update reading streak and check for achievements
     tracker = MilestoneTracker(db)
     tracker.update_reading_streak(current_user.id)  # type: ignore[arg-type]
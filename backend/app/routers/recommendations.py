@@ -1,13 +1,24 @@
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy import func
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 import os
 import pandas as pd
 import logging
-from app.core.database import get_db
-from app.models import User, Book, Rating
-from app.schemas import BookWithRecommendationScore
+import json
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
+from app.core.security import get_current_admin_user
+from app.models import User, Book, Genre, Rating
+from app.schemas import BookWithRecommendationScore, BatchRecommendationRequest
+from app.services.genre_cache import GenreCache
 import sys
 
 # Setup logging
@@ -21,26 +32,51 @@ sys.path.append(ml_dir)
 try:
     from ml.advanced_recommender import AdvancedHybridRecommender
     from ml.recommender import HybridRecommender
+    from ml.metrics import RequestTrace, recommender_metrics
+    from ml.shared_model import SharedModelStore
 except ImportError:
     # Fallback if ML modules are not available
     AdvancedHybridRecommender = None
     HybridRecommender = None
+    RequestTrace = None
+    recommender_metrics = None
+    SharedModelStore = None
 
 router = APIRouter()
 
+# Incremental writes kept per worker for replay onto a newly attached shared
+# version: at most this many, and none older than the longest trending window
+# (by then a rating no longer moves trending and a new book is due a retrain)
+SHARED_JOURNAL_MAX_EVENTS = 100_000
+SHARED_JOURNAL_MAX_AGE_SECONDS = 30 * 24 * 3600
+
 
 class RecommendationService:
     def __init__(self):
         self.recommender = None
         self.advanced_recommender = None
         self.models_loaded = False
+        # Shared memory-mapped model state (settings.SHARED_MODEL_DIR)
+        self.shared_store = None
+        self.shared_version = None
+        self._shared_checked_at = 0.0
+        # (time, 'rating', record_rating args) and (time, 'books', book ids)
+        self._shared_journal = deque()
         self.load_models()
     
-    def load_models(self):
-        """Load trained ML models"""
+    def load_models(self, publish: bool = False):
+        """Load trained ML models
+        
+        With SHARED_MODEL_DIR set, the advanced model is attached from the
+        shared store instead; `publish` (or an empty store) first publishes
+        the pickled model there for every worker.
+        """
         if AdvancedHybridRecommender is None and HybridRecommender is None:
             return
         
+        if settings.SHARED_MODEL_DIR and SharedModelStore is not None and self._load_shared(publish):
+            return
+        
         try:
             models_dir = os.path.join(ml_dir, 'models')
             if os.path.exists(models_dir):
@@ -60,43 +96,157 @@ class RecommendationService:
             print(f"Error loading ML models: {e}")
             self.models_loaded = False
     
+    def _load_shared(self, publish: bool) -> bool:
+        """Attach the advanced model from the shared store; False to fall back to a private load"""
+        try:
+            store = SharedModelStore(settings.SHARED_MODEL_DIR)
+            if publish:
+                model = self._load_private_advanced()
+                if model is None:
+                    return False
+                store.publish(model)
+            elif store.ensure_published(self._load_private_advanced) is None:
+                return False
+            
+            attached = store.attach()
+            if attached is None:
+                return False
+            self._switch_shared(*attached)
+            self.shared_store = store
+            self._shared_checked_at = time.monotonic()
+            self.models_loaded = True
+            logger.info(f"✅ Advanced Hybrid Recommender attached to shared version {self.shared_version}")
+            return True
+        except Exception as e:
+            logger.error(f"Error attaching shared model: {e}")
+            return False
+    
+    @staticmethod
+    def _load_private_advanced():
+        """The pickled advanced model from ml/models, None when it has no content model"""
+        model = AdvancedHybridRecommender()
+        model.load(os.path.join(ml_dir, 'models'))
+        return model if model.content_rec.tfidf_matrix is not None else None
+    
+    def _switch_shared(self, version: str, model):
+        """Serve an attached shared version, replaying this worker's writes it was trained without
+        
+        Trending counts, leaderboard updates and appended books live only in
+        the worker that received them, so they would be lost with the old
+        model object otherwise.
+        """
+        fitted_at = getattr(model, 'fitted_at', None)
+        self._shared_journal = deque(
+            entry for entry in self._shared_journal if fitted_at is None or entry[0] > fitted_at
+        )
+        self._trim_journal()
+        
+        # Books first, so replayed ratings of new books find them on the leaderboards
+        book_ids = [book_id for _, kind, ids in self._shared_journal if kind == 'books' for book_id in ids]
+        try:
+            if book_ids:
+                with SessionLocal() as db:
+                    books = db.query(Book).filter(Book.id.in_(book_ids)).all()
+                    if books:
+                        model.add_books(pd.DataFrame([book_training_row(book) for book in books]))
+            for _, kind, args in self._shared_journal:
+                if kind == 'rating':
+                    model.record_rating(*args)
+        except Exception as e:
+            logger.error(f"Error replaying writes onto shared model version {version}: {e}")
+        self.shared_version, self.advanced_recommender = version, model
+    
+    def _journal(self, kind: str, payload: tuple):
+        """Record a write for replay, when serving a shared model"""
+        if self.shared_store is None:
+            return
+        self._shared_journal.append((time.time(), kind, payload))
+        self._trim_journal()
+    
+    def _trim_journal(self):
+        """Drop journal entries past the age limit, and the oldest tenth when it is full"""
+        journal = self._shared_journal
+        cutoff = time.time() - SHARED_JOURNAL_MAX_AGE_SECONDS
+        dropped = 0
+        while journal and journal[0][0] < cutoff:
+            journal.popleft()
+            dropped += 1
+        if len(journal) > SHARED_JOURNAL_MAX_EVENTS:
+            for _ in range(len(journal) - SHARED_JOURNAL_MAX_EVENTS * 9 // 10):
+                journal.popleft()
+                dropped += 1
+        if dropped:
+            logger.warning(
+                f"Dropped {dropped} journaled writes; they will not be replayed onto a new shared model version until a retrain includes them"
+            )
+    
+    def refresh_shared_model(self):
+        """Re-attach when another process published a newer shared version (rate limited)"""
+        if self.shared_store is None:
+            return
+        now = time.monotonic()
+        if now - self._shared_checked_at < settings.SHARED_MODEL_CHECK_SECONDS:
+            return
+        self._shared_checked_at = now
+        
+        version = self.shared_store.current_version()
+        if version is None or version == self.shared_version:
+            return
+        try:
+            attached = self.shared_store.attach(version)
+            if attached is not None:
+                self._switch_shared(*attached)
+                logger.info(f"Switched to shared model version {version}")
+        except Exception as e:
+            logger.error(f"Error switching to shared model version {version}: {e}")
+    
     def get_fallback_recommendations(self, db: Session, user_id: int, n_recommendations: int = 10) -> List[tuple]:
         """Fallback recommendations based on popular books"""
-        # Get books with highest average rating and most ratings
+        popular_book_ids = self._popular_book_ids(db, max(n_recommendations * 2, n_recommendations))
+        
+        # Get user's rated books to filter them out
+        user_rated_books = set(
+            db.query(Rating.book_id)
+            .filter(Rating.user_id == user_id)
+            .all()
+        )
+        user_rated_book_ids = {book_id[0] for book_id in user_rated_books}
+        
+        return self._filter_popular(popular_book_ids, user_rated_book_ids, n_recommendations)
+    
+    @staticmethod
+    def _popular_book_ids(db: Session, limit: int) -> List[int]:
+        """Ids of the highest rated, most rated books"""
         popular_books = (
-            db.query(Book)
+            db.query(Book.id)
             .order_by(
                 func.coalesce(Book.average_rating, 0).desc(),
                 func.coalesce(Book.rating_count, 0).desc()
             )
-            .limit(max(n_recommendations * 2, n_recommendations))
+            .limit(limit)
             .all()
         )
 
         if not popular_books:
             # Last resort: return any books available
             popular_books = (
-                db.query(Book)
+                db.query(Book.id)
                 .order_by(Book.id.asc())
-                .limit(n_recommendations)
+                .limit(limit)
                 .all()
             )
         
-        # Get user's rated books to filter them out
-        user_rated_books = set(
-            db.query(Rating.book_id)
-            .filter(Rating.user_id == user_id)
-            .all()
-        )
-        user_rated_book_ids = {book_id[0] for book_id in user_rated_books}
-        
-        # Filter out user's rated books and assign scores
+        return [row[0] for row in popular_books]
+    
+    @staticmethod
+    def _filter_popular(popular_book_ids: List[int], rated_book_ids: set, n_recommendations: int) -> List[tuple]:
+        """Filter out the user's rated books and assign rank-based scores"""
         recommendations = []
-        for i, book in enumerate(popular_books):
-            if book.id not in user_rated_book_ids:
+        for i, book_id in enumerate(popular_book_ids):
+            if book_id not in rated_book_ids:
                 # Higher score for higher-ranked books
-                score = 1.0 - (i / len(popular_books))
-                recommendations.append((book.id, score))
+                score = 1.0 - (i / len(popular_book_ids))
+                recommendations.append((book_id, score))
                 
                 if len(recommendations) >= n_recommendations:
                     break
@@ -110,24 +260,33 @@ class RecommendationService:
         n_recommendations: int = 10,
         context: Optional[str] = None,
         personality: Optional[str] = None,
-        strategy: Optional[str] = None
+        strategy: Optional[str] = None,
+        trace: Optional["RequestTrace"] = None,
+        trending_window: str = "7d"
     ) -> List[tuple]:
         """Get recommendations for a user"""
+        self.refresh_shared_model()
         if not self.models_loaded or (self.recommender is None and self.advanced_recommender is None):
             return self.get_fallback_recommendations(db, user_id, n_recommendations)
         
         try:
             # Get user's rated books
-            user_ratings = (
-                db.query(Rating)
-                .filter(Rating.user_id == user_id)
-                .all()
-            )
-            user_rated_books = [rating.book_id for rating in user_ratings]
+            with self._stage('service.user_ratings', trace) as rec:
+                # Rating order matches the batch path ("last rated" means highest id)
+                user_ratings = (
+                    db.query(Rating)
+                    .filter(Rating.user_id == user_id)
+                    .order_by(Rating.id)
+                    .all()
+                )
+                user_rated_books = [rating.book_id for rating in user_ratings]
+                rec.candidates = len(user_rated_books)
             
             # Get all book IDs
-            all_books = db.query(Book.id).all()
-            all_book_ids = [book[0] for book in all_books]
+            with self._stage('service.catalog', trace) as rec:
+                all_books = db.query(Book.id).all()
+                all_book_ids = [book[0] for book in all_books]
+                rec.candidates = len(all_book_ids)
             
             if not user_rated_books:
                 # Cold start: return popular books
@@ -143,7 +302,10 @@ class RecommendationService:
                         candidate_books=[bid for bid in all_book_ids if bid not in user_rated_books],
                         context=context,
                         personality=personality,
-                        n=n_recommendations
+                        n=n_recommendations,
+                        trace=trace,
+                        trending_window=trending_window,
+                        user_rated_books=user_rated_books  # type: ignore[arg-type]
                     )
                 else:
                     # Get hybrid recommendations
@@ -154,7 +316,8 @@ class RecommendationService:
                         n_recommendations=n_recommendations,
                         context=context,
                         personality=personality,
-                        diversity_enabled=True
+                        diversity_enabled=True,
+                        trace=trace
                     )
             # Fallback to basic recommender
             elif self.recommender is not None:
@@ -172,12 +335,301 @@ class RecommendationService:
         except Exception as e:
             print(f"Error getting ML recommendations: {e}")
             return self.get_fallback_recommendations(db, user_id, n_recommendations)
+    
+    def record_rating(
+        self,
+        user_id: int,
+        book_id: int,
+        rating: float,
+        created_at=None,
+        book_average: Optional[float] = None,
+        book_rating_count: Optional[int] = None,
+        is_new: bool = True
+    ):
+        """Feed a rating write to the incrementally maintained model state"""
+        if self.advanced_recommender is None:
+            return
+        # Pin the hour now so a later replay counts it in the same trending bucket
+        args = (user_id, book_id, rating, created_at or datetime.now(timezone.utc), book_average, book_rating_count, is_new)
+        try:
+            self.advanced_recommender.record_rating(*args)
+            self._journal('rating', args)
+        except Exception as e:
+            logger.error(f"Error recording rating in recommender: {e}")
+    
+    def add_books(self, books: List[Book]) -> List[int]:
+        """Append newly created books to the loaded content model and leaderboards"""
+        if self.advanced_recommender is None or not books:
+            return []
+        try:
+            books_df = pd.DataFrame([book_training_row(book) for book in books])
+            added = self.advanced_recommender.add_books(books_df)
+            self._journal('books', tuple(added))
+            return added
+        except Exception as e:
+            logger.error(f"Error adding books to recommender: {e}")
+            return []
+    
+    def semantic_search(self, query: str, n: int = 10) -> Optional[List[tuple]]:
+        """(book_id, similarity) matches of a free-text query, None when no content model is loaded"""
+        if self.advanced_recommender is None or self.advanced_recommender.content_rec.tfidf_matrix is None:
+            return None
+        try:
+            return self.advanced_recommender.content_rec.search(query, n)
+        except Exception as e:
+            logger.error(f"Error in semantic search: {e}")
+            return None
+    
+    def content_model_status(self) -> Optional[Dict]:
+        """Vocabulary drift of the content model, None when no model is loaded"""
+        if self.advanced_recommender is None:
+            return None
+        return self.advanced_recommender.content_rec.drift_stats()
+    
+    def iter_batch_recommendations(self, db: Session, request: BatchRecommendationRequest) -> Iterator[Dict]:
+        """Recommend for many users, one result dict per user followed by a summary
+        
+        Catalog state (book ids, popularity/demographic/context scores, neighbor
+        lists) is built once and shared by every user chunk.
+        """
+        n_recommendations = request.n_recommendations
+        all_book_ids = [row[0] for row in db.query(Book.id).all()]
+        
+        self.refresh_shared_model()
+        advanced = self.advanced_recommender if self.models_loaded else None
+        basic = self.recommender if self.models_loaded else None
+        catalog = None
+        chunk_size = 500
+        if advanced is not None:
+            catalog = advanced.build_batch_catalog(all_book_ids, request.context, request.personality)
+            chunk_size = advanced.batch_chunk_size(len(all_book_ids))
+        
+        popular_book_ids = None
+        processed = 0
+        last_user_id = request.after_user_id
+        # Server-side cap per job; larger runs resume from next_cursor
+        max_users = min(request.max_users or settings.BATCH_RECOMMENDATION_MAX_USERS, settings.BATCH_RECOMMENDATION_MAX_USERS)
+        
+        for chunk in self._iter_user_chunks(db, request, chunk_size, max_users):
+            existing = {row[0] for row in db.query(User.id).filter(User.id.in_(chunk)).all()}
+            
+            rated_books = defaultdict(list)
+            ratings = (
+                db.query(Rating.user_id, Rating.book_id)
+                .filter(Rating.user_id.in_(chunk))
+                .order_by(Rating.id)
+                .all()
+            )
+            for rating_user_id, book_id in ratings:
+                rated_books[rating_user_id].append(book_id)
+            
+            warm_users = {user_id: rated_books[user_id] for user_id in chunk if user_id in existing and rated_books.get(user_id)}
+            scored = {}
+            try:
+                if advanced is not None and catalog is not None and warm_users:
+                    scored = advanced.get_batch_hybrid_recommendations(warm_users, catalog, n_recommendations)
+                elif basic is not None:
+                    scored = {
+                        user_id: basic.get_hybrid_recommendations(user_id, rated, all_book_ids, n_recommendations)
+                        for user_id, rated in warm_users.items()
+                    }
+            except Exception as e:
+                logger.error(f"Error getting batch ML recommendations: {e}")
+                scored = {}
+            
+            for user_id in chunk:
+                processed += 1
+                last_user_id = user_id
+                if user_id not in existing:
+                    yield {"user_id": user_id, "error": "User not found"}
+                    continue
+                
+                recommendations = scored.get(user_id)
+                source = "hybrid"
+                if not recommendations:
+                    if popular_book_ids is None:
+                        popular_book_ids = self._popular_book_ids(db, n_recommendations * 2)
+                    recommendations = self._filter_popular(popular_book_ids, set(rated_books.get(user_id, [])), n_recommendations)
+                    source = "popular"
+                
+                yield {
+                    "user_id": user_id,
+                    "source": source,
+                    "recommendations": [
+                        {"book_id": int(book_id), "score": round(float(score), 3)}
+                        for book_id, score in recommendations
+                    ]
+                }
+        
+        yield {"summary": {"users": processed, "next_cursor": last_user_id}}
+    
+    @staticmethod
+    def _iter_user_chunks(db: Session, request: BatchRecommendationRequest, chunk_size: int, max_users: int) -> Iterator[List[int]]:
+        """Yield up to max_users user ids in chunks, from the explicit list or by paging through users by id"""
+        if request.user_ids is not None:
+            user_ids = list(dict.fromkeys(request.user_ids))[:max_users]
+            for start in range(0, len(user_ids), chunk_size):
+                yield user_ids[start:start + chunk_size]
+            return
+        
+        remaining = max_users
+        last_user_id = request.after_user_id or 0
+        while remaining > 0:
+            limit = min(chunk_size, remaining)
+            user_ids = [
+                row[0] for row in
+                db.query(User.id).filter(User.id > last_user_id).order_by(User.id).limit(limit).all()
+            ]
+            if not user_ids:
+                return
+            yield user_ids
+            last_user_id = user_ids[-1]
+            remaining -= len(user_ids)
+    
+    @staticmethod
+    def _stage(name: str, trace: Optional["RequestTrace"] = None):
+        """Time a service stage when instrumentation is available"""
+        if recommender_metrics is None:
+            return nullcontext(SimpleNamespace(candidates=0))
+        return recommender_metrics.stage(name, trace)
 
 
 # Global recommendation service instance
 recommendation_service = RecommendationService()
 
 
+def book_training_row(book: Book) -> Dict:
+    """Flatten a book into the column layout of the ML training export"""
+    return {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'description': book.description or '',
+        'genres': ' '.join([genre.name for genre in book.genres]),
+        # Exact names for the genre leaderboards ('genres' above is text for the content model)
+        'genre_names': '|'.join([genre.name for genre in book.genres]),
+        'publication_year': book.publication_year,
+        'price': book.price,
+        'average_rating': book.average_rating,
+        'rating_count': book.rating_count
+    }
+
+
+def build_scored_books(db: Session, recommendations: List[tuple]) -> List[BookWithRecommendationScore]:
+    """Load the books of a (book_id, score) slate, genres included, in slate order"""
+    # Fetch book details and the genres of the whole slate in one query
+    book_ids = [rec[0] for rec in recommendations]
+    books = db.query(Book).filter(Book.id.in_(book_ids)).all()
+    genres_by_book = GenreCache.genres_for_books(db, book_ids)
+    
+    # Create response with recommendation scores
+    books_dict = {book.id: book for book in books}
+    recommendations_response = []
+    
+    for book_id, score in recommendations:
+        if book_id in books_dict:
+            book = books_dict[book_id]
+            book_with_score = BookWithRecommendationScore(
+                id=book.id,  # type: ignore[arg-type]
+                title=book.title,  # type: ignore[arg-type]
+                author=book.author,  # type: ignore[arg-type]
+                description=book.description,  # type: ignore[arg-type]
+                isbn=book.isbn,  # type: ignore[arg-type]
+                publication_year=book.publication_year,  # type: ignore[arg-type]
+                cover_image_url=book.cover_image_url,  # type: ignore[arg-type]
+                audio_preview_url=book.audio_preview_url,  # type: ignore[arg-type]
+                price=book.price,  # type: ignore[arg-type]
+                average_rating=book.average_rating if book.average_rating is not None else 0.0,  # type: ignore[arg-type]
+                rating_count=book.rating_count if book.rating_count is not None else 0,  # type: ignore[arg-type]
+                created_at=book.created_at,  # type: ignore[arg-type]
+                genres=genres_by_book.get(book_id, []),  # type: ignore[arg-type]
+                recommendation_score=round(score, 3)
+            )
+            recommendations_response.append(book_with_score)
+    
+    return recommendations_response
+
+
+@router.get("/metrics")
+async def get_recommender_metrics(current_user: User = Depends(get_current_admin_user)):
+    """Per-stage latency histograms and candidate counters for the recommenders (admin only)"""
+    if recommender_metrics is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommender instrumentation is not available"
+        )
+    
+    return {
+        "models_loaded": recommendation_service.models_loaded,
+        "content_model": recommendation_service.content_model_status(),
+        **recommender_metrics.snapshot()
+    }
+
+
+@router.post("/batch")
+async def get_batch_recommendations(
+    request: BatchRecommendationRequest,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Recommend for many users in one streaming job (admin only)
+    
+    Pass `user_ids`, or omit them to page through users with
+    id > `after_user_id`. At most `max_users` users are processed, and
+    never more than settings.BATCH_RECOMMENDATION_MAX_USERS. Streams NDJSON:
+    one `{"user_id", "source", "recommendations"}` object per user, then a
+    `{"summary": {"users", "next_cursor"}}` line to resume from.
+    """
+    def generate():
+        # The stream outlives the request-scoped session, so use our own
+        db = SessionLocal()
+        try:
+            for result in recommendation_service.iter_batch_recommendations(db, request):
+                yield json.dumps(result) + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/popular/genres", response_model=List[BookWithRecommendationScore])
+async def get_genre_leaderboard(
+    genre: List[str] = Query(..., description="Genre name; repeat for several genres"),
+    match: str = Query("any", regex="^(any|all)$", description="Books in any or in all of the genres"),
+    n: int = Query(20, ge=1, le=100, description="Number of books"),
+    db: Session = Depends(get_db)
+):
+    """
+    Most popular books for a genre or a combination of genres
+    
+    Served from precomputed Bayesian-average leaderboards; falls back to
+    sorting the genre join when no trained model is loaded.
+    """
+    recommendations = []
+    if recommendation_service.advanced_recommender is not None:
+        recommendations = recommendation_service.advanced_recommender.popularity_rec.get_genre_recommendations(
+            genre, n=n, match=match
+        )
+    
+    if not recommendations:
+        # Exact, case-insensitive names, as the leaderboards are keyed
+        names = [name.strip().lower() for name in genre]
+        query = db.query(Book)
+        if match == "all":
+            for name in names:
+                query = query.filter(Book.genres.any(func.lower(Genre.name) == name))
+        else:
+            query = query.filter(Book.genres.any(func.lower(Genre.name).in_(names)))
+        books = (
+            query.order_by(func.coalesce(Book.average_rating, 0).desc())
+            .limit(n)
+            .all()
+        )
+        recommendations = [(book.id, book.average_rating or 0.0) for book in books]
+    
+    return build_scored_books(db, recommendations)
+
+
 @router.get("/{user_id}", response_model=List[BookWithRecommendationScore])
 async def get_user_recommendations(
     user_id: int,
@@ -185,6 +637,8 @@ async def get_user_recommendations(
     context: str = Query(None, description="Context: morning, afternoon, evening, night, weekend, workday"),
     personality: str = Query(None, description="Personality type: adventurous, intellectual, creative, romantic, analytical"),
     strategy: str = Query(None, description="Specific strategy: popularity, trending, content, collaborative, demographic, context, quiz, association"),
+    trending_window: str = Query("7d", regex="^(1d|7d|30d)$", description="Decay window for strategy=trending: 1d, 7d, 30d"),
+    debug: bool = Query(False, description="Include the per-stage latency breakdown for this request"),
     db: Session = Depends(get_db)
 ):
     """
@@ -212,8 +666,9 @@ async def get_user_recommendations(
         )
     
     # Get recommendations
+    trace = RequestTrace() if debug and RequestTrace is not None else None
     recommendations = recommendation_service.get_recommendations(
-        db, user_id, n_recommendations, context, personality, strategy
+        db, user_id, n_recommendations, context, personality, strategy, trace, trending_window
     )
     
     if not recommendations:
@@ -221,34 +676,13 @@ async def get_user_recommendations(
             db, user_id, n_recommendations
         )
     
-    # Fetch book details
-    book_ids = [rec[0] for rec in recommendations]
-    books = db.query(Book).filter(Book.id.in_(book_ids)).all()
-    
-    # Create response with recommendation scores
-    books_dict = {book.id: book for book in books}
-    recommendations_response = []
+    recommendations_response = build_scored_books(db, recommendations)
     
-    for book_id, score in recommendations:
-        if book_id in books_dict:
-            book = books_dict[book_id]
-            book_with_score = BookWithRecommendationScore(
-                id=book.id,  # type: ignore[arg-type]
-                title=book.title,  # type: ignore[arg-type]
-                author=book.author,  # type: ignore[arg-type]
-                description=book.description,  # type: ignore[arg-type]
-                isbn=book.isbn,  # type: ignore[arg-type]
-                publication_year=book.publication_year,  # type: ignore[arg-type]
-                cover_image_url=book.cover_image_url,  # type: ignore[arg-type]
-                audio_preview_url=book.audio_preview_url,  # type: ignore[arg-type]
-                price=book.price,  # type: ignore[arg-type]
-                average_rating=book.average_rating if book.average_rating is not None else 0.0,  # type: ignore[arg-type]
-                rating_count=book.rating_count if book.rating_count is not None else 0,  # type: ignore[arg-type]
-                created_at=book.created_at,  # type: ignore[arg-type]
-                genres=[],  # Would need to fetch genres separately
-                recommendation_score=round(score, 3)
-            )
-            recommendations_response.append(book_with_score)
+    if debug:
+        return JSONResponse(content=jsonable_encoder({
+            "recommendations": recommendations_response,
+            "debug": trace.to_dict() if trace is not None else None
+        }))
     
     return recommendations_response
 
@@ -270,20 +704,7 @@ async def retrain_models(
             )
         
         # Export to CSV for ML training
-        books_data = []
-        for book in books:
-            genre_names = ' '.join([genre.name for genre in book.genres])
-            books_data.append({
-                'id': book.id,
-                'title': book.title,
-                'author': book.author,
-                'description': book.description or '',
-                'genres': genre_names,
-                'publication_year': book.publication_year,
-                'price': book.price,
-                'average_rating': book.average_rating,
-                'rating_count': book.rating_count
-            })
+        books_data = [book_training_row(book) for book in books]
         
         ratings_data = []
         for rating in ratings:
@@ -303,7 +724,7 @@ async def retrain_models(
         ratings_df.to_csv(os.path.join(ml_dir, 'ratings.csv'), index=False)
         
         # Reload models (in production, this would trigger async training)
-        recommendation_service.load_models()
+        recommendation_service.load_models(publish=True)
         
         return {"message": "Model retraining initiated successfully"}
         
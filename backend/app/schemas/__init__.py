@@ -98,6 +98,16 @@ class BookWithRecommendationScore(Book):
     recommendation_score: float
 
 
+class BatchRecommendationRequest(BaseModel):
+    # Either an explicit list of users or a cursor over all users (id > after_user_id)
+    user_ids: Optional[List[int]] = None
+    after_user_id: Optional[int] = None
+    max_users: Optional[int] = Field(None, ge=1)
+    n_recommendations: int = Field(10, ge=1, le=50)
+    context: Optional[str] = None
+    personality: Optional[str] = None
+
+
 # Rating schemas
 class RatingBase(BaseModel):
     rating: float = Field(..., ge=1, le=5)
@@ -55,6 +55,11 @@ class MoodRecommendRequest(BaseModel):
     complexity_max: Optional[int] = Field(default=None, ge=1, le=10)
 
 
+class MoodAutoTagBulkRequest(BaseModel):
+    """Descriptions to auto-tag in one call"""
+    descriptions: List[Optional[str]] = Field(max_length=5000)
+
+
 # Creator Schemas
 class CreatorBase(BaseModel):
     name: str
@@ -162,6 +167,21 @@ class WorldMapCountryResponse(BaseModel):
         from_attributes = True
 
 
+class MapCluster(BaseModel):
+    """One world-map marker: a cluster of books, or a single book when count is 1"""
+    latitude: float
+    longitude: float
+    count: int
+    book_id: Optional[int] = None
+
+
+class MapTilesResponse(BaseModel):
+    zoom: int
+    clusters: List[MapCluster]
+    total_books: int
+    truncated: bool = False
+
+
 class BestsellerResponse(BaseModel):
     id: int
     book: MoodBookResponse
@@ -0,0 +1,203 @@
+"""
+Caches for external API responses
+A bounded in-process LRU with per-entry TTL, and an optional persistent
+SQLite cache shared across workers and restarts
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a JSON-like value, in bytes of its JSON encoding"""
+    try:
+        return len(json.dumps(value, default=str, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class BoundedCache:
+    """LRU cache bounded by entry count and approximate bytes, with TTL expiry
+
+    Entries live in namespaces (one per upstream source) that share the
+    bounds but keep separate hit/miss/eviction counters. Reads refresh an
+    entry's recency; expired entries are dropped when read or when they
+    reach the LRU end during eviction.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # (namespace, key) -> (value, expires_at, size)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Any]:
+        """Cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self._counters[namespace]["misses"] += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove((namespace, key))
+                self._counters[namespace]["expirations"] += 1
+                self._counters[namespace]["misses"] += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self._counters[namespace]["hits"] += 1
+            return value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Store a value, evicting least recently used entries to stay within bounds"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+            self._entries[(namespace, key)] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, namespace: str, key: Hashable):
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, full_key: Tuple[str, Hashable]):
+        _, _, size = self._entries.pop(full_key)
+        self._bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            full_key, (_, expires_at, _) = next(iter(self._entries.items()))
+            self._remove(full_key)
+            counter = "expirations" if expires_at <= now else "evictions"
+            self._counters[full_key[0]][counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, bounds and per-namespace counters"""
+        with self._lock:
+            per_namespace: Dict[str, Dict[str, int]] = {name: dict(counters) for name, counters in self._counters.items()}
+            for namespace, _ in self._entries:
+                per_namespace.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0})
+                per_namespace[namespace]["entries"] = per_namespace[namespace].get("entries", 0) + 1
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "namespaces": per_namespace
+            }
+
+
+class SQLiteCache:
+    """Persistent cache in a local SQLite file, shared by every worker on the host
+
+    WAL mode lets readers proceed while another process writes. Values are
+    zlib-compressed JSON with an absolute expiry; expired rows are ignored
+    on read and purged periodically on write. Errors are logged and treated
+    as misses, so a broken cache file never fails a request. Calls block, so
+    async code should run them in a thread.
+    """
+
+    PURGE_EVERY_WRITES = 1000
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+        # Guards the counters, which threadpool callers update concurrently
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str) -> int:
+        with self._lock:
+            self._counters[counter] += 1
+            return self._counters[counter]
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, expires_at as epoch seconds), or None when missing or expired"""
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND namespace = ? AND expires_at > ?",
+                (key, namespace, time.time())
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            self._count("hits")
+            return json.loads(zlib.decompress(row[0])), row[1]
+        except (sqlite3.Error, OSError, zlib.error, ValueError) as e:
+            self._count("errors")
+            logger.warning(f"Persistent cache read failed: {e}")
+            return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        try:
+            blob = zlib.compress(json.dumps(value, default=str, separators=(',', ':')).encode())
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, namespace, blob, expires_at)
+                )
+            if self._count("writes") % self.PURGE_EVERY_WRITES == 0:
+                self.purge_expired()
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            self._count("errors")
+            logger.warning(f"Persistent cache write failed: {e}")
+
+    def purge_expired(self) -> int:
+        """Delete expired rows; returns how many were removed"""
+        connection = self._connection()
+        with connection:
+            return connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"path": self.path, **self._counters}
@@ -0,0 +1,120 @@
+"""
+Cached world-map aggregates
+Mood-book counts per country and the world map country table, kept in memory,
+updated incrementally as mood books change and served with content ETags
+"""
+import hashlib
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.whichbook import MoodBook, WorldMapCountry
+from app.schemas.whichbook import WorldMapCountryResponse
+
+
+def content_etag(payload) -> str:
+    """Strong ETag of a JSON-serializable payload (identical across workers)"""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+
+
+class CountryStatsCache:
+    """Process-wide country aggregates
+
+    Book counts are loaded with one GROUP BY and then kept current by
+    `apply` whenever this process creates or deletes mood books; the TTL
+    picks up changes made by other workers. ETags are content hashes, so
+    every worker serving the same data returns the same tag.
+    """
+
+    book_counts: Optional[Dict[str, int]] = None
+    book_counts_etag: Optional[str] = None
+    counts_loaded_at: Optional[datetime] = None
+
+    countries: Optional[List[Dict]] = None
+    countries_etag: Optional[str] = None
+    countries_loaded_at: Optional[datetime] = None
+
+    cache_duration = timedelta(minutes=10)
+    _lock = threading.Lock()
+
+    @classmethod
+    def _expired(cls, loaded_at: Optional[datetime]) -> bool:
+        return loaded_at is None or datetime.now() - loaded_at > cls.cache_duration
+
+    @classmethod
+    def get_book_counts(cls, db: Session) -> Dict[str, int]:
+        """country -> number of mood books (books without a country are not counted)"""
+        if cls.book_counts is None or cls._expired(cls.counts_loaded_at):
+            rows = db.query(
+                MoodBook.country,
+                func.count(MoodBook.id).label('count')
+            ).filter(
+                MoodBook.country.isnot(None)
+            ).group_by(
+                MoodBook.country
+            ).all()
+            with cls._lock:
+                cls.book_counts = {country: count for country, count in rows}
+                cls.book_counts_etag = None
+                cls.counts_loaded_at = datetime.now()
+        return cls.book_counts  # type: ignore[return-value]
+
+    @classmethod
+    def get_book_counts_etag(cls, db: Session) -> str:
+        counts = cls.get_book_counts(db)
+        etag = cls.book_counts_etag
+        if etag is None:
+            etag = cls.book_counts_etag = content_etag(counts)
+        return etag
+
+    @classmethod
+    def get_countries(cls, db: Session) -> List[Dict]:
+        """The world map country table, serialized"""
+        if cls.countries is None or cls._expired(cls.countries_loaded_at):
+            countries = [
+                WorldMapCountryResponse.model_validate(country).model_dump()
+                for country in db.query(WorldMapCountry).order_by(WorldMapCountry.id).all()
+            ]
+            with cls._lock:
+                cls.countries = countries
+                cls.countries_etag = content_etag(countries)
+                cls.countries_loaded_at = datetime.now()
+        return cls.countries  # type: ignore[return-value]
+
+    @classmethod
+    def get_countries_etag(cls, db: Session) -> str:
+        cls.get_countries(db)
+        return cls.countries_etag  # type: ignore[return-value]
+
+    @classmethod
+    def apply(cls, added: Iterable[Optional[str]] = (), removed: Iterable[Optional[str]] = ()):
+        """Adjust the cached counts for mood books created/deleted in this process"""
+        delta = Counter(country for country in added if country is not None)
+        delta.subtract(country for country in removed if country is not None)
+        if not delta:
+            return
+        with cls._lock:
+            if cls.book_counts is None:
+                return  # nothing cached yet; the next read loads fresh counts
+            counts = dict(cls.book_counts)
+            for country, change in delta.items():
+                count = counts.get(country, 0) + change
+                if count > 0:
+                    counts[country] = count
+                else:
+                    counts.pop(country, None)
+            # Swap in a new dict so readers never see a half-applied update
+            cls.book_counts = counts
+            cls.book_counts_etag = None
+
+    @classmethod
+    def invalidate(cls):
+        """Force a reload of both aggregates on next access"""
+        cls.counts_loaded_at = None
+        cls.countries_loaded_at = None
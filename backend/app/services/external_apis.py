@@ -3,15 +3,43 @@ External API Integration Service
 Fetches book data from Google Books API and Open Library API
 """
 
-import httpx
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import hashlib
 import json
+import re
+import time
+
+from app.core.config import settings
+from app.services.cache import BoundedCache, SQLiteCache
+from app.services.http_clients import GOOGLE_BOOKS, OPEN_LIBRARY, HTTPClients
 
 logger = logging.getLogger(__name__)
 
+
+def _normalize(text: Optional[str]) -> str:
+    """Lowercase, punctuation-free, single-spaced text for duplicate detection"""
+    return " ".join(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+
+
+def dedupe_books(books: List[Dict]) -> List[Dict]:
+    """Drop repeats of a book seen earlier in the list, matched by ISBN, then by normalized title and author"""
+    seen_isbns = set()
+    seen_titles = set()
+    unique_books = []
+    for book in books:
+        isbn = (book.get("isbn") or "").replace("-", "")
+        title_key = (_normalize(book.get("title")), _normalize(book.get("author")))
+        if (isbn and isbn in seen_isbns) or title_key in seen_titles:
+            continue
+        if isbn:
+            seen_isbns.add(isbn)
+        seen_titles.add(title_key)
+        unique_books.append(book)
+    return unique_books
+
+
 class ExternalBookAPI:
     """Service to fetch book data from external APIs"""
     
@@ -19,30 +47,72 @@ class ExternalBookAPI:
     OPEN_LIBRARY_BASE_URL = "https://openlibrary.org"
     OPEN_LIBRARY_COVERS = "https://covers.openlibrary.org/b"
     
-    # Cache configuration
-    cache = {}
-    cache_duration = timedelta(hours=24)
+    # Bounded LRU + TTL cache, one namespace per source
+    cache = BoundedCache(
+        max_entries=settings.EXTERNAL_CACHE_MAX_ENTRIES,
+        max_bytes=settings.EXTERNAL_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=settings.EXTERNAL_CACHE_TTL_HOURS * 3600
+    )
     
     @classmethod
     def _get_cache_key(cls, source: str, query: str) -> str:
         """Generate cache key"""
         return hashlib.md5(f"{source}:{query}".encode()).hexdigest()
     
+    # Optional on-disk cache shared by every worker (settings.EXTERNAL_CACHE_SQLITE_PATH)
+    persistent_cache = SQLiteCache(
+        settings.EXTERNAL_CACHE_SQLITE_PATH,
+        ttl_seconds=settings.EXTERNAL_CACHE_TTL_HOURS * 3600
+    ) if settings.EXTERNAL_CACHE_SQLITE_PATH else None
+    
     @classmethod
-    def _get_from_cache(cls, key: str) -> Optional[Dict]:
-        """Get data from cache if not expired"""
-        if key in cls.cache:
-            data, timestamp = cls.cache[key]
-            if datetime.now() - timestamp < cls.cache_duration:
-                return data
-            else:
-                del cls.cache[key]
-        return None
+    async def _get_from_cache(cls, source: str, key: str) -> Optional[Any]:
+        """Get data from the memory cache, then the persistent cache, if not expired"""
+        data = cls.cache.get(source, key)
+        if data is None and cls.persistent_cache is not None:
+            stored = await asyncio.to_thread(cls.persistent_cache.get, source, key)
+            if stored is not None:
+                # Promote so the next hit on this worker stays in memory, but
+                # only for what is left of the persistent entry's TTL
+                data, expires_at = stored
+                cls.cache.set(source, key, data, ttl_seconds=expires_at - time.time())
+        return data
+    
+    @classmethod
+    async def _set_cache(cls, source: str, key: str, data: Any):
+        """Store data in cache (and the persistent cache when configured)"""
+        cls.cache.set(source, key, data)
+        if cls.persistent_cache is not None:
+            await asyncio.to_thread(cls.persistent_cache.set, source, key, data)
+    
+    # Upstream requests in flight, so concurrent identical lookups share one
+    _inflight: Dict[Tuple[str, str, int], asyncio.Task] = {}
+    
+    @classmethod
+    async def _single_flight(cls, key: Tuple[str, str, int], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the in-flight request for `key`, starting it if there is none"""
+        task = cls._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            cls._inflight[key] = task
+
+            def forget(done: asyncio.Task):
+                if cls._inflight.get(key) is done:
+                    del cls._inflight[key]
+
+            task.add_done_callback(forget)
+        else:
+            logger.debug(f"Joining in-flight {key[0]} request")
+        # A caller that gets cancelled must not cancel the request for the others
+        return await asyncio.shield(task)
     
     @classmethod
-    def _set_cache(cls, key: str, data: Dict):
-        """Store data in cache"""
-        cls.cache[key] = (data, datetime.now())
+    def cache_stats(cls) -> Dict:
+        """Hit/miss/eviction counters and size of the response caches"""
+        stats = cls.cache.stats()
+        if cls.persistent_cache is not None:
+            stats["persistent"] = cls.persistent_cache.stats()
+        return stats
     
     @classmethod
     async def search_google_books(cls, query: str, max_results: int = 40) -> List[Dict]:
@@ -57,58 +127,65 @@ class ExternalBookAPI:
             List of book dictionaries
         """
         cache_key = cls._get_cache_key("google", query)
-        cached_data = cls._get_from_cache(cache_key)
+        cached_data = await cls._get_from_cache("google", cache_key)
         
         if cached_data and isinstance(cached_data, list):
             logger.info(f"Returning cached Google Books results for: {query}")
             return cached_data
         
+        return await cls._single_flight(
+            ("google", cache_key, max_results),
+            lambda: cls._fetch_google_books(query, max_results, cache_key)
+        )
+    
+    @classmethod
+    async def _fetch_google_books(cls, query: str, max_results: int, cache_key: str) -> List[Dict]:
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                params = {
-                    "q": query,
-                    "maxResults": max_results,
-                    "printType": "books",
-                    "orderBy": "relevance"
-                }
-                
-                response = await client.get(cls.GOOGLE_BOOKS_BASE_URL, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                books = []
-                for item in data.get("items", []):
-                    volume_info = item.get("volumeInfo", {})
-                    
-                    book = {
-                        "external_id": item.get("id"),
-                        "source": "google_books",
-                        "title": volume_info.get("title", "Unknown Title"),
-                        "authors": volume_info.get("authors", []),
-                        "author": ", ".join(volume_info.get("authors", ["Unknown Author"])),
-                        "description": volume_info.get("description", ""),
-                        "publisher": volume_info.get("publisher", ""),
-                        "published_date": volume_info.get("publishedDate", ""),
-                        "isbn": next((id["identifier"] for id in volume_info.get("industryIdentifiers", []) 
-                                     if id["type"] in ["ISBN_13", "ISBN_10"]), None),
-                        "page_count": volume_info.get("pageCount", 0),
-                        "categories": volume_info.get("categories", []),
-                        "genres": volume_info.get("categories", []),
-                        "average_rating": volume_info.get("averageRating", 0.0),
-                        "ratings_count": volume_info.get("ratingsCount", 0),
-                        "language": volume_info.get("language", "en"),
-                        "preview_link": volume_info.get("previewLink", ""),
-                        "info_link": volume_info.get("infoLink", ""),
-                        "cover_image_url": volume_info.get("imageLinks", {}).get("thumbnail", 
-                                          volume_info.get("imageLinks", {}).get("smallThumbnail", "")),
-                        "thumbnail": volume_info.get("imageLinks", {}).get("thumbnail", ""),
-                    }
-                    books.append(book)
-                
-                cls._set_cache(cache_key, books)  # type: ignore[arg-type]
-                logger.info(f"Fetched {len(books)} books from Google Books API")
-                return books
+            client = HTTPClients.get(GOOGLE_BOOKS)
+            params = {
+                "q": query,
+                "maxResults": max_results,
+                "printType": "books",
+                "orderBy": "relevance"
+            }
+            
+            response = await client.get(cls.GOOGLE_BOOKS_BASE_URL, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            books = []
+            for item in data.get("items", []):
+                volume_info = item.get("volumeInfo", {})
                 
+                book = {
+                    "external_id": item.get("id"),
+                    "source": "google_books",
+                    "title": volume_info.get("title", "Unknown Title"),
+                    "authors": volume_info.get("authors", []),
+                    "author": ", ".join(volume_info.get("authors", ["Unknown Author"])),
+                    "description": volume_info.get("description", ""),
+                    "publisher": volume_info.get("publisher", ""),
+                    "published_date": volume_info.get("publishedDate", ""),
+                    "isbn": next((id["identifier"] for id in volume_info.get("industryIdentifiers", []) 
+                                 if id["type"] in ["ISBN_13", "ISBN_10"]), None),
+                    "page_count": volume_info.get("pageCount", 0),
+                    "categories": volume_info.get("categories", []),
+                    "genres": volume_info.get("categories", []),
+                    "average_rating": volume_info.get("averageRating", 0.0),
+                    "ratings_count": volume_info.get("ratingsCount", 0),
+                    "language": volume_info.get("language", "en"),
+                    "preview_link": volume_info.get("previewLink", ""),
+                    "info_link": volume_info.get("infoLink", ""),
+                    "cover_image_url": volume_info.get("imageLinks", {}).get("thumbnail", 
+                                      volume_info.get("imageLinks", {}).get("smallThumbnail", "")),
+                    "thumbnail": volume_info.get("imageLinks", {}).get("thumbnail", ""),
+                }
+                books.append(book)
+            
+            await cls._set_cache("google", cache_key, books)
+            logger.info(f"Fetched {len(books)} books from Google Books API")
+            return books
+            
         except Exception as e:
             logger.error(f"Error fetching from Google Books API: {str(e)}")
             return []
@@ -126,58 +203,97 @@ class ExternalBookAPI:
             List of book dictionaries
         """
         cache_key = cls._get_cache_key("open_library", query)
-        cached_data = cls._get_from_cache(cache_key)
+        cached_data = await cls._get_from_cache("open_library", cache_key)
         
         if cached_data and isinstance(cached_data, list):
             logger.info(f"Returning cached Open Library results for: {query}")
             return cached_data
         
+        return await cls._single_flight(
+            ("open_library", cache_key, limit),
+            lambda: cls._fetch_open_library(query, limit, cache_key)
+        )
+    
+    @classmethod
+    async def _fetch_open_library(cls, query: str, limit: int, cache_key: str) -> List[Dict]:
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                params = {
-                    "q": query,
-                    "limit": limit,
-                    "fields": "key,title,author_name,first_publish_year,isbn,subject,cover_i,ratings_average,ratings_count,number_of_pages_median,language,publisher"
-                }
-                
-                response = await client.get(f"{cls.OPEN_LIBRARY_BASE_URL}/search.json", params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                books = []
-                for doc in data.get("docs", []):
-                    cover_id = doc.get("cover_i")
-                    cover_url = f"{cls.OPEN_LIBRARY_COVERS}/id/{cover_id}-L.jpg" if cover_id else ""
-                    
-                    book = {
-                        "external_id": doc.get("key", "").replace("/works/", ""),
-                        "source": "open_library",
-                        "title": doc.get("title", "Unknown Title"),
-                        "authors": doc.get("author_name", []),
-                        "author": ", ".join(doc.get("author_name", ["Unknown Author"])),
-                        "description": "",  # Open Library search doesn't include descriptions
-                        "publisher": ", ".join(doc.get("publisher", [])[:3]) if doc.get("publisher") else "",
-                        "published_date": str(doc.get("first_publish_year", "")),
-                        "isbn": doc.get("isbn", [None])[0] if doc.get("isbn") else None,
-                        "page_count": doc.get("number_of_pages_median", 0),
-                        "categories": doc.get("subject", [])[:5],
-                        "genres": doc.get("subject", [])[:5],
-                        "average_rating": doc.get("ratings_average", 0.0),
-                        "ratings_count": doc.get("ratings_count", 0),
-                        "language": doc.get("language", ["en"])[0] if doc.get("language") else "en",
-                        "cover_image_url": cover_url,
-                        "thumbnail": cover_url,
-                    }
-                    books.append(book)
-                
-                cls._set_cache(cache_key, books)  # type: ignore[arg-type]
-                logger.info(f"Fetched {len(books)} books from Open Library API")
-                return books
+            client = HTTPClients.get(OPEN_LIBRARY)
+            params = {
+                "q": query,
+                "limit": limit,
+                "fields": "key,title,author_name,first_publish_year,isbn,subject,cover_i,ratings_average,ratings_count,number_of_pages_median,language,publisher"
+            }
+            
+            response = await client.get(f"{cls.OPEN_LIBRARY_BASE_URL}/search.json", params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            books = []
+            for doc in data.get("docs", []):
+                cover_id = doc.get("cover_i")
+                cover_url = f"{cls.OPEN_LIBRARY_COVERS}/id/{cover_id}-L.jpg" if cover_id else ""
                 
+                book = {
+                    "external_id": doc.get("key", "").replace("/works/", ""),
+                    "source": "open_library",
+                    "title": doc.get("title", "Unknown Title"),
+                    "authors": doc.get("author_name", []),
+                    "author": ", ".join(doc.get("author_name", ["Unknown Author"])),
+                    "description": "",  # Open Library search doesn't include descriptions
+                    "publisher": ", ".join(doc.get("publisher", [])[:3]) if doc.get("publisher") else "",
+                    "published_date": str(doc.get("first_publish_year", "")),
+                    "isbn": doc.get("isbn", [None])[0] if doc.get("isbn") else None,
+                    "page_count": doc.get("number_of_pages_median", 0),
+                    "categories": doc.get("subject", [])[:5],
+                    "genres": doc.get("subject", [])[:5],
+                    "average_rating": doc.get("ratings_average", 0.0),
+                    "ratings_count": doc.get("ratings_count", 0),
+                    "language": doc.get("language", ["en"])[0] if doc.get("language") else "en",
+                    "cover_image_url": cover_url,
+                    "thumbnail": cover_url,
+                }
+                books.append(book)
+            
+            await cls._set_cache("open_library", cache_key, books)
+            logger.info(f"Fetched {len(books)} books from Open Library API")
+            return books
+            
         except Exception as e:
             logger.error(f"Error fetching from Open Library API: {str(e)}")
             return []
     
+    @classmethod
+    async def _gather_within(cls, searches: List[Tuple[str, Awaitable[List[Dict]]]], deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Run searches concurrently, each bounded by the deadline
+        
+        A search that times out or fails contributes no books, so the caller
+        gets partial results after at most `deadline` seconds. The shared
+        upstream request keeps running and fills the cache for the next call.
+        """
+        timeout = settings.EXTERNAL_SOURCE_DEADLINE_SECONDS if deadline is None else deadline
+        
+        async def bounded(label: str, search: Awaitable[List[Dict]]) -> List[Dict]:
+            try:
+                return await asyncio.wait_for(search, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"External search {label} exceeded {timeout}s, returning partial results")
+            except Exception as e:
+                logger.error(f"External search {label} failed: {str(e)}")
+            return []
+        
+        results = await asyncio.gather(*(bounded(label, search) for label, search in searches))
+        return [book for books in results for book in books]
+    
+    @classmethod
+    async def search_all_sources(cls, query: str, limit: int = 20) -> List[Dict]:
+        """Search Google Books and Open Library concurrently and merge the results"""
+        books = await cls._gather_within([
+            ("google", cls.search_google_books(query, max_results=limit // 2)),
+            ("open_library", cls.search_open_library(query, limit=limit // 2))
+        ])
+        return dedupe_books(books)
+    
     @classmethod
     async def get_book_by_isbn(cls, isbn: str) -> Optional[Dict]:
         """Get book details by ISBN from both APIs"""
@@ -202,20 +318,12 @@ class ExternalBookAPI:
             "award winning books"
         ]
         
-        all_books = []
-        for query in queries:
-            books = await cls.search_google_books(query, max_results=15)
-            all_books.extend(books)
-        
-        # Remove duplicates based on title
-        seen_titles = set()
-        unique_books = []
-        for book in all_books:
-            if book["title"] not in seen_titles:
-                seen_titles.add(book["title"])
-                unique_books.append(book)
+        all_books = await cls._gather_within([
+            (f"google:{query}", cls.search_google_books(query, max_results=15))
+            for query in queries
+        ])
         
-        return unique_books[:40]
+        return dedupe_books(all_books)[:40]
     
     @classmethod
     async def get_books_by_genre(cls, genre: str, limit: int = 20) -> List[Dict]:
@@ -0,0 +1,58 @@
+"""
+Cached genre lookups for book listings
+Loads genres for a whole slate of books with one IN query
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models import Book, Genre
+
+
+class GenreCache:
+    """Process-wide id -> genre map plus batched book -> genres lookup"""
+
+    genres: Dict[int, Dict] = {}
+    loaded_at: Optional[datetime] = None
+    cache_duration = timedelta(minutes=10)
+
+    @classmethod
+    def get_genres(cls, db: Session, refresh: bool = False) -> Dict[int, Dict]:
+        """Return the id -> {id, name, description} map, reloading when stale"""
+        expired = cls.loaded_at is None or datetime.now() - cls.loaded_at > cls.cache_duration
+        if refresh or expired:
+            cls.genres = {
+                genre_id: {"id": genre_id, "name": name, "description": description}
+                for genre_id, name, description in db.query(Genre.id, Genre.name, Genre.description).all()
+            }
+            cls.loaded_at = datetime.now()
+        return cls.genres
+
+    @classmethod
+    def genres_for_books(cls, db: Session, book_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Map each book id to its genres using a single query on the association table"""
+        if not book_ids:
+            return {}
+
+        book_genres = Book.genres.property.secondary
+        rows = (
+            db.query(book_genres.c.book_id, book_genres.c.genre_id)
+            .filter(book_genres.c.book_id.in_(book_ids))
+            .all()
+        )
+
+        genres = cls.get_genres(db)
+        if any(genre_id not in genres for _, genre_id in rows):
+            # A genre was created since the last load
+            genres = cls.get_genres(db, refresh=True)
+
+        result: Dict[int, List[Dict]] = {book_id: [] for book_id in book_ids}
+        for book_id, genre_id in rows:
+            genre = genres.get(genre_id)
+            if genre is not None:
+                result[book_id].append(genre)
+        return result
+
+    @classmethod
+    def invalidate(cls):
+        """Force a reload on next access"""
+        cls.loaded_at = None
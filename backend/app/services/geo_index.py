@@ -0,0 +1,195 @@
+"""
+Grid-clustered geospatial index of mood books for the world map
+Per zoom level, books are bucketed into Web Mercator grid cells and each cell
+is precomputed as one cluster marker, so a map viewport is a few sorted-array
+range lookups
+"""
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.whichbook import MoodBook
+
+
+# Cells per axis at zoom z are 2^(z + CELL_SHIFT): with 256px map tiles that
+# makes each cell about 64px on screen
+CELL_SHIFT = 2
+# Clusters are precomputed up to this zoom; deeper zooms return single books
+MAX_CLUSTER_ZOOM = 10
+# Web Mercator latitude limit
+MAX_LATITUDE = 85.05112878
+
+
+def _grid_xy(latitude: np.ndarray, longitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator position of each point in [0, 1) x [0, 1), origin top-left"""
+    x = (np.asarray(longitude, dtype=np.float64) + 180.0) / 360.0
+    lat = np.radians(np.clip(np.asarray(latitude, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.clip(x, 0.0, np.nextafter(1.0, 0.0)), np.clip(y, 0.0, np.nextafter(1.0, 0.0))
+
+
+def _cells_per_axis(zoom: int) -> int:
+    return 1 << (zoom + CELL_SHIFT)
+
+
+class ClusterLevel:
+    """Cluster markers of one zoom level, sorted by row-major cell key"""
+
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, book_ids: np.ndarray):
+        self.keys = keys
+        self.counts = counts
+        self.latitude = latitude
+        self.longitude = longitude
+        self.book_ids = book_ids  # the book of single-book cells, -1 otherwise
+
+    @classmethod
+    def build(cls, cell_keys: np.ndarray, ids: np.ndarray, latitude: np.ndarray, longitude: np.ndarray) -> 'ClusterLevel':
+        keys, inverse, counts = np.unique(cell_keys, return_inverse=True, return_counts=True)
+        sums_lat = np.bincount(inverse, weights=latitude, minlength=len(keys))
+        sums_lon = np.bincount(inverse, weights=longitude, minlength=len(keys))
+        book_ids = np.full(len(keys), -1, dtype=np.int64)
+        single = counts[inverse] == 1
+        book_ids[inverse[single]] = ids[single]
+        return cls(
+            keys,
+            counts.astype(np.int32),
+            (sums_lat / counts).astype(np.float32),
+            (sums_lon / counts).astype(np.float32),
+            book_ids
+        )
+
+
+class MoodGeoIndex:
+    """Clustered grid index over mood books with coordinates
+
+    Levels 0..MAX_CLUSTER_ZOOM hold one precomputed cluster per occupied
+    cell. A bounding box becomes one key range per grid row in view,
+    resolved with a single vectorized searchsorted. Beyond the last
+    cluster level, the books themselves (sorted by their finest cell) are
+    returned.
+    """
+
+    # Process-wide index, rebuilt when invalidated or older than cache_duration
+    _current: Optional['MoodGeoIndex'] = None
+    loaded_at: Optional[datetime] = None
+    cache_duration = timedelta(minutes=10)
+    _lock = threading.Lock()
+
+    def __init__(self, ids: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, max_zoom: int = MAX_CLUSTER_ZOOM):
+        self.max_zoom = max_zoom
+        x, y = _grid_xy(latitude, longitude)
+        self.levels: List[ClusterLevel] = []
+        for zoom in range(max_zoom + 1):
+            self.levels.append(ClusterLevel.build(self._cell_keys(x, y, zoom), ids, latitude, longitude))
+
+        # Individual books for zooms past the last cluster level
+        finest = self._cell_keys(x, y, max_zoom)
+        order = np.argsort(finest, kind='stable')
+        self.point_keys = finest[order]
+        self.point_ids = ids[order]
+        self.point_latitude = latitude[order].astype(np.float32)
+        self.point_longitude = longitude[order].astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.point_ids)
+
+    @staticmethod
+    def _cell_keys(x: np.ndarray, y: np.ndarray, zoom: int) -> np.ndarray:
+        n = _cells_per_axis(zoom)
+        return (y * n).astype(np.int64) * n + (x * n).astype(np.int64)
+
+    @classmethod
+    def from_db(cls, db: Session) -> 'MoodGeoIndex':
+        """Build from mood books that have both coordinates"""
+        rows = db.query(MoodBook.id, MoodBook.latitude, MoodBook.longitude).filter(
+            MoodBook.latitude.isnot(None),
+            MoodBook.longitude.isnot(None)
+        ).all()
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.float64),
+            np.array([row[2] for row in rows], dtype=np.float64)
+        )
+
+    @classmethod
+    def current(cls, db: Session, refresh: bool = False) -> 'MoodGeoIndex':
+        """The process-wide index, rebuilt from the database when stale"""
+        expired = cls.loaded_at is None or datetime.now() - cls.loaded_at > cls.cache_duration
+        if refresh or expired or cls._current is None:
+            with cls._lock:
+                # Another request may have rebuilt it while we waited
+                expired = cls.loaded_at is None or datetime.now() - cls.loaded_at > cls.cache_duration
+                if refresh or expired or cls._current is None:
+                    cls._current = cls.from_db(db)
+                    cls.loaded_at = datetime.now()
+        return cls._current  # type: ignore[return-value]
+
+    @classmethod
+    def invalidate(cls):
+        """Force a rebuild on next access (call after mood books change)"""
+        cls.loaded_at = None
+
+    @staticmethod
+    def _key_ranges(sorted_keys: np.ndarray, bbox: Tuple[float, float, float, float], zoom: int) -> np.ndarray:
+        """Positions in `sorted_keys` of every cell intersecting the bbox (west, south, east, north)"""
+        west, south, east, north = bbox
+        n = _cells_per_axis(zoom)
+        (x0, x1), (y_top, y_bottom) = _grid_xy(np.array([north, south]), np.array([west, east]))
+        row_start, row_end = int(y_top * n), int(y_bottom * n)
+        col_start, col_end = int(x0 * n), int(x1 * n)
+
+        # A box crossing the antimeridian (west > east) wraps around
+        col_spans = [(col_start, col_end)] if west <= east else [(col_start, n - 1), (0, col_end)]
+        rows = np.arange(row_start, row_end + 1, dtype=np.int64) * n
+        positions = []
+        for first, last in col_spans:
+            starts = np.searchsorted(sorted_keys, rows + first, side='left')
+            ends = np.searchsorted(sorted_keys, rows + last, side='right')
+            positions.extend(np.arange(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s)
+        return np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+
+    def tiles(self, bbox: Tuple[float, float, float, float], zoom: int, limit: int = 5000) -> Dict:
+        """Cluster markers (or single books past the last cluster level) inside a bbox"""
+        if zoom <= self.max_zoom:
+            level = self.levels[max(zoom, 0)]
+            positions = self._key_ranges(level.keys, bbox, zoom)
+            truncated = len(positions) > limit
+            positions = positions[:limit]
+            clusters = [
+                {
+                    "latitude": round(float(lat), 5),
+                    "longitude": round(float(lon), 5),
+                    "count": int(count),
+                    "book_id": int(book_id) if book_id >= 0 else None
+                }
+                for lat, lon, count, book_id in zip(
+                    level.latitude[positions], level.longitude[positions],
+                    level.counts[positions], level.book_ids[positions]
+                )
+            ]
+        else:
+            positions = self._key_ranges(self.point_keys, bbox, self.max_zoom)
+            # Finest cells can overhang the box; keep only books inside it
+            west, south, east, north = bbox
+            lat, lon = self.point_latitude[positions], self.point_longitude[positions]
+            in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+            positions = positions[in_lon & (lat >= south) & (lat <= north)]
+            truncated = len(positions) > limit
+            positions = positions[:limit]
+            clusters = [
+                {"latitude": round(float(lat), 5), "longitude": round(float(lon), 5), "count": 1, "book_id": int(book_id)}
+                for lat, lon, book_id in zip(
+                    self.point_latitude[positions], self.point_longitude[positions], self.point_ids[positions]
+                )
+            ]
+
+        return {
+            "zoom": zoom,
+            "clusters": clusters,
+            "total_books": int(sum(cluster["count"] for cluster in clusters)),
+            "truncated": truncated
+        }
@@ -0,0 +1,72 @@
+"""
+Application-lifetime HTTP clients for external upstreams
+One pooled keep-alive httpx.AsyncClient per upstream, opened and closed by the
+FastAPI lifespan, so external calls reuse connections instead of paying a TCP
+and TLS handshake each time
+"""
+import logging
+from typing import Dict
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+GOOGLE_BOOKS = "google_books"
+OPEN_LIBRARY = "open_library"
+IMAGES = "images"
+
+# Per-upstream client options on top of the shared limits
+UPSTREAMS: Dict[str, Dict] = {
+    GOOGLE_BOOKS: {},
+    OPEN_LIBRARY: {},
+    IMAGES: {"follow_redirects": True}
+}
+
+
+class HTTPClients:
+    """Registry of shared AsyncClients, keyed by upstream name"""
+
+    _clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def _create(cls, name: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+            **UPSTREAMS.get(name, {})
+        )
+
+    @classmethod
+    def get(cls, name: str) -> httpx.AsyncClient:
+        """The shared client for an upstream (created lazily outside the app lifespan)"""
+        client = cls._clients.get(name)
+        if client is None or client.is_closed:
+            client = cls._clients[name] = cls._create(name)
+        return client
+
+    @classmethod
+    async def startup(cls):
+        """Open every upstream's client"""
+        for name in UPSTREAMS:
+            cls.get(name)
+        logger.info(f"Opened shared HTTP clients ({'HTTP/2' if settings.HTTP2_ENABLED and HTTP2_AVAILABLE else 'HTTP/1.1'})")
+
+    @classmethod
+    async def shutdown(cls):
+        """Close every client and its pooled connections"""
+        clients, cls._clients = cls._clients, {}
+        for client in clients.values():
+            await client.aclose()
@@ -0,0 +1,250 @@
+"""
+In-memory mood similarity index
+Pre-normalized float32 mood vectors partitioned by country and complexity, so a
+filtered mood query scores one contiguous slice instead of every book
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree, KDTree
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.whichbook import MoodBook
+
+
+MOOD_DIMENSIONS = 8
+
+TREE_KINDS = {
+    'kd_tree': KDTree,
+    'ball_tree': BallTree
+}
+
+# Below this many rows a vectorized scan beats any tree
+TREE_MIN_ROWS = 2048
+
+
+def normalize_mood_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows; all-zero rows stay zero (cosine 0 with anything)"""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, MOOD_DIMENSIONS)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _mood_row(mood_vector) -> Sequence[float]:
+    # Malformed vectors score 0, as a zero vector would
+    if mood_vector is None or len(mood_vector) != MOOD_DIMENSIONS:
+        return [0.0] * MOOD_DIMENSIONS
+    return [float(v or 0.0) for v in mood_vector]
+
+
+class MoodIndex:
+    """Mood vectors of every MoodBook plus aligned id, country and complexity arrays
+
+    Rows are partitioned by country and sorted by complexity inside each
+    partition, so a country and/or complexity filter resolves to one
+    contiguous slice found with searchsorted; only that slice is scored.
+    Complexity is float32 with NaN (sorted last) for books without one, so
+    range filters exclude them exactly like the SQL comparisons did.
+
+    With `tree` ("kd_tree" or "ball_tree"), unfiltered and country-only
+    queries use an exact nearest-neighbor tree over the unit vectors
+    instead (Euclidean order on unit vectors is cosine order:
+    cos = 1 - d^2 / 2). Trees for country partitions are built on first use;
+    complexity-filtered queries always scan their slice.
+    """
+
+    # Process-wide index, rebuilt when invalidated or older than cache_duration
+    _current: Optional['MoodIndex'] = None
+    loaded_at: Optional[datetime] = None
+    cache_duration = timedelta(minutes=10)
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        vectors: np.ndarray,
+        country_codes: np.ndarray,
+        country_names: Sequence[Optional[str]],
+        complexity: np.ndarray,
+        tree: Optional[str] = None,
+        leaf_size: int = 40
+    ):
+        if tree is not None and tree not in TREE_KINDS:
+            raise ValueError(f"Unknown mood index tree {tree!r}; expected one of {sorted(TREE_KINDS)}")
+        # Partition by country, complexity ascending within each, ties by id
+        order = np.lexsort((ids, complexity, country_codes))
+        self.ids = ids[order]
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.country_codes = country_codes[order]
+        self.complexity = complexity[order]
+        self.country_names = list(country_names)
+        self.country_lookup = {name: code for code, name in enumerate(self.country_names)}
+        self.country_offsets = np.searchsorted(self.country_codes, np.arange(len(self.country_names) + 1))
+
+        # Whole-catalog complexity order for range filters without a country
+        self.complexity_order = np.lexsort((self.ids, self.complexity))
+        self.complexity_sorted = self.complexity[self.complexity_order]
+
+        # Trees index only non-zero vectors: a zero vector has cosine 0 with
+        # everything but is at distance 1 from every unit query
+        self.tree = tree
+        self.leaf_size = leaf_size
+        self.nonzero = np.any(self.vectors != 0, axis=1)
+        self._trees: Dict[Tuple[int, int], Tuple[object, np.ndarray]] = {}
+        if tree is not None:
+            self._tree_for(0, len(self))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        ids: Iterable[int],
+        mood_vectors: Iterable[Sequence[float]],
+        countries: Iterable[Optional[str]],
+        complexity: Iterable[Optional[float]],
+        tree: Optional[str] = None,
+        leaf_size: int = 40
+    ) -> 'MoodIndex':
+        """Build an index from parallel columns (raw, unnormalized mood vectors)"""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = normalize_mood_vectors(np.array([_mood_row(v) for v in mood_vectors], dtype=np.float32))
+        country_names, country_codes = np.unique(
+            np.array([c or '' for c in countries], dtype=object).astype(str), return_inverse=True
+        )
+        complexity = np.array([np.nan if c is None else c for c in complexity], dtype=np.float32)
+        # '' stands for "no country" and never matches a filter
+        names = [name or None for name in country_names.tolist()]
+        return cls(ids, vectors, country_codes.astype(np.int32).reshape(-1), names, complexity, tree, leaf_size)
+
+    @classmethod
+    def from_db(cls, db: Session, tree: Optional[str] = None) -> 'MoodIndex':
+        """Build from the mood_books table, loading only the indexed columns"""
+        rows = db.query(MoodBook.id, MoodBook.mood_vector, MoodBook.country, MoodBook.complexity).order_by(MoodBook.id).all()
+        return cls.from_arrays(
+            (row[0] for row in rows),
+            (row[1] for row in rows),
+            (row[2] for row in rows),
+            (row[3] for row in rows),
+            tree=tree
+        )
+
+    @classmethod
+    def current(cls, db: Session, refresh: bool = False) -> 'MoodIndex':
+        """The process-wide index, rebuilt from the database when stale"""
+        expired = cls.loaded_at is None or datetime.now() - cls.loaded_at > cls.cache_duration
+        if refresh or expired or cls._current is None:
+            with cls._lock:
+                # Another request may have rebuilt it while we waited
+                expired = cls.loaded_at is None or datetime.now() - cls.loaded_at > cls.cache_duration
+                if refresh or expired or cls._current is None:
+                    cls._current = cls.from_db(db, tree=settings.MOOD_INDEX_TREE)
+                    cls.loaded_at = datetime.now()
+        return cls._current  # type: ignore[return-value]
+
+    @classmethod
+    def invalidate(cls):
+        """Force a rebuild on next access (call after mood books change)"""
+        cls.loaded_at = None
+
+    def candidate_rows(
+        self,
+        country_filter: str = "",
+        complexity_min: int = 1,
+        complexity_max: int = 10
+    ):
+        """Rows passing the filters: a slice into the partitioned arrays, or an index array"""
+        low = complexity_min if complexity_min and complexity_min > 1 else None
+        high = complexity_max if complexity_max and complexity_max < 10 else None
+
+        if country_filter:
+            code = self.country_lookup.get(country_filter)
+            if code is None:
+                return slice(0, 0)
+            start, end = int(self.country_offsets[code]), int(self.country_offsets[code + 1])
+            lo, hi = self._complexity_range(self.complexity[start:end], low, high)
+            return slice(start + lo, start + hi)
+
+        if low is None and high is None:
+            return slice(0, len(self))
+        lo, hi = self._complexity_range(self.complexity_sorted, low, high)
+        return np.sort(self.complexity_order[lo:hi])
+
+    @staticmethod
+    def _complexity_range(sorted_complexity: np.ndarray, low: Optional[int], high: Optional[int]) -> Tuple[int, int]:
+        """[lo, hi) of a complexity-sorted run within [low, high]; NaN (no complexity) sorts last"""
+        if low is None and high is None:
+            return 0, len(sorted_complexity)
+        lo = int(np.searchsorted(sorted_complexity, low, side='left')) if low is not None else 0
+        # Without an upper bound, stop before the NaN tail
+        bound = high if high is not None else np.inf
+        hi = int(np.searchsorted(sorted_complexity, bound, side='right'))
+        return lo, max(lo, hi)
+
+    def search(
+        self,
+        user_mood_vector: Sequence[float],
+        limit: int = 10,
+        country_filter: str = "",
+        complexity_min: int = 1,
+        complexity_max: int = 10
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(MoodBook ids, cosine scores) of the best `limit` matches, best first"""
+        query = normalize_mood_vectors(np.asarray(_mood_row(user_mood_vector), dtype=np.float32))[0]
+        rows = self.candidate_rows(country_filter, complexity_min, complexity_max)
+
+        unfiltered_range = not (complexity_min and complexity_min > 1) and not (complexity_max and complexity_max < 10)
+        if self.tree is not None and unfiltered_range and isinstance(rows, slice) and query.any():
+            found = self._tree_search(query, rows.start, rows.stop, limit)
+            if found is not None:
+                return found
+
+        ids = self.ids[rows]
+        scores = self.vectors[rows] @ query
+        top = self._top(scores, ids, limit)
+        return ids[top], scores[top]
+
+    def _tree_for(self, start: int, end: int) -> Tuple[object, np.ndarray]:
+        """Tree over the non-zero rows of [start, end), built once per range"""
+        key = (start, end)
+        cached = self._trees.get(key)
+        if cached is None:
+            rows = start + np.flatnonzero(self.nonzero[start:end])
+            cached = (TREE_KINDS[self.tree](self.vectors[rows], leaf_size=self.leaf_size), rows)  # type: ignore[index]
+            self._trees[key] = cached
+        return cached
+
+    def _tree_search(self, query: np.ndarray, start: int, end: int, limit: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-`limit` from the range's tree; None when a scan is the better choice"""
+        if end - start < TREE_MIN_ROWS:
+            return None
+        tree, rows = self._tree_for(start, end)
+        if len(rows) < limit:
+            # Zero-vector books would be needed to fill the result
+            return None
+        _, positions = tree.query(query[None, :].astype(np.float64), k=limit)  # type: ignore[attr-defined]
+        found = rows[positions[0]]
+        # Rescore exactly so values match the scan path bit for bit
+        scores = self.vectors[found] @ query
+        order = np.lexsort((self.ids[found], -scores))
+        return self.ids[found[order]], scores[order]
+
+    @staticmethod
+    def _top(scores: np.ndarray, ids: np.ndarray, limit: int) -> np.ndarray:
+        """Positions of the `limit` highest scores, best first (ties by id)"""
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64)
+        if limit < len(scores):
+            # Keep every row tied with the cut-off so ties resolve by id
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(scores))
+        order = np.lexsort((ids[candidates], -scores[candidates]))
+        return candidates[order[:limit]]
@@ -0,0 +1,182 @@
+"""
+Streaming bulk ingestion of mood books from NDJSON or CSV
+Rows are parsed one at a time, then validated, auto-tagged and inserted in
+batches with one commit per batch
+"""
+import csv
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.whichbook import MoodBook
+from app.schemas.whichbook import MoodBookCreate
+from app.services.mood_index import MOOD_DIMENSIONS
+from app.services.mood_recommender import MoodRecommender
+from app.services.mood_tagger import MOOD_LABELS, tag_moods
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+INGEST_FORMATS = ('ndjson', 'csv')
+
+# Empty CSV cells for these columns mean "not given" (schema default applies)
+_OPTIONAL_FIELDS = ('country', 'cover_url', 'description', 'literary_tone', 'latitude', 'longitude', 'complexity', 'book_id')
+
+
+def ingest_format_for(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """'ndjson' or 'csv' from a file name or content type, None if unknown"""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or (content_type or '').endswith(('ndjson', 'jsonl')):
+        return 'ndjson'
+    if name.endswith('.csv') or (content_type or '') == 'text/csv':
+        return 'csv'
+    return None
+
+
+class MoodBookIngestor:
+    """Validate, auto-tag and insert mood books in batches
+
+    Rows without a mood vector are tagged from their description. Invalid
+    rows are skipped and reported by line number (up to `max_errors`); a
+    batch the database rejects is rolled back and counted as failed. The
+    in-memory mood state is refreshed once, after the last batch.
+    """
+
+    def __init__(self, db: Session, batch_size: int = DEFAULT_BATCH_SIZE, max_errors: int = 100):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.failed = 0
+        self.auto_tagged = 0
+        self.batches = 0
+        self.errors: List[Dict] = []
+        self.countries: List[Optional[str]] = []
+
+    def _error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def ingest_ndjson(self, lines: Iterable[str]) -> Dict:
+        """Ingest one JSON object per line"""
+        return self.ingest(self._ndjson_rows(lines))
+
+    def ingest_csv(self, lines: Iterable[str]) -> Dict:
+        """Ingest CSV with a header row; mood_vector is a JSON list or eight per-mood columns"""
+        return self.ingest(self._csv_rows(lines))
+
+    def ingest(self, rows: Iterable[Tuple[int, Dict]]) -> Dict:
+        """Ingest (line number, raw row) pairs and return a summary"""
+        batch: List[Tuple[int, Dict]] = []
+        try:
+            for line, row in rows:
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            if batch:
+                self._flush(batch)
+        finally:
+            # Committed batches stay even if reading the input fails midway
+            if self.inserted:
+                MoodRecommender.books_changed(added_countries=self.countries)
+        logger.info(f"Ingested {self.inserted} mood books in {self.batches} batches ({self.failed} rows failed)")
+        return self.summary()
+
+    def summary(self) -> Dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "auto_tagged": self.auto_tagged,
+            "batches": self.batches,
+            "errors": self.errors
+        }
+
+    def _ndjson_rows(self, lines: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+        for line_no, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                self._error(line_no, f"Invalid JSON: {e.msg}")
+                continue
+            if not isinstance(row, dict):
+                self._error(line_no, "Expected a JSON object")
+                continue
+            yield line_no, row
+
+    def _csv_rows(self, lines: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # line_num counts physical lines, so quoted newlines keep numbers right
+            line_no = reader.line_num
+            row = {key: value for key, value in row.items() if key is not None}
+            for field in _OPTIONAL_FIELDS:
+                if row.get(field) == '':
+                    del row[field]
+
+            raw_vector = row.pop('mood_vector', None)
+            per_mood = [row.pop(label, None) for label in MOOD_LABELS]
+            if raw_vector:
+                try:
+                    row['mood_vector'] = json.loads(raw_vector)
+                except json.JSONDecodeError:
+                    self._error(line_no, "mood_vector must be a JSON list")
+                    continue
+            elif all(value not in (None, '') for value in per_mood):
+                row['mood_vector'] = per_mood
+            yield line_no, row
+
+    def _flush(self, batch: List[Tuple[int, Dict]]):
+        # Validate first (a placeholder stands in for a missing mood vector),
+        # so tagging only ever sees rows that will be inserted
+        values = []
+        untagged = []
+        for line, row in batch:
+            needs_tags = not row.get('mood_vector')
+            try:
+                book = MoodBookCreate(**{**row, 'mood_vector': [0.0] * MOOD_DIMENSIONS} if needs_tags else row)
+            except ValidationError as e:
+                self._error(line, self._validation_message(e))
+                continue
+            if len(book.mood_vector) != MOOD_DIMENSIONS:
+                self._error(line, f"mood_vector must have {MOOD_DIMENSIONS} values")
+                continue
+            values.append(book.model_dump())
+            if needs_tags:
+                untagged.append(values[-1])
+
+        # Tag every valid row of the batch that lacks a mood vector in one call
+        if untagged:
+            for value, vector in zip(untagged, tag_moods(value['description'] for value in untagged)):
+                value['mood_vector'] = vector
+
+        self.batches += 1
+        if not values:
+            return
+        try:
+            self.db.execute(insert(MoodBook), values)
+            self.db.commit()
+            self.inserted += len(values)
+            self.auto_tagged += len(untagged)
+            self.countries.extend(value['country'] for value in values)
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.error(f"Mood book batch ending at line {batch[-1][0]} failed: {e}")
+            self.failed += len(values)
+            if len(self.errors) < self.max_errors:
+                self.errors.append({"line": batch[-1][0], "error": f"Batch of {len(values)} rows rejected by the database"})
+
+    @staticmethod
+    def _validation_message(error: ValidationError) -> str:
+        first = error.errors()[0]
+        location = '.'.join(str(part) for part in first.get('loc', ()))
+        return f"{location}: {first.get('msg')}" if location else str(first.get('msg'))
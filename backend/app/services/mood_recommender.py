@@ -2,9 +2,13 @@
 Mood-based book recommendation engine using cosine similarity
 """
 import numpy as np
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from app.models.whichbook import MoodBook
+from app.services.country_stats import CountryStatsCache
+from app.services.geo_index import MoodGeoIndex
+from app.services.mood_index import MoodIndex
+from app.services.mood_tagger import tag_mood, tag_moods
 
 
 class MoodRecommender:
@@ -54,32 +58,27 @@ class MoodRecommender:
         Returns:
             List of (book, similarity_score) tuples
         """
-        # Build query
-        query = db.query(MoodBook)
+        index = MoodIndex.current(db)
+        book_ids, scores = index.search(
+            user_mood_vector,
+            limit=limit,
+            country_filter=country_filter,
+            complexity_min=complexity_min,
+            complexity_max=complexity_max
+        )
+        if len(book_ids) == 0:
+            return []
         
-        # Apply filters
-        if country_filter:
-            query = query.filter(MoodBook.country == country_filter)
-        if complexity_min and complexity_min > 1:
-            query = query.filter(MoodBook.complexity >= complexity_min)
-        if complexity_max and complexity_max < 10:
-            query = query.filter(MoodBook.complexity <= complexity_max)
-        
-        # Get all books
-        all_books = query.all()
-        
-        # Calculate similarity for each book
-        scored_books = []
-        for book in all_books:
-            similarity = MoodRecommender.cosine_similarity(
-                user_mood_vector,
-                list(book.mood_vector)  # type: ignore[arg-type]
-            )
-            scored_books.append((book, similarity))
-        
-        # Sort by similarity (descending) and return top N
-        scored_books.sort(key=lambda x: x[1], reverse=True)
-        return scored_books[:limit]
+        # Fetch only the winning rows, in score order
+        books = {
+            book.id: book
+            for book in db.query(MoodBook).filter(MoodBook.id.in_(book_ids.tolist())).all()
+        }
+        return [
+            (books[book_id], float(score))
+            for book_id, score in zip(book_ids.tolist(), scores.tolist())
+            if book_id in books  # deleted since the index was built
+        ]
     
     @staticmethod
     def auto_tag_mood_from_description(description: str) -> List[float]:
@@ -89,43 +88,21 @@ class MoodRecommender:
         
         Returns: [happy, sad, calm, thrilling, dark, funny, emotional, optimistic]
         """
-        description_lower = description.lower()
-        
-        # Keyword mapping for each mood dimension
-        mood_keywords = {
-            'happy': ['joy', 'happy', 'cheerful', 'delight', 'smile', 'laughter', 'celebration'],
-            'sad': ['sad', 'tragic', 'sorrow', 'grief', 'loss', 'melancholy', 'tears'],
-            'calm': ['calm', 'peaceful', 'serene', 'tranquil', 'quiet', 'gentle', 'soothing'],
-            'thrilling': ['thriller', 'suspense', 'action', 'adventure', 'exciting', 'intense', 'fast-paced'],
-            'dark': ['dark', 'grim', 'horror', 'sinister', 'disturbing', 'macabre', 'ominous'],
-            'funny': ['funny', 'humor', 'comedy', 'hilarious', 'wit', 'amusing', 'entertaining'],
-            'emotional': ['emotional', 'heartfelt', 'moving', 'touching', 'poignant', 'deep'],
-            'optimistic': ['hope', 'optimistic', 'uplifting', 'inspiring', 'positive', 'bright']
-        }
-        
-        mood_vector = []
-        for mood_name in ['happy', 'sad', 'calm', 'thrilling', 'dark', 'funny', 'emotional', 'optimistic']:
-            keywords = mood_keywords[mood_name]
-            score = sum(1 for keyword in keywords if keyword in description_lower)
-            # Normalize to 0-10 scale (cap at 10)
-            normalized_score = min(score * 2, 10)
-            mood_vector.append(float(normalized_score))
-        
-        return mood_vector
+        return tag_mood(description)
+    
+    @staticmethod
+    def auto_tag_moods_from_descriptions(descriptions: List[str], n_jobs: Optional[int] = None) -> List[List[float]]:
+        """Auto-tag many descriptions at once (split across processes for large inputs)"""
+        return tag_moods(descriptions, n_jobs=n_jobs)
     
     @staticmethod
     def get_country_books_stats(db: Session) -> dict:
-        """Get statistics about books by country"""
-        from sqlalchemy import func
-        
-        stats = db.query(
-            MoodBook.country,
-            func.count(MoodBook.id).label('count')
-        ).filter(
-            MoodBook.country.isnot(None)
-        ).group_by(
-            MoodBook.country
-        ).all()
-        
-        return {country: count for country, count in stats}
-
+        """Get statistics about books by country (cached, see CountryStatsCache)"""
+        return dict(CountryStatsCache.get_book_counts(db))
+    
+    @staticmethod
+    def books_changed(added_countries: Iterable[Optional[str]] = (), removed_countries: Iterable[Optional[str]] = ()):
+        """Refresh the in-memory mood state after mood books are created or deleted"""
+        MoodIndex.invalidate()
+        MoodGeoIndex.invalidate()
+        CountryStatsCache.apply(added=added_countries, removed=removed_countries)
@@ -0,0 +1,120 @@
+"""
+Keyword mood tagging of book descriptions
+All mood keywords are compiled into one regex, so a description is scanned
+once instead of once per keyword
+"""
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+MOOD_LABELS = ['happy', 'sad', 'calm', 'thrilling', 'dark', 'funny', 'emotional', 'optimistic']
+
+# Keyword mapping for each mood dimension
+MOOD_KEYWORDS = {
+    'happy': ['joy', 'happy', 'cheerful', 'delight', 'smile', 'laughter', 'celebration'],
+    'sad': ['sad', 'tragic', 'sorrow', 'grief', 'loss', 'melancholy', 'tears'],
+    'calm': ['calm', 'peaceful', 'serene', 'tranquil', 'quiet', 'gentle', 'soothing'],
+    'thrilling': ['thriller', 'suspense', 'action', 'adventure', 'exciting', 'intense', 'fast-paced'],
+    'dark': ['dark', 'grim', 'horror', 'sinister', 'disturbing', 'macabre', 'ominous'],
+    'funny': ['funny', 'humor', 'comedy', 'hilarious', 'wit', 'amusing', 'entertaining'],
+    'emotional': ['emotional', 'heartfelt', 'moving', 'touching', 'poignant', 'deep'],
+    'optimistic': ['hope', 'optimistic', 'uplifting', 'inspiring', 'positive', 'bright']
+}
+
+# Descriptions per worker task, and the input size worth spawning processes for
+BULK_CHUNK_SIZE = 2000
+PARALLEL_MIN_DESCRIPTIONS = 20000
+
+# One worker pool per process, created on first large input and reused
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+_KEYWORDS = sorted({keyword for keywords in MOOD_KEYWORDS.values() for keyword in keywords})
+_MOOD_OF = {keyword: mood for mood, keywords in MOOD_KEYWORDS.items() for keyword in keywords}
+
+
+def _prefix_regex(words: List[str]) -> str:
+    """Alternation factored by common prefixes (a regex trie), longest match first
+
+    A flat 56-way alternation makes the engine try every keyword at every
+    word start; the trie tries one branch per character.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy optional tail: prefer the longer keyword
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+# Keywords must start a word: "smiles" counts as "smile", but "glossy" no
+# longer counts as "loss"
+_PATTERN = re.compile(r'\b(' + _prefix_regex(_KEYWORDS) + ')')
+
+# A match consumes its text, so it also stands for every other keyword
+# starting at a word boundary inside it (e.g. "fast-paced" would contain "paced")
+_IMPLIED: Dict[str, FrozenSet[str]] = {
+    keyword: implied
+    for keyword in _KEYWORDS
+    for implied in [frozenset(
+        other for other in _KEYWORDS
+        if other != keyword and re.search(r'\b' + re.escape(other), keyword)
+    )]
+    if implied
+}
+
+
+def tag_mood(description: Optional[str]) -> List[float]:
+    """
+    Mood vector of one description: 2 points per distinct keyword, capped at 10
+
+    Returns: [happy, sad, calm, thrilling, dark, funny, emotional, optimistic]
+    """
+    found = set(_PATTERN.findall((description or '').lower()))
+    for keyword in _IMPLIED.keys() & found:
+        found |= _IMPLIED[keyword]
+
+    counts = dict.fromkeys(MOOD_LABELS, 0)
+    for keyword in found:
+        counts[_MOOD_OF[keyword]] += 1
+    return [float(min(counts[mood] * 2, 10)) for mood in MOOD_LABELS]
+
+
+def _tag_chunk(descriptions: List[Optional[str]]) -> List[List[float]]:
+    return [tag_mood(description) for description in descriptions]
+
+
+def _shared_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _pool
+
+
+def tag_moods(descriptions: Iterable[Optional[str]], n_jobs: Optional[int] = None) -> List[List[float]]:
+    """Mood vectors of many descriptions, in order
+
+    Large inputs are split across the shared worker pool (concurrent calls
+    queue on it rather than starting more processes); n_jobs=1 keeps the
+    work in this process.
+    """
+    descriptions = list(descriptions)
+    workers = n_jobs or os.cpu_count() or 1
+    if workers <= 1 or len(descriptions) < PARALLEL_MIN_DESCRIPTIONS:
+        return _tag_chunk(descriptions)
+
+    chunks = [descriptions[i:i + BULK_CHUNK_SIZE] for i in range(0, len(descriptions), BULK_CHUNK_SIZE)]
+    return [vector for chunk in _shared_pool().map(_tag_chunk, chunks) for vector in chunk]
@@ -0,0 +1,135 @@
+"""
+Benchmark the mood index search modes: vectorized scan vs KD-tree vs ball tree
+Builds synthetic mood catalogs and reports build time, query latency
+percentiles and agreement with the exact scan
+
+Usage (from the backend directory):
+    python benchmark_mood_index.py --scales 10000,100000,1000000 --output mood_bench.json
+"""
+
+import os
+import sys
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.mood_index import MoodIndex, TREE_KINDS
+
+DEFAULT_SCALES = [10000, 100000, 1000000]
+MODES = ['scan'] + sorted(TREE_KINDS)
+
+
+def synthetic_catalog(n_books: int, n_countries: int, seed: int) -> Dict[str, list]:
+    """Integer 0-10 mood sliders, Zipf-skewed countries, uniform complexity"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_countries + 1)
+    countries = rng.choice(n_countries, size=n_books, p=weights / weights.sum())
+    return {
+        'ids': np.arange(1, n_books + 1),
+        'mood_vectors': rng.integers(0, 11, size=(n_books, 8)).tolist(),
+        'countries': [f'country-{c}' for c in countries],
+        'complexity': rng.integers(1, 11, size=n_books).tolist()
+    }
+
+
+def latency_summary(samples_ms: List[float]) -> Dict:
+    values = np.asarray(samples_ms)
+    return {
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4)
+    }
+
+
+def run_queries(index: MoodIndex, queries: np.ndarray, countries: List[str], limit: int):
+    """Latency samples and results of unfiltered and country-filtered queries"""
+    samples: Dict[str, List[float]] = {'all': [], 'country': []}
+    results: Dict[str, list] = {'all': [], 'country': []}
+    for query, country in zip(queries, countries):
+        for name, country_filter in (('all', ''), ('country', country)):
+            start = time.perf_counter()
+            _, scores = index.search(query, limit=limit, country_filter=country_filter)
+            samples[name].append((time.perf_counter() - start) * 1000)
+            results[name].append(scores)
+    return {name: latency_summary(values) for name, values in samples.items()}, results
+
+
+def agreement(reference: list, candidate: list) -> float:
+    """Fraction of queries whose top scores match the exact scan (ties may pick different books)"""
+    matches = [np.allclose(r, c, atol=1e-5) for r, c in zip(reference, candidate)]
+    return round(float(np.mean(matches)), 4)
+
+
+def run_scale(n_books: int, args: argparse.Namespace) -> Dict:
+    print(f"\n📚 {n_books} mood books")
+    catalog = synthetic_catalog(n_books, args.countries, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = rng.integers(0, 11, size=(args.queries, 8)).astype(np.float32)
+    query_countries = rng.choice(sorted(set(catalog['countries'])), size=args.queries).tolist()
+
+    result: Dict = {'n_books': n_books, 'modes': {}}
+    reference = None
+    for mode in MODES:
+        start = time.perf_counter()
+        index = MoodIndex.from_arrays(**catalog, tree=None if mode == 'scan' else mode, leaf_size=args.leaf_size)
+        build_seconds = time.perf_counter() - start
+
+        # First country queries build per-country trees; time them separately
+        start = time.perf_counter()
+        for country in set(query_countries):
+            index.search(queries[0], limit=args.limit, country_filter=country)
+        warmup_seconds = time.perf_counter() - start
+
+        latency, results = run_queries(index, queries, query_countries, args.limit)
+        entry = {
+            'build_seconds': round(build_seconds, 4),
+            'country_warmup_seconds': round(warmup_seconds, 4),
+            'latency': latency
+        }
+        if reference is None:
+            reference = results
+        else:
+            entry['agreement'] = {name: agreement(reference[name], results[name]) for name in results}
+        result['modes'][mode] = entry
+        print(
+            f"   {mode:10s} build {entry['build_seconds']:8.3f}s | "
+            f"all p50 {latency['all']['p50_ms']:8.3f}ms p99 {latency['all']['p99_ms']:8.3f}ms | "
+            f"country p50 {latency['country']['p50_ms']:8.3f}ms p99 {latency['country']['p99_ms']:8.3f}ms"
+        )
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark mood index scan vs tree search")
+    parser.add_argument('--scales', type=lambda v: [int(x) for x in v.split(',')], default=DEFAULT_SCALES,
+                        help="Comma-separated catalog sizes")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--countries', type=int, default=150)
+    parser.add_argument('--leaf-size', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Optional JSON output path")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = {'args': vars(args), 'results': []}
+    for n_books in args.scales:
+        report['results'].append(run_scale(n_books, args))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+    if args.output:
+        print(f"\n✅ Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
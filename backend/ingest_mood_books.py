@@ -0,0 +1,48 @@
+"""
+Bulk-load mood books from an NDJSON or CSV file
+
+Usage (from the backend directory):
+    python ingest_mood_books.py world_literature.ndjson
+    python ingest_mood_books.py books.csv --batch-size 5000
+"""
+import argparse
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import SessionLocal
+from app.services.mood_ingest import DEFAULT_BATCH_SIZE, INGEST_FORMATS, MoodBookIngestor, ingest_format_for
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load mood books from NDJSON or CSV")
+    parser.add_argument('path', help="Input file (.ndjson/.jsonl or .csv)")
+    parser.add_argument('--format', choices=INGEST_FORMATS, default=None, help="Override format detection")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per insert and commit")
+    args = parser.parse_args()
+
+    ingest_format = args.format or ingest_format_for(args.path)
+    if ingest_format is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+
+    db = SessionLocal()
+    try:
+        ingestor = MoodBookIngestor(db, batch_size=args.batch_size)
+        with open(args.path, encoding='utf-8-sig', newline='') as f:
+            summary = ingestor.ingest_csv(f) if ingest_format == 'csv' else ingestor.ingest_ndjson(f)
+    finally:
+        db.close()
+
+    print(f"✅ Inserted {summary['inserted']} mood books in {summary['batches']} batches "
+          f"({summary['auto_tagged']} auto-tagged)")
+    if summary['failed']:
+        print(f"⚠️  {summary['failed']} rows failed; first errors:")
+        for error in summary['errors'][:20]:
+            print(f"   line {error['line']}: {error['error']}")
+    return 0 if not summary['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
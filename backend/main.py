@@ -6,6 +6,7 @@ backend_dir = Path(__file__).parent
 if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
@@ -14,11 +15,24 @@ from app.routers import (
     external_books, achievements,
     mood_books, creator_portal, admin, images
 )
+from app.services.http_clients import HTTPClients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared keep-alive clients for external book APIs and the image proxy
+    await HTTPClients.startup()
+    try:
+        yield
+    finally:
+        await HTTPClients.shutdown()
+
 
 app = FastAPI(
     title="WhichBook+ - Book Discovery & Creator Platform",
     description="A comprehensive book recommendation system with mood-based discovery, world map exploration, and creator portal",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -8,15 +8,25 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.cluster import KMeans
-from typing import List, Dict, Tuple, Optional
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from scipy import sparse
+from typing import Any, List, Dict, Tuple, Optional
 import pickle
 import os
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
 from collections import defaultdict
 import json
 
+from ml.metrics import RecommenderMetrics, RequestTrace, recommender_metrics
+from ml.trending import TrendingCounters, DEFAULT_TRENDING_WINDOW
+from ml.leaderboards import GenreLeaderboards, genre_lists
+from ml.text_streaming import ChunkSource, StreamingTfidfVectorizer, content_text
+from ml.embeddings import BookEmbeddings, DEFAULT_EMBEDDING_DIM
+from ml.ann import ANN_INDEXES, ANNIndex
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -27,6 +37,10 @@ class PopularityRecommender:
     def __init__(self):
         self.popular_books = []
         self.trending_books = []
+        # Time-decayed counters kept current by record_rating between retrains
+        self.trending_counters = TrendingCounters()
+        # Bayesian-average leaderboards per genre plus a global one
+        self.genre_leaderboards = GenreLeaderboards()
     
     def fit(self, books_df: pd.DataFrame, ratings_df: pd.DataFrame):
         """Train popularity model"""
@@ -61,9 +75,48 @@ class PopularityRecommender:
                 self.trending_books = self.popular_books[:50]
         else:
             self.trending_books = self.popular_books[:50]
+        
+        self.trending_counters = TrendingCounters()
+        self.trending_counters.seed(ratings_df)
+        
+        self.genre_leaderboards = GenreLeaderboards()
+        self.genre_leaderboards.fit(books_df)
+    
+    def record_rating(
+        self,
+        book_id: int,
+        rating: float,
+        created_at: Optional[datetime] = None,
+        book_average: Optional[float] = None,
+        book_rating_count: Optional[int] = None,
+        is_new: bool = True
+    ):
+        """Fold a rating write into the trending counters and genre leaderboards
+        
+        Only new ratings count toward trending; a re-rating just refreshes
+        the book's leaderboard position.
+        """
+        counters = getattr(self, 'trending_counters', None)
+        if counters is not None and is_new:
+            counters.record(book_id, rating, created_at)
+        
+        leaderboards = getattr(self, 'genre_leaderboards', None)
+        if leaderboards is not None and book_average is not None and book_rating_count is not None:
+            leaderboards.update_book(book_id, book_average, book_rating_count)
+    
+    def get_genre_recommendations(self, genres: Optional[List[str]] = None, n: int = 10, match: str = 'any') -> List[Tuple[int, float]]:
+        """Top books of one genre, or of any/all of several genres"""
+        leaderboards = getattr(self, 'genre_leaderboards', None)
+        if leaderboards is None:
+            return []
+        return leaderboards.top(genres, n=n, match=match)
     
-    def get_recommendations(self, n: int = 10, trending: bool = False) -> List[Tuple[int, float]]:
+    def get_recommendations(self, n: int = 10, trending: bool = False, window: str = DEFAULT_TRENDING_WINDOW) -> List[Tuple[int, float]]:
         """Get popular or trending recommendations"""
+        counters = getattr(self, 'trending_counters', None)
+        if trending and counters is not None and len(counters) > 0:
+            return counters.get_top(window, n)
+        
         source = self.trending_books if trending else self.popular_books
         books = source[:n]
         return [(b.get('id') or b.get('book_id') or 0, b.get('popularity_score') or b.get('trending_score', 0.5)) for b in books]
@@ -72,35 +125,288 @@ class PopularityRecommender:
 class ContentBasedRecommender:
     """2. Content-Based Filtering"""
     
+    # Past either threshold the fitted vocabulary no longer describes the
+    # catalog well and a full refit is due
+    STALE_APPENDED_FRACTION = 0.10
+    STALE_OOV_RATIO = 0.20
+    
+    # Appended books are buffered and merged into the matrix and frames in
+    # one copy once this many are pending, or before the next read
+    PENDING_COMPACT_ROWS = 1024
+    
     def __init__(self):
         self.tfidf_vectorizer = TfidfVectorizer(max_features=5000, stop_words='english', ngram_range=(1, 2))
+        # Set instead of tfidf_vectorizer when trained with fit_streaming
+        self.streaming_vectorizer: Optional[StreamingTfidfVectorizer] = None
         self.tfidf_matrix = None
         self.book_features = None
         self.book_indices = None
+        # Optional dense LSA rows; when present they serve all similarity scans
+        self.embeddings: Optional[BookEmbeddings] = None
+        # Optional approximate index over the embeddings for sub-linear queries
+        self.ann_index: Optional[ANNIndex] = None
+        # Vocabulary drift of books appended since the last fit
+        self.fitted_count = 0
+        self.appended_count = 0
+        self.appended_terms = 0
+        self.appended_oov_terms = 0
+        # (features rows, TF-IDF rows) of appended books not merged yet
+        self._pending: List[Tuple[pd.DataFrame, Any]] = []
+        self._pending_ids: set = set()
+        self._append_lock = threading.Lock()
+    
+    def __getstate__(self):
+        if getattr(self, '_pending', None) and self.tfidf_matrix is not None:
+            self.compact()
+        state = self.__dict__.copy()
+        state.pop('_append_lock', None)
+        return state
+    
+    def __setstate__(self, state):
+        state.setdefault('_pending', [])
+        state.setdefault('_pending_ids', set())
+        self.__dict__.update(state)
+        self._append_lock = threading.Lock()
+    
+    def _reset_drift(self, n_books: int):
+        self.fitted_count = n_books
+        self.appended_count = 0
+        self.appended_terms = 0
+        self.appended_oov_terms = 0
     
     def fit(self, books_df: pd.DataFrame):
         """Train content-based model"""
         logger.info("Training Content-Based Recommender...")
         
-        books_df['content_features'] = (
-            books_df['title'].fillna('') + ' ' +
-            books_df['author'].fillna('') + ' ' +
-            books_df['description'].fillna('') + ' ' + 
-            books_df['genres'].fillna('')
-        )
+        books_df['content_features'] = content_text(books_df)
         
-        self.book_features = books_df[['id', 'title', 'author', 'content_features']].copy()
+        # Keep genres and rating_count too: the diversity optimizer reads them
+        feature_columns = ['id', 'title', 'author', 'content_features'] + [
+            col for col in ('genres', 'rating_count') if col in books_df.columns
+        ]
+        self.book_features = books_df[feature_columns].copy()
+        self.streaming_vectorizer = None
         self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(books_df['content_features'])
         self.book_indices = pd.Series(books_df.index, index=books_df['id']).drop_duplicates()
+        self._reset_drift(len(books_df))
+    
+    def fit_streaming(self, chunk_source: ChunkSource, n_features: int = 1 << 20, n_jobs: Optional[int] = None):
+        """Train content-based model out of core from chunks of books
+        
+        `chunk_source` is called once per pass and must return a fresh
+        iterator of DataFrames (see ml.text_streaming.csv_chunk_source and
+        sql_chunk_source). Produces the same L2-normalized CSR layout as fit,
+        over hashed features instead of a fitted vocabulary. The content text
+        itself is not kept in book_features.
+        """
+        logger.info("Training Content-Based Recommender (streaming)...")
+        
+        self.streaming_vectorizer = StreamingTfidfVectorizer(n_features=n_features, n_jobs=n_jobs)
+        self.tfidf_matrix, self.book_features = self.streaming_vectorizer.fit_transform_chunks(
+            chunk_source, keep_columns=['id', 'title', 'author', 'genres', 'rating_count']
+        )
+        self.book_indices = pd.Series(
+            np.arange(len(self.book_features)), index=self.book_features['id']
+        ).drop_duplicates()
+        self._reset_drift(len(self.book_features))
+        logger.info(
+            f"Vectorized {self.tfidf_matrix.shape[0]} books into "
+            f"{self.tfidf_matrix.nnz} non-zeros"
+        )
+    
+    def fit_embeddings(self, n_components: int = DEFAULT_EMBEDDING_DIM, quantize: bool = False):
+        """Project the TF-IDF matrix to dense unit-length LSA embeddings"""
+        if self.tfidf_matrix is None:
+            return
+        logger.info(f"Fitting {n_components}-dim content embeddings{' (int8)' if quantize else ''}...")
+        self.embeddings = BookEmbeddings(n_components=n_components, quantize=quantize).fit(self.tfidf_matrix)
+        self.ann_index = None
+    
+    def build_ann_index(self, kind: str = 'ivf', **params):
+        """Build an approximate index ('ivf' or 'lsh') over the embeddings
+        
+        `params` go to the index class, e.g. n_lists/nprobe for IVF or
+        n_tables/n_bits/nprobe for LSH.
+        """
+        embeddings = self._active_embeddings()
+        if embeddings is None:
+            logger.warning("ANN index needs content embeddings; fit_embeddings first")
+            return
+        if kind not in ANN_INDEXES:
+            raise ValueError(f"Unknown ANN index '{kind}', expected one of {sorted(ANN_INDEXES)}")
+        logger.info(f"Building {kind.upper()} index over {len(embeddings)} embeddings...")
+        self.ann_index = ANN_INDEXES[kind](**params).build(embeddings)
+    
+    def _active_ann_index(self) -> Optional[ANNIndex]:
+        """ANN index when it covers every embedding row"""
+        index = getattr(self, 'ann_index', None)
+        embeddings = self._active_embeddings()
+        if index is None or embeddings is None or len(index) != len(embeddings):
+            return None
+        return index
+    
+    def _active_embeddings(self) -> Optional[BookEmbeddings]:
+        """Embeddings when they cover every row of the TF-IDF matrix"""
+        embeddings = getattr(self, 'embeddings', None)
+        if embeddings is None or self.tfidf_matrix is None or len(embeddings) != self.tfidf_matrix.shape[0]:
+            return None
+        return embeddings
+    
+    def get_embeddings(self, book_ids: List[int]) -> Optional[np.ndarray]:
+        """float32 embeddings of the given books (zero rows for unknown ids), None without embeddings"""
+        self.compact()
+        embeddings = self._active_embeddings()
+        if embeddings is None or self.book_indices is None:
+            return None
+        result = np.zeros((len(book_ids), embeddings.n_components), dtype=np.float32)
+        known = [(i, self.book_indices[bid]) for i, bid in enumerate(book_ids) if bid in self.book_indices]
+        if known:
+            positions, rows = zip(*known)
+            result[list(positions)] = embeddings.get(np.asarray(rows))
+        return result
+    
+    def transform(self, texts: List[str]):
+        """Vectorize content texts with whichever vectorizer the model was fitted with"""
+        vectorizer = getattr(self, 'streaming_vectorizer', None)
+        if vectorizer is not None:
+            return vectorizer.transform(texts)
+        return self.tfidf_vectorizer.transform(texts)
+    
+    def add_books(self, books_df: pd.DataFrame) -> List[int]:
+        """Vectorize new books with the fitted vocabulary and append them
+        
+        Books already in the model are skipped. Returns the ids added; they
+        are visible to the next similarity query. Rows are buffered and
+        merged in blocks (see `compact`), so a single insert does not copy
+        the whole catalog.
+        """
+        if self.tfidf_matrix is None or self.book_features is None or len(books_df) == 0:
+            return []
+        
+        with self._append_lock:
+            # Index lookups use its cached hash table; isin would rebuild one per call
+            known = self.book_indices.index
+            is_new = [bid not in known and bid not in self._pending_ids for bid in books_df['id'].tolist()]
+            new_books = books_df[is_new].drop_duplicates('id')
+            if len(new_books) == 0:
+                return []
+            
+            texts = content_text(new_books)
+            vectors = self.transform(texts.tolist())
+            terms, oov_terms = self._count_oov(texts.tolist(), vectors)
+            
+            appended = new_books.assign(content_features=texts).reindex(columns=self.book_features.columns)
+            self._pending.append((appended, vectors))
+            self._pending_ids.update(new_books['id'].tolist())
+            if len(self._pending_ids) >= self.PENDING_COMPACT_ROWS:
+                self._compact_locked()
+            
+            self.appended_count = getattr(self, 'appended_count', 0) + len(new_books)
+            self.appended_terms = getattr(self, 'appended_terms', 0) + terms
+            self.appended_oov_terms = getattr(self, 'appended_oov_terms', 0) + oov_terms
+        
+        if self.vocabulary_stale:
+            logger.warning(
+                f"Content vocabulary is stale ({self.appended_count} appended books, "
+                f"{self.oov_ratio:.1%} out-of-vocabulary terms); schedule a retrain"
+            )
+        return new_books['id'].astype(int).tolist()
+    
+    def compact(self):
+        """Merge buffered appended books into the matrix, features and index"""
+        if not getattr(self, '_pending', None):
+            return
+        with self._append_lock:
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        if not self._pending:
+            return
+        appended = pd.concat([features for features, _ in self._pending], ignore_index=True)
+        vectors = sparse.vstack([rows for _, rows in self._pending], format='csr')
+        start = self.tfidf_matrix.shape[0]  # type: ignore[union-attr]
+        
+        # Publish embeddings, matrix and features before the index so
+        # readers never see an id whose row is not there yet
+        embeddings = self._active_embeddings()
+        if embeddings is not None:
+            ann_index = self._active_ann_index()
+            embeddings.append(vectors)
+            if ann_index is not None:
+                ann_index.add(vectors.shape[0])
+        self.tfidf_matrix = sparse.vstack([self.tfidf_matrix, vectors], format='csr')
+        self.book_features = pd.concat([self.book_features, appended], ignore_index=True)
+        self.book_indices = pd.concat([
+            self.book_indices, pd.Series(np.arange(start, start + len(appended)), index=appended['id'].to_numpy())
+        ])
+        self._pending = []
+        self._pending_ids = set()
+    
+    def _count_oov(self, texts: List[str], vectors) -> Tuple[int, int]:
+        """(terms, terms unseen at fit time) of newly vectorized books"""
+        streaming = getattr(self, 'streaming_vectorizer', None)
+        if streaming is not None:
+            # Hashed features never seen at fit time carry the maximum IDF
+            seen = streaming.idf < streaming.idf.max()  # type: ignore[union-attr]
+            indices = vectors.indices
+            return len(indices), int((~seen[indices]).sum())
+        
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        terms = oov_terms = 0
+        for text in texts:
+            tokens = set(analyzer(text))
+            terms += len(tokens)
+            oov_terms += sum(1 for token in tokens if token not in vocabulary)
+        return terms, oov_terms
+    
+    @property
+    def oov_ratio(self) -> float:
+        terms = getattr(self, 'appended_terms', 0)
+        return getattr(self, 'appended_oov_terms', 0) / terms if terms else 0.0
+    
+    @property
+    def vocabulary_stale(self) -> bool:
+        """True once appended books have drifted far enough from the fitted vocabulary"""
+        fitted = getattr(self, 'fitted_count', 0) or (
+            len(self.book_features) if self.book_features is not None else 0
+        )
+        appended = getattr(self, 'appended_count', 0)
+        return (
+            (fitted > 0 and appended / fitted > self.STALE_APPENDED_FRACTION)
+            or self.oov_ratio > self.STALE_OOV_RATIO
+        )
+    
+    def drift_stats(self) -> Dict:
+        """Serializable vocabulary drift summary"""
+        return {
+            'fitted_books': getattr(self, 'fitted_count', 0),
+            'appended_books': getattr(self, 'appended_count', 0),
+            'oov_ratio': round(self.oov_ratio, 4),
+            'vocabulary_stale': self.vocabulary_stale
+        }
     
     def get_similar_books(self, book_id: int, n: int = 10) -> List[Tuple[int, float]]:
         """Get content-similar books"""
+        self.compact()
         if self.book_indices is None or book_id not in self.book_indices or self.tfidf_matrix is None or self.book_features is None:
             return []
         
         idx = self.book_indices[book_id]
-        sim_scores = cosine_similarity(self.tfidf_matrix[idx:idx+1], self.tfidf_matrix).flatten()  # type: ignore[index]
-        sim_indices = sim_scores.argsort()[::-1][1:n+1]
+        embeddings = self._active_embeddings()
+        ann_index = self._active_ann_index()
+        if ann_index is not None:
+            rows, scores = ann_index.search(embeddings, embeddings.get(idx), n, exclude=np.asarray([idx]))  # type: ignore[arg-type]
+            feature_ids = self.book_features['id'].to_numpy()
+            return [(int(feature_ids[r]), float(score)) for r, score in zip(rows, scores)]
+        if embeddings is not None:
+            sim_scores = embeddings.scores(embeddings.get(idx))
+            sim_scores[idx] = -np.inf  # never recommend the book itself
+            sim_indices = self._top_indices(sim_scores, n)
+            sim_indices = sim_indices[sim_indices != idx]
+        else:
+            sim_scores = cosine_similarity(self.tfidf_matrix[idx:idx+1], self.tfidf_matrix).flatten()  # type: ignore[index]
+            sim_indices = sim_scores.argsort()[::-1][1:n+1]
         
         recommendations = []
         for i in sim_indices:
@@ -109,6 +415,123 @@ class ContentBasedRecommender:
                 recommendations.append((rec_book_id, float(sim_scores[i])))
         
         return recommendations
+    
+    def get_similar_books_batch(self, book_ids: List[int], n: int = 10) -> Dict[int, List[Tuple[int, float]]]:
+        """Get content-similar books for many books with chunked matrix-matrix products"""
+        self.compact()
+        if self.book_indices is None or self.tfidf_matrix is None or self.book_features is None:
+            return {}
+        
+        known = [bid for bid in dict.fromkeys(book_ids) if bid in self.book_indices]
+        feature_ids = self.book_features['id'].to_numpy()
+        embeddings = self._active_embeddings()
+        ann_index = self._active_ann_index()
+        n_books = self.tfidf_matrix.shape[0]  # type: ignore[union-attr]
+        k = min(n, n_books - 1)
+        
+        # Bound each dense similarity block to ~4M cells
+        chunk_size = max(1, (1 << 22) // max(n_books, 1))
+        results = {}
+        for start in range(0, len(known), chunk_size):
+            chunk = known[start:start + chunk_size]
+            rows = np.asarray([self.book_indices[bid] for bid in chunk])
+            if k <= 0:
+                results.update({bid: [] for bid in chunk})
+                continue
+            
+            if ann_index is not None:
+                found = zip(*ann_index.search(embeddings, embeddings.get(rows), k + 1))  # type: ignore[arg-type]
+                for bid, row, (neighbors, scores) in zip(chunk, rows, found):
+                    keep = neighbors != row
+                    results[bid] = [
+                        (int(feature_ids[i]), float(score)) for i, score in zip(neighbors[keep][:k], scores[keep][:k])
+                    ]
+                continue
+            if embeddings is not None:
+                sims = embeddings.scores(embeddings.get(rows))
+            else:
+                sims = cosine_similarity(self.tfidf_matrix[rows], self.tfidf_matrix)  # type: ignore[index]
+            sims[np.arange(len(chunk)), rows] = -np.inf  # never recommend the book itself
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            for r, bid in enumerate(chunk):
+                order = top[r][np.argsort(-sims[r, top[r]])]
+                results[bid] = [(int(feature_ids[i]), float(sims[r, i])) for i in order]
+        
+        return results
+    
+    def get_profile_recommendations(
+        self,
+        book_ids: List[int],
+        n: int = 10,
+        exclude: Optional[List[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Books closest to the centroid of a user's books (e.g. their recent reads)"""
+        self.compact()
+        if self.book_indices is None or self.tfidf_matrix is None or self.book_features is None:
+            return []
+        
+        rows = np.asarray([self.book_indices[bid] for bid in dict.fromkeys(book_ids) if bid in self.book_indices])
+        if len(rows) == 0:
+            return []
+        
+        excluded = np.concatenate([
+            rows, np.asarray([self.book_indices[bid] for bid in (exclude or []) if bid in self.book_indices], dtype=np.int64)
+        ])
+        feature_ids = self.book_features['id'].to_numpy()
+        
+        embeddings = self._active_embeddings()
+        ann_index = self._active_ann_index()
+        if ann_index is not None:
+            found, scores = ann_index.search(embeddings, embeddings.profile(rows), n, exclude=excluded)  # type: ignore[arg-type]
+            return [(int(feature_ids[i]), float(score)) for i, score in zip(found, scores)]
+        if embeddings is not None:
+            scores = embeddings.scores(embeddings.profile(rows))
+        else:
+            centroid = np.asarray(self.tfidf_matrix[rows].mean(axis=0))  # type: ignore[index]
+            scores = cosine_similarity(centroid, self.tfidf_matrix).flatten()
+        scores[excluded] = -np.inf
+        
+        return [
+            (int(feature_ids[i]), float(scores[i]))
+            for i in self._top_indices(scores, n) if np.isfinite(scores[i])
+        ]
+    
+    def search(self, query: str, n: int = 10) -> List[Tuple[int, float]]:
+        """Books whose content best matches a free-text query"""
+        self.compact()
+        if not query or self.tfidf_matrix is None or self.book_features is None:
+            return []
+        
+        query_vector = self.transform([query])
+        if query_vector.nnz == 0:
+            # Nothing in the query is in the vocabulary
+            return []
+        
+        feature_ids = self.book_features['id'].to_numpy()
+        embeddings = self._active_embeddings()
+        ann_index = self._active_ann_index()
+        if ann_index is not None:
+            rows, scores = ann_index.search(embeddings, embeddings.project(query_vector)[0], n)  # type: ignore[union-attr, arg-type]
+            return [(int(feature_ids[i]), float(score)) for i, score in zip(rows, scores) if score > 0]
+        if embeddings is not None:
+            scores = embeddings.scores(embeddings.project(query_vector)[0])
+        else:
+            # Rows are L2-normalized, so the sparse dot product is the cosine
+            scores = np.asarray((self.tfidf_matrix @ query_vector.T).todense()).ravel()  # type: ignore[operator]
+        
+        return [
+            (int(feature_ids[i]), float(scores[i]))
+            for i in self._top_indices(scores, n) if scores[i] > 0
+        ]
+    
+    @staticmethod
+    def _top_indices(scores: np.ndarray, n: int) -> np.ndarray:
+        """Indices of the n highest scores, best first"""
+        k = min(n, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
 
 
 class CollaborativeFilteringRecommender:
@@ -167,42 +590,168 @@ class CollaborativeFilteringRecommender:
 
 
 class DemographicRecommender:
-    """6. Demographic-Based Recommendation"""
+    """6. Demographic-Based Recommendation
     
-    def __init__(self):
+    Users are segmented with mini-batch KMeans on their rating behaviour
+    (genre affinity, rating mean/std/volume); each segment keeps a
+    precomputed top-N list, so serving is a segment lookup.
+    """
+    
+    # Score of candidates outside a profile's top-N list
+    DEFAULT_SCORE = 2.5
+    
+    def __init__(self, n_segments: int = 8, top_n: int = 50, n_genre_features: int = 20,
+                 chunk_size: int = 10000, n_epochs: int = 3, prior_count: float = 5.0):
         self.demographic_profiles = {}
+        self.n_segments = n_segments
+        self.top_n = top_n
+        self.n_genre_features = n_genre_features
+        self.chunk_size = chunk_size
+        self.n_epochs = n_epochs
+        self.prior_count = prior_count
+        self.user_segments: Dict[int, int] = {}
+        # profile name -> (book ids, scores), sorted by descending score
+        self.segment_top: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.kmeans = None
     
-    def fit(self, users_df: pd.DataFrame, ratings_df: pd.DataFrame):
+    def fit(self, users_df: Optional[pd.DataFrame], ratings_df: pd.DataFrame, books_df: Optional[pd.DataFrame] = None):
         """Learn demographic preferences"""
         logger.info("Training Demographic-Based Recommender...")
         
-        # Simulate demographic clustering (in real app, use actual demographic data)
-        # Here we cluster users by their rating patterns
+        # No demographic data is collected, so users are clustered by their rating patterns
         if len(ratings_df) == 0:
             return
         
-        user_rating_stats = ratings_df.groupby('user_id').agg({
-            'rating': ['mean', 'std', 'count']
-        }).reset_index()
-        
         # Default profile
-        self.demographic_profiles['default'] = (
-            ratings_df.groupby('book_id')['rating']
-            .mean()
-            .nlargest(50)
-            .to_dict()
+        default_top = ratings_df.groupby('book_id')['rating'].mean().nlargest(self.top_n)
+        self.demographic_profiles['default'] = default_top.to_dict()
+        self.segment_top = {
+            'default': (default_top.index.to_numpy(dtype=np.int64), default_top.to_numpy(dtype=np.float64))
+        }
+        
+        user_ids, user_codes = np.unique(ratings_df['user_id'].to_numpy(), return_inverse=True)
+        book_ids, book_codes = np.unique(ratings_df['book_id'].to_numpy(), return_inverse=True)
+        n_segments = min(getattr(self, 'n_segments', 8), len(user_ids))
+        if n_segments < 2:
+            return
+        
+        ratings = ratings_df['rating'].to_numpy(dtype=float)
+        shape = (len(user_ids), len(book_ids))
+        user_ratings = sparse.csr_matrix((ratings, (user_codes, book_codes)), shape=shape)
+        user_rated = sparse.csr_matrix((np.ones(len(ratings)), (user_codes, book_codes)), shape=shape)
+        
+        # Rating mean / std / volume, standardized over all users
+        counts = np.asarray(user_rated.sum(axis=1)).ravel()
+        means = np.asarray(user_ratings.sum(axis=1)).ravel() / counts
+        squares = np.asarray(user_ratings.multiply(user_ratings).sum(axis=1)).ravel() / counts
+        stats = np.column_stack([means, np.sqrt(np.maximum(squares - means ** 2, 0)), np.log1p(counts)])
+        stats = (stats - stats.mean(axis=0)) / np.where(stats.std(axis=0) > 0, stats.std(axis=0), 1.0)
+        
+        book_genres = self._book_genre_matrix(book_ids, books_df, user_rated)
+        
+        def features(rows: slice) -> np.ndarray:
+            # Share of each user's ratings that fall in each of the top genres
+            affinity = (user_rated[rows] @ book_genres).toarray() / counts[rows, None]
+            return np.hstack([affinity, stats[rows]]).astype(np.float32)
+        
+        # The sparse user x book matrices above cover every rating; only the
+        # dense feature rows are materialized per chunk of chunk_size users
+        chunk_size = max(getattr(self, 'chunk_size', 10000), n_segments)
+        chunks = [slice(start, start + chunk_size) for start in range(0, len(user_ids), chunk_size)]
+        self.kmeans = MiniBatchKMeans(n_clusters=n_segments, batch_size=min(chunk_size, 4096), random_state=42)
+        for _ in range(getattr(self, 'n_epochs', 3)):
+            for rows in chunks:
+                self.kmeans.partial_fit(features(rows))
+        labels = np.concatenate([self.kmeans.predict(features(rows)) for rows in chunks])
+        
+        self.user_segments = {int(user_id): int(label) for user_id, label in zip(user_ids, labels)}
+        self._fit_segment_profiles(labels, n_segments, user_ratings, user_rated, book_ids, ratings.mean())
+        logger.info(f"Demographic segments: {np.bincount(labels, minlength=n_segments).tolist()}")
+    
+    def _book_genre_matrix(self, book_ids: np.ndarray, books_df: Optional[pd.DataFrame], user_rated) -> sparse.csr_matrix:
+        """Sparse (rated books x top genres) indicator matrix"""
+        n_genres = getattr(self, 'n_genre_features', 20)
+        if books_df is None or n_genres <= 0:
+            return sparse.csr_matrix((len(book_ids), 0))
+        
+        books = books_df.drop_duplicates('id').set_index('id')
+        rated_genres = genre_lists(books).reindex(book_ids)
+        rated_genres = [names if isinstance(names, list) else [] for names in rated_genres]
+        
+        # Rank genres by how often they are rated
+        book_popularity = np.asarray(user_rated.sum(axis=0)).ravel()
+        weight = defaultdict(float)
+        for row, names in enumerate(rated_genres):
+            for name in set(names):
+                weight[name] += book_popularity[row]
+        top_genres = {name: col for col, name in enumerate(sorted(weight, key=weight.get, reverse=True)[:n_genres])}
+        
+        rows, cols = [], []
+        for row, names in enumerate(rated_genres):
+            for name in set(names):
+                if name in top_genres:
+                    rows.append(row)
+                    cols.append(top_genres[name])
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(book_ids), len(top_genres)))
+    
+    def _fit_segment_profiles(self, labels, n_segments, user_ratings, user_rated, book_ids, global_mean):
+        """Bayesian-average top-N books of every segment"""
+        membership = sparse.csr_matrix(
+            (np.ones(len(labels)), (labels, np.arange(len(labels)))), shape=(n_segments, len(labels))
         )
+        sums = (membership @ user_ratings).toarray()
+        counts = (membership @ user_rated).toarray()
+        prior = getattr(self, 'prior_count', 5.0)
+        scores = np.where(counts > 0, (prior * global_mean + sums) / (prior + counts), -np.inf)
+        
+        top_n = min(self.top_n, len(book_ids))
+        for segment in range(n_segments):
+            top = np.argpartition(-scores[segment], top_n - 1)[:top_n]
+            top = top[np.argsort(-scores[segment, top])]
+            top = top[np.isfinite(scores[segment, top])]
+            ids, seg_scores = book_ids[top].astype(np.int64), scores[segment, top].astype(np.float32)
+            self.segment_top[f'segment_{segment}'] = (ids, seg_scores)
+            self.demographic_profiles[f'segment_{segment}'] = dict(zip(ids.tolist(), seg_scores.tolist()))
     
-    def get_recommendations(self, user_profile: str = 'default', candidate_books: Optional[List[int]] = None, n: int = 10) -> List[Tuple[int, float]]:
+    def get_user_profile(self, user_id: Optional[int]) -> str:
+        """Profile name for a user: their segment, or 'default' for unseen users"""
+        segment = getattr(self, 'user_segments', {}).get(user_id) if user_id is not None else None
+        return f'segment_{segment}' if segment is not None else 'default'
+    
+    def get_recommendations(self, user_profile: str = 'default', candidate_books: Optional[List[int]] = None, n: int = 10,
+                            user_id: Optional[int] = None) -> List[Tuple[int, float]]:
         """Get demographic-based recommendations"""
-        profile_ratings = self.demographic_profiles.get(user_profile, {})
+        if user_id is not None:
+            user_profile = self.get_user_profile(user_id)
+        top = getattr(self, 'segment_top', {}).get(user_profile)
+        if top is None:
+            # Models trained before segmentation only have the profile dicts
+            profile_ratings = self.demographic_profiles.get(user_profile, {})
+            if candidate_books:
+                recs = [(bid, profile_ratings.get(bid, self.DEFAULT_SCORE)) for bid in candidate_books]
+            else:
+                recs = list(profile_ratings.items())
+            recs.sort(key=lambda x: x[1], reverse=True)
+            return recs[:n]
         
-        if candidate_books:
-            recs = [(bid, profile_ratings.get(bid, 2.5)) for bid in candidate_books]
-        else:
-            recs = list(profile_ratings.items())
+        ids, scores = top[0].tolist(), top[1].tolist()
+        if not candidate_books:
+            return list(zip(ids[:n], scores[:n]))
         
-        recs.sort(key=lambda x: x[1], reverse=True)
+        # Walk the precomputed list; other candidates rank at DEFAULT_SCORE,
+        # between the profile books above and below it
+        candidates = candidate_books if isinstance(candidate_books, (set, frozenset)) else set(candidate_books)
+        ranked = [(bid, score) for bid, score in zip(ids, scores) if bid in candidates]
+        split = next((i for i, (_, score) in enumerate(ranked) if score < self.DEFAULT_SCORE), len(ranked))
+        recs = ranked[:split]
+        if len(recs) < n:
+            in_profile = set(ids)
+            for bid in candidate_books:
+                if len(recs) >= n:
+                    break
+                if bid not in in_profile:
+                    recs.append((bid, self.DEFAULT_SCORE))
+            recs.extend(ranked[split:n - len(recs) + split])
         return recs[:n]
 
 
@@ -294,6 +843,20 @@ class AssociationRuleRecommender:
         self.frequent_pairs = {}
         self.book_cooccurrence = defaultdict(lambda: defaultdict(int))
     
+    def __getstate__(self):
+        # The lambda default factory cannot be pickled; store plain dicts
+        state = self.__dict__.copy()
+        if self.book_cooccurrence is not None:
+            state['book_cooccurrence'] = {book: dict(counts) for book, counts in self.book_cooccurrence.items()}
+        return state
+    
+    def __setstate__(self, state):
+        cooccurrence = state.pop('book_cooccurrence', None) or {}
+        self.__dict__.update(state)
+        self.book_cooccurrence = defaultdict(lambda: defaultdict(int))
+        for book, counts in cooccurrence.items():
+            self.book_cooccurrence[book].update(counts)
+    
     def fit(self, ratings_df: pd.DataFrame):
         """Find frequently co-rated books"""
         logger.info("Training Association Rule Recommender...")
@@ -329,15 +892,25 @@ class DiversityOptimizer:
     def __init__(self):
         self.genre_diversity_weight = 0.3
         self.popularity_penalty = 0.2
+        # MMR penalty on similarity to already selected books (embeddings only)
+        self.similarity_penalty = 0.3
     
     def diversify_recommendations(
         self, 
         recommendations: List[Tuple[int, float]], 
-        books_df: pd.DataFrame,
+        books_df: Optional[pd.DataFrame],
         n: int = 10,
-        diversity_weight: float = 0.3
+        diversity_weight: float = 0.3,
+        book_info: Optional[Dict[int, Dict]] = None,
+        embeddings: Optional[np.ndarray] = None
     ) -> List[Tuple[int, float]]:
-        """Re-rank recommendations for diversity"""
+        """Re-rank recommendations for diversity
+        
+        Pass a prebuilt `book_info` (see `build_book_info`) to skip rebuilding
+        the lookup when re-ranking for many users. With `embeddings` (unit
+        rows aligned with `recommendations`), candidates are also penalized
+        by their maximum similarity to the books already selected (MMR).
+        """
         
         if len(recommendations) == 0:
             return []
@@ -347,7 +920,12 @@ class DiversityOptimizer:
         selected_genres = set()
         
         # Create book info lookup
-        book_info = books_df.set_index('id')[['genres', 'rating_count']].to_dict('index')
+        if book_info is None:
+            book_info = self.build_book_info(books_df)
+        
+        # Max similarity of each remaining candidate to the selection so far
+        remaining_vectors = embeddings
+        redundancy = np.zeros(len(remaining), dtype=np.float32) if embeddings is not None else None
         
         while len(selected) < n and remaining:
             best_score = -1
@@ -367,6 +945,8 @@ class DiversityOptimizer:
                 
                 # Combined score
                 combined_score = base_score + diversity_bonus + novelty_bonus
+                if redundancy is not None:
+                    combined_score -= self.similarity_penalty * float(redundancy[idx])
                 
                 if combined_score > best_score:
                     best_score = combined_score
@@ -376,17 +956,68 @@ class DiversityOptimizer:
             book_id, orig_score = remaining.pop(best_idx)
             selected.append((book_id, best_score))
             
+            if redundancy is not None and remaining_vectors is not None:
+                chosen = remaining_vectors[best_idx]
+                remaining_vectors = np.delete(remaining_vectors, best_idx, axis=0)
+                redundancy = np.maximum(np.delete(redundancy, best_idx), remaining_vectors @ chosen)
+            
             # Update selected genres
             book_genres = set(str(book_info.get(book_id, {}).get('genres', '')).lower().split())
             selected_genres.update(book_genres)
         
         return selected
+    
+    @staticmethod
+    def build_book_info(books_df: Optional[pd.DataFrame]) -> Dict[int, Dict]:
+        """Build the id -> {genres, rating_count} lookup used for re-ranking"""
+        if books_df is None or len(books_df) == 0:
+            return {}
+        
+        info = pd.DataFrame({
+            'id': books_df['id'],
+            'genres': books_df['genres'] if 'genres' in books_df.columns else '',
+            'rating_count': books_df['rating_count'] if 'rating_count' in books_df.columns else 0
+        })
+        return info.drop_duplicates('id').set_index('id').to_dict('index')
+
+
+class BatchCatalog:
+    """Catalog state shared while scoring many users against the same books"""
+    
+    def __init__(self, book_ids: List[int]):
+        self.book_ids = np.asarray(book_ids, dtype=np.int64)
+        self.columns = {int(bid): col for col, bid in enumerate(self.book_ids)}
+        # User-independent part of the hybrid score (popularity, context, quiz)
+        self.static_scores = np.zeros(len(self.book_ids))
+        # Demographic score vector per profile (segment), built on first use
+        self.profile_scores: Dict[str, np.ndarray] = {}
+        # Per-book collaborative bias aligned with book_ids
+        self.book_bias = np.zeros(len(self.book_ids))
+        # Neighbor lists cached across user chunks of the same job
+        self.content_neighbors: Dict[int, List[Tuple[int, float]]] = {}
+        self.association_neighbors: Dict[int, List[Tuple[int, float]]] = {}
+        self.book_info: Dict[int, Dict] = {}
+    
+    def __len__(self) -> int:
+        return len(self.book_ids)
+    
+    def neighbor_matrix(self, rows: List[int], neighbors: Dict[int, List[Tuple[int, float]]]) -> sparse.csr_matrix:
+        """Sparse (len(rows) x catalog) matrix of neighbor scores"""
+        data, indices, indptr = [], [], [0]
+        for book_id in rows:
+            for neighbor_id, score in neighbors.get(book_id, []):
+                col = self.columns.get(neighbor_id)
+                if col is not None:
+                    indices.append(col)
+                    data.append(score)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self)))
 
 
 class AdvancedHybridRecommender:
     """Master Hybrid Recommender combining all 15 strategies"""
     
-    def __init__(self):
+    def __init__(self, metrics: Optional[RecommenderMetrics] = None):
         # Initialize all recommenders
         self.popularity_rec = PopularityRecommender()
         self.content_rec = ContentBasedRecommender()
@@ -397,6 +1028,9 @@ class AdvancedHybridRecommender:
         self.association_rec = AssociationRuleRecommender()
         self.diversity_optimizer = DiversityOptimizer()
         
+        # Per-stage latency histograms and counters
+        self.metrics = metrics if metrics is not None else recommender_metrics
+        
         # Weights for hybrid combination
         self.weights = {
             'popularity': 0.15,
@@ -407,24 +1041,54 @@ class AdvancedHybridRecommender:
             'quiz': 0.05,
             'association': 0.15
         }
+        
+        # Wall-clock time of the last fit; writes after it are not in the trained state
+        self.fitted_at: Optional[float] = None
     
-    def fit(self, books_df: pd.DataFrame, ratings_df: pd.DataFrame, users_df: Optional[pd.DataFrame] = None):
-        """Train all recommendation models"""
+    def fit(
+        self,
+        books_df: pd.DataFrame,
+        ratings_df: pd.DataFrame,
+        users_df: Optional[pd.DataFrame] = None,
+        content_chunks: Optional[ChunkSource] = None,
+        n_jobs: Optional[int] = None,
+        embedding_dim: Optional[int] = None,
+        quantize_embeddings: bool = False,
+        ann_index: Optional[str] = None,
+        ann_params: Optional[Dict] = None
+    ):
+        """Train all recommendation models
+        
+        With `content_chunks`, the content model is vectorized out of core
+        from that chunk source instead of from books_df['description'], so
+        books_df may omit the description column. With `embedding_dim`,
+        content similarity, profile scoring and diversity use dense LSA
+        embeddings of that size instead of the sparse TF-IDF rows, and
+        `ann_index` ('ivf' or 'lsh') serves those queries approximately.
+        """
         logger.info("=" * 60)
         logger.info("Training Advanced Hybrid Recommendation System")
         logger.info("=" * 60)
         
         # Train each model
         self.popularity_rec.fit(books_df, ratings_df)
-        self.content_rec.fit(books_df)
+        if content_chunks is not None:
+            self.content_rec.fit_streaming(content_chunks, n_jobs=n_jobs)
+        else:
+            self.content_rec.fit(books_df)
+        if embedding_dim:
+            self.content_rec.fit_embeddings(embedding_dim, quantize=quantize_embeddings)
+            if ann_index:
+                self.content_rec.build_ann_index(ann_index, **(ann_params or {}))
         self.collaborative_rec.fit(ratings_df)
         
-        if users_df is not None:
-            self.demographic_rec.fit(users_df, ratings_df)
+        # Segments come from rating behaviour, so users_df is optional
+        self.demographic_rec.fit(users_df, ratings_df, books_df)
         
         self.context_rec.fit(books_df)
         self.quiz_rec.fit(books_df)
         self.association_rec.fit(ratings_df)
+        self.fitted_at = time.time()
         
         logger.info("✅ All recommendation models trained successfully!")
     
@@ -436,82 +1100,318 @@ class AdvancedHybridRecommender:
         n_recommendations: int = 10,
         context: Optional[str] = None,
         personality: Optional[str] = None,
-        diversity_enabled: bool = True
+        diversity_enabled: bool = True,
+        trace: Optional[RequestTrace] = None
     ) -> List[Tuple[int, float]]:
-        """Get hybrid recommendations combining all strategies"""
+        """Get hybrid recommendations combining all strategies
         
-        # Filter candidate books
-        candidate_books = [bid for bid in all_book_ids if bid not in user_rated_books]
+        Every stage is timed into `self.metrics`; pass a `RequestTrace` to
+        also collect the per-stage breakdown for this single request.
+        """
+        stage = self.metrics.stage
         
-        if not candidate_books:
-            return []
+        with stage('hybrid.total', trace):
+            # Filter candidate books
+            with stage('hybrid.candidates', trace) as rec:
+                candidate_books = [bid for bid in all_book_ids if bid not in user_rated_books]
+                rec.candidates = len(all_book_ids)
+            
+            if not candidate_books:
+                return []
+            
+            # Collect scores from all recommenders
+            all_scores = defaultdict(float)
+            
+            # 1. Popularity-based
+            with stage('hybrid.popularity', trace) as rec:
+                pop_recs = self.popularity_rec.get_recommendations(n=len(candidate_books))
+                for book_id, score in pop_recs:
+                    if book_id in candidate_books:
+                        all_scores[book_id] += score * self.weights['popularity']
+                rec.candidates = len(pop_recs)
+            
+            # 2 & 3. Content-based (from user's liked books)
+            if user_rated_books:
+                with stage('hybrid.content', trace) as rec:
+                    for rated_book in user_rated_books[-5:]:
+                        content_recs = self.content_rec.get_similar_books(rated_book, n=20)
+                        for book_id, score in content_recs:
+                            if book_id in candidate_books:
+                                all_scores[book_id] += score * self.weights['content']
+                        rec.candidates += len(content_recs)
+            
+            # 4. Collaborative Filtering
+            with stage('hybrid.collaborative', trace) as rec:
+                cf_recs = self.collaborative_rec.get_recommendations_cf(user_id, candidate_books, n=len(candidate_books))
+                for book_id, score in cf_recs:
+                    all_scores[book_id] += (score / 5.0) * self.weights['collaborative']
+                rec.candidates = len(candidate_books)
+            
+            # 5. Association Rules (books bought/rated together)
+            if user_rated_books:
+                with stage('hybrid.association', trace) as rec:
+                    for rated_book in user_rated_books[-3:]:
+                        assoc_recs = self.association_rec.get_associated_books(rated_book, n=15)
+                        for book_id, score in assoc_recs:
+                            if book_id in candidate_books:
+                                all_scores[book_id] += score * self.weights['association']
+                        rec.candidates += len(assoc_recs)
+            
+            # 6. Demographic
+            with stage('hybrid.demographic', trace) as rec:
+                demo_recs = self.demographic_rec.get_recommendations(candidate_books=candidate_books, n=len(candidate_books), user_id=user_id)
+                for book_id, score in demo_recs:
+                    all_scores[book_id] += (score / 5.0) * self.weights['demographic']
+                rec.candidates = len(candidate_books)
+            
+            # 7. Context-aware (if context provided)
+            if context:
+                with stage('hybrid.context', trace) as rec:
+                    context_recs = self.context_rec.get_context_recommendations(context, n=20)
+                    for book_id, score in context_recs:
+                        if book_id in candidate_books:
+                            all_scores[book_id] += (score / 5.0) * self.weights['context']
+                    rec.candidates = len(context_recs)
+            
+            # 10. Personality Quiz (if personality provided)
+            if personality:
+                with stage('hybrid.quiz', trace) as rec:
+                    quiz_recs = self.quiz_rec.get_quiz_recommendations(personality, n=20)
+                    for book_id, score in quiz_recs:
+                        if book_id in candidate_books:
+                            all_scores[book_id] += score * self.weights['quiz']
+                    rec.candidates = len(quiz_recs)
+            
+            # Convert to sorted list
+            with stage('hybrid.rank', trace) as rec:
+                recommendations = [(bid, score) for bid, score in all_scores.items()]
+                recommendations.sort(key=lambda x: x[1], reverse=True)
+                rec.candidates = len(recommendations)
+            
+            # Get top recommendations before diversity optimization
+            top_recs = recommendations[:n_recommendations * 3]
+            
+            # 15. Apply diversity optimization if enabled
+            if diversity_enabled and hasattr(self.content_rec, 'book_features') and self.content_rec.book_features is not None:
+                with stage('hybrid.diversity', trace) as rec:
+                    self.content_rec.compact()
+                    books_df = self.content_rec.book_features
+                    final_recs = self.diversity_optimizer.diversify_recommendations(
+                        top_recs, books_df, n=n_recommendations,
+                        embeddings=self.content_rec.get_embeddings([book_id for book_id, _ in top_recs])
+                    )
+                    rec.candidates = len(top_recs)
+            else:
+                final_recs = top_recs[:n_recommendations]
+        
+        return final_recs
+    
+    def record_rating(
+        self,
+        user_id: int,
+        book_id: int,
+        rating: float,
+        created_at: Optional[datetime] = None,
+        book_average: Optional[float] = None,
+        book_rating_count: Optional[int] = None,
+        is_new: bool = True
+    ):
+        """Apply a rating write to the incrementally maintained models"""
+        self.popularity_rec.record_rating(book_id, rating, created_at, book_average, book_rating_count, is_new)
+    
+    def add_books(self, books_df: pd.DataFrame) -> List[int]:
+        """Make newly created books visible without a refit
         
-        # Collect scores from all recommenders
-        all_scores = defaultdict(float)
+        Appends their content vectors and places them on the genre
+        leaderboards. Check `content_rec.vocabulary_stale` to know when a
+        full retrain is due.
+        """
+        added = self.content_rec.add_books(books_df)
         
-        # 1. Popularity-based
-        pop_recs = self.popularity_rec.get_recommendations(n=len(candidate_books))
-        for book_id, score in pop_recs:
-            if book_id in candidate_books:
-                all_scores[book_id] += score * self.weights['popularity']
+        leaderboards = getattr(self.popularity_rec, 'genre_leaderboards', None)
+        if leaderboards is not None:
+            new_books = books_df[books_df['id'].isin(added)]
+            for book, genres in zip(new_books.itertuples(index=False), genre_lists(new_books)):
+                leaderboards.update_book(
+                    int(book.id),
+                    getattr(book, 'average_rating', 0.0) or 0.0,
+                    getattr(book, 'rating_count', 0) or 0,
+                    genres
+                )
+        return added
+    
+    def build_batch_catalog(
+        self,
+        all_book_ids: List[int],
+        context: Optional[str] = None,
+        personality: Optional[str] = None
+    ) -> BatchCatalog:
+        """Precompute the user-independent scores shared by a batch of users"""
+        catalog = BatchCatalog(all_book_ids)
+        columns = catalog.columns
         
-        # 2 & 3. Content-based (from user's liked books)
-        if user_rated_books:
-            for rated_book in user_rated_books[-5:]:
-                content_recs = self.content_rec.get_similar_books(rated_book, n=20)
-                for book_id, score in content_recs:
-                    if book_id in candidate_books:
-                        all_scores[book_id] += score * self.weights['content']
-        
-        # 4. Collaborative Filtering
-        cf_recs = self.collaborative_rec.get_recommendations_cf(user_id, candidate_books, n=len(candidate_books))
-        for book_id, score in cf_recs:
-            all_scores[book_id] += (score / 5.0) * self.weights['collaborative']
-        
-        # 5. Association Rules (books bought/rated together)
-        if user_rated_books:
-            for rated_book in user_rated_books[-3:]:
-                assoc_recs = self.association_rec.get_associated_books(rated_book, n=15)
-                for book_id, score in assoc_recs:
-                    if book_id in candidate_books:
-                        all_scores[book_id] += score * self.weights['association']
-        
-        # 6. Demographic
-        demo_recs = self.demographic_rec.get_recommendations(candidate_books=candidate_books, n=len(candidate_books))
-        for book_id, score in demo_recs:
-            all_scores[book_id] += (score / 5.0) * self.weights['demographic']
-        
-        # 7. Context-aware (if context provided)
-        if context:
-            context_recs = self.context_rec.get_context_recommendations(context, n=20)
-            for book_id, score in context_recs:
-                if book_id in candidate_books:
-                    all_scores[book_id] += (score / 5.0) * self.weights['context']
-        
-        # 10. Personality Quiz (if personality provided)
-        if personality:
-            quiz_recs = self.quiz_rec.get_quiz_recommendations(personality, n=20)
-            for book_id, score in quiz_recs:
-                if book_id in candidate_books:
-                    all_scores[book_id] += score * self.weights['quiz']
-        
-        # Convert to sorted list
-        recommendations = [(bid, score) for bid, score in all_scores.items()]
-        recommendations.sort(key=lambda x: x[1], reverse=True)
+        def add_scores(recs: List[Tuple[int, float]], scale: float):
+            for book_id, score in recs:
+                col = columns.get(book_id)
+                if col is not None:
+                    catalog.static_scores[col] += score * scale
         
-        # Get top recommendations before diversity optimization
-        top_recs = recommendations[:n_recommendations * 3]
+        with self.metrics.stage('batch.catalog') as rec:
+            add_scores(self.popularity_rec.get_recommendations(n=len(catalog)), self.weights['popularity'])
+            if context:
+                add_scores(self.context_rec.get_context_recommendations(context, n=20), self.weights['context'] / 5.0)
+            if personality:
+                add_scores(self.quiz_rec.get_quiz_recommendations(personality, n=20), self.weights['quiz'])
+            
+            cf = self.collaborative_rec
+            if cf.book_means is not None:
+                # Books without ratings get a zero mean, as in predict_rating_cf
+                catalog.book_bias = (
+                    cf.book_means.reindex(catalog.book_ids).fillna(0).to_numpy(dtype=float) - cf.global_mean
+                )
+            
+            self.content_rec.compact()
+            catalog.book_info = self.diversity_optimizer.build_book_info(self.content_rec.book_features)
+            rec.candidates = len(catalog)
         
-        # 15. Apply diversity optimization if enabled
-        if diversity_enabled and hasattr(self.content_rec, 'book_features') and self.content_rec.book_features is not None:
-            books_df = self.content_rec.book_features
-            final_recs = self.diversity_optimizer.diversify_recommendations(
-                top_recs, books_df, n=n_recommendations
-            )
-        else:
-            final_recs = top_recs[:n_recommendations]
+        return catalog
+    
+    def _profile_vector(self, profile: str, catalog: BatchCatalog) -> np.ndarray:
+        """Weighted demographic scores of one profile, aligned with the catalog"""
+        demographic = self.demographic_rec
+        vector = np.full(len(catalog), demographic.DEFAULT_SCORE)
+        top = getattr(demographic, 'segment_top', {}).get(profile)
+        pairs = zip(top[0].tolist(), top[1].tolist()) if top is not None \
+            else demographic.demographic_profiles.get(profile, {}).items()
+        for book_id, score in pairs:
+            col = catalog.columns.get(int(book_id))
+            if col is not None:
+                vector[col] = score
+        return vector * (self.weights['demographic'] / 5.0)
+    
+    def get_batch_hybrid_recommendations(
+        self,
+        users_rated_books: Dict[int, List[int]],
+        catalog: BatchCatalog,
+        n_recommendations: int = 10,
+        diversity_enabled: bool = True
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """Score many users at once against a shared catalog
         
-        return final_recs
+        Produces the same ranking as `get_hybrid_recommendations` for each
+        user (except that the popularity list is not cut to the user's
+        candidate count), but computes the strategies as (users x catalog)
+        matrix operations instead of per-user Python loops. Keep
+        len(users_rated_books) * len(catalog) bounded; see `batch_chunk_size`.
+        """
+        user_ids = list(users_rated_books.keys())
+        if not user_ids or len(catalog) == 0:
+            return {user_id: [] for user_id in user_ids}
+        
+        stage = self.metrics.stage
+        cf = self.collaborative_rec
+        
+        with stage('batch.total') as total:
+            total.candidates = len(user_ids) * len(catalog)
+            
+            # Popularity, context and quiz are shared by every user
+            scores = np.tile(catalog.static_scores, (len(user_ids), 1))
+            
+            # Demographic: one precomputed vector per segment
+            with stage('batch.demographic') as rec:
+                rows_by_profile = defaultdict(list)
+                for row, user_id in enumerate(user_ids):
+                    rows_by_profile[self.demographic_rec.get_user_profile(user_id)].append(row)
+                for profile, rows in rows_by_profile.items():
+                    if profile not in catalog.profile_scores:
+                        catalog.profile_scores[profile] = self._profile_vector(profile, catalog)
+                    scores[rows] += catalog.profile_scores[profile]
+                rec.candidates = len(rows_by_profile)
+            
+            # Collaborative filtering: clip(global + user bias + book bias) as an outer sum
+            with stage('batch.collaborative') as rec:
+                if cf.user_book_matrix is None:
+                    cf_scores = np.full((len(user_ids), len(catalog)), max(1.0, min(5.0, cf.global_mean)))
+                else:
+                    user_bias = np.array([
+                        (cf.user_means.get(user_id, 0) if cf.user_means is not None else cf.global_mean) - cf.global_mean
+                        for user_id in user_ids
+                    ])
+                    cf_scores = np.clip(cf.global_mean + user_bias[:, None] + catalog.book_bias[None, :], 1.0, 5.0)
+                scores += cf_scores * (self.weights['collaborative'] / 5.0)
+                rec.candidates = cf_scores.size
+            
+            # Content and association: (users x rated books) @ (rated books x catalog)
+            with stage('batch.content') as rec:
+                scores += self._batch_neighbor_scores(
+                    users_rated_books, user_ids, catalog, catalog.content_neighbors,
+                    window=5, fetch=lambda ids: self.content_rec.get_similar_books_batch(ids, n=20)
+                ) * self.weights['content']
+                rec.candidates = len(catalog.content_neighbors)
+            
+            with stage('batch.association') as rec:
+                scores += self._batch_neighbor_scores(
+                    users_rated_books, user_ids, catalog, catalog.association_neighbors,
+                    window=3, fetch=lambda ids: {bid: self.association_rec.get_associated_books(bid, n=15) for bid in ids}
+                ) * self.weights['association']
+                rec.candidates = len(catalog.association_neighbors)
+            
+            # Drop already rated books and keep the top n * 3 per user
+            with stage('batch.rank') as rec:
+                for row, user_id in enumerate(user_ids):
+                    rated_cols = [catalog.columns[bid] for bid in users_rated_books[user_id] if bid in catalog.columns]
+                    scores[row, rated_cols] = -np.inf
+                
+                k = min(n_recommendations * 3, len(catalog))
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                rec.candidates = scores.size
+            
+            results = {}
+            with stage('batch.diversity') as rec:
+                for row, user_id in enumerate(user_ids):
+                    cols = top[row][np.argsort(-scores[row, top[row]], kind='stable')]
+                    top_recs = [
+                        (int(catalog.book_ids[col]), float(scores[row, col]))
+                        for col in cols if np.isfinite(scores[row, col])
+                    ]
+                    if diversity_enabled and catalog.book_info:
+                        results[user_id] = self.diversity_optimizer.diversify_recommendations(
+                            top_recs, None, n=n_recommendations, book_info=catalog.book_info,
+                            embeddings=self.content_rec.get_embeddings([book_id for book_id, _ in top_recs])
+                        )
+                    else:
+                        results[user_id] = top_recs[:n_recommendations]
+                    rec.candidates += len(top_recs)
+        
+        return results
+    
+    @staticmethod
+    def _batch_neighbor_scores(users_rated_books, user_ids, catalog: BatchCatalog, cache: Dict, window: int, fetch) -> np.ndarray:
+        """Sum neighbor scores of each user's last `window` rated books via a sparse product"""
+        recent = {user_id: users_rated_books[user_id][-window:] for user_id in user_ids}
+        rows = list(dict.fromkeys(bid for rated in recent.values() for bid in rated))
+        if not rows:
+            return np.zeros((len(user_ids), len(catalog)))
+        
+        missing = [bid for bid in rows if bid not in cache]
+        if missing:
+            cache.update(fetch(missing))
+        
+        row_index = {bid: i for i, bid in enumerate(rows)}
+        data, indices, indptr = [], [], [0]
+        for user_id in user_ids:
+            for bid in recent[user_id]:
+                indices.append(row_index[bid])
+                data.append(1.0)
+            indptr.append(len(indices))
+        user_rows = sparse.csr_matrix((data, indices, indptr), shape=(len(user_ids), len(rows)))
+        
+        return (user_rows @ catalog.neighbor_matrix(rows, cache)).toarray()
+    
+    @staticmethod
+    def batch_chunk_size(n_books: int, max_cells: int = 1 << 24) -> int:
+        """Users per batch so the dense (users x catalog) score block stays bounded"""
+        return max(1, min(1000, max_cells // max(n_books, 1)))
     
     def get_strategy_specific_recommendations(
         self,
@@ -521,41 +1421,80 @@ class AdvancedHybridRecommender:
         candidate_books: Optional[List[int]] = None,
         context: Optional[str] = None,
         personality: Optional[str] = None,
-        n: int = 10
+        n: int = 10,
+        trace: Optional[RequestTrace] = None,
+        trending_window: str = DEFAULT_TRENDING_WINDOW,
+        user_rated_books: Optional[List[int]] = None
     ) -> List[Tuple[int, float]]:
-        """Get recommendations from a specific strategy"""
+        """Get recommendations from a specific strategy
+        
+        Without `book_id`, the content strategy scores books against the
+        profile of the user's last rated books.
+        """
+        
+        def content():
+            if book_id:
+                return self.content_rec.get_similar_books(book_id, n=n)
+            if user_rated_books:
+                return self.content_rec.get_profile_recommendations(user_rated_books[-10:], n=n, exclude=user_rated_books)
+            return []
         
         strategy_map = {
             'popularity': lambda: self.popularity_rec.get_recommendations(n=n),
-            'trending': lambda: self.popularity_rec.get_recommendations(n=n, trending=True),
-            'content': lambda: self.content_rec.get_similar_books(book_id, n=n) if book_id else [],
+            'trending': lambda: self.popularity_rec.get_recommendations(n=n, trending=True, window=trending_window),
+            'content': content,
             'collaborative': lambda: self.collaborative_rec.get_recommendations_cf(user_id, candidate_books if candidate_books else [], n=n) if user_id else [],
-            'demographic': lambda: self.demographic_rec.get_recommendations(candidate_books=candidate_books, n=n),
+            'demographic': lambda: self.demographic_rec.get_recommendations(candidate_books=candidate_books, n=n, user_id=user_id),
             'context': lambda: self.context_rec.get_context_recommendations(context if context else 'afternoon', n=n),
             'quiz': lambda: self.quiz_rec.get_quiz_recommendations(personality if personality else 'adventurous', n=n),
             'association': lambda: self.association_rec.get_associated_books(book_id, n=n) if book_id else []
         }
         
         if strategy in strategy_map:
-            return strategy_map[strategy]()
+            with self.metrics.stage(f'strategy.{strategy}', trace) as rec:
+                recommendations = strategy_map[strategy]()
+                rec.candidates = len(candidate_books) if candidate_books else len(recommendations)
+            return recommendations
         else:
             return []
     
+    def get_state(self) -> Dict:
+        """The picklable trained state (everything but metrics)"""
+        return {
+            'popularity_rec': self.popularity_rec,
+            'content_rec': self.content_rec,
+            'collaborative_rec': self.collaborative_rec,
+            'demographic_rec': self.demographic_rec,
+            'context_rec': self.context_rec,
+            'quiz_rec': self.quiz_rec,
+            'association_rec': self.association_rec,
+            'weights': self.weights,
+            'fitted_at': self.fitted_at
+        }
+    
+    def set_state(self, data: Dict):
+        """Restore state produced by get_state"""
+        self.popularity_rec = data['popularity_rec']
+        self.content_rec = data['content_rec']
+        self.collaborative_rec = data['collaborative_rec']
+        self.demographic_rec = data['demographic_rec']
+        self.context_rec = data['context_rec']
+        self.quiz_rec = data['quiz_rec']
+        self.association_rec = data['association_rec']
+        self.weights = data.get('weights', self.weights)
+        self.fitted_at = data.get('fitted_at')
+    
     def save(self, models_dir: str):
         """Save all trained models"""
         os.makedirs(models_dir, exist_ok=True)
         
         with open(os.path.join(models_dir, 'advanced_hybrid_recommender.pkl'), 'wb') as f:
-            pickle.dump({
-                'popularity_rec': self.popularity_rec,
-                'content_rec': self.content_rec,
-                'collaborative_rec': self.collaborative_rec,
-                'demographic_rec': self.demographic_rec,
-                'context_rec': self.context_rec,
-                'quiz_rec': self.quiz_rec,
-                'association_rec': self.association_rec,
-                'weights': self.weights
-            }, f)
+            pickle.dump(self.get_state(), f)
+        
+        # Dense embeddings live outside the pickle so they can be memory-mapped
+        embeddings = getattr(self.content_rec, 'embeddings', None)
+        if embeddings is not None:
+            embeddings.save(os.path.join(models_dir, 'content_embeddings'))
         
         logger.info(f"✅ Advanced Hybrid Recommender saved to {models_dir}")
     
@@ -565,15 +1504,11 @@ class AdvancedHybridRecommender:
         
         if os.path.exists(model_path):
             with open(model_path, 'rb') as f:
-                data = pickle.load(f)
+                self.set_state(pickle.load(f))
             
-            self.popularity_rec = data['popularity_rec']
-            self.content_rec = data['content_rec']
-            self.collaborative_rec = data['collaborative_rec']
-            self.demographic_rec = data['demographic_rec']
-            self.context_rec = data['context_rec']
-            self.quiz_rec = data['quiz_rec']
-            self.association_rec = data['association_rec']
-            self.weights = data.get('weights', self.weights)
+            embeddings = getattr(self.content_rec, 'embeddings', None)
+            if embeddings is not None and not embeddings.load(os.path.join(models_dir, 'content_embeddings')):
+                logger.warning("Content embeddings file missing; using TF-IDF similarity")
+                self.content_rec.embeddings = None
             
             logger.info(f"✅ Advanced Hybrid Recommender loaded from {models_dir}")
@@ -0,0 +1,221 @@
+"""
+Approximate nearest-neighbor indexes over unit-length book embeddings
+Pure NumPy: an IVF coarse quantizer and random-hyperplane LSH
+"""
+
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from ml.embeddings import BookEmbeddings
+
+
+# Rows assigned to centroids per block during k-means and index builds
+ASSIGN_BLOCK_ROWS = 1 << 15
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid of every vector, computed in blocks"""
+    return np.concatenate([
+        np.argmax(vectors[start:start + ASSIGN_BLOCK_ROWS] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ANNIndex(ABC):
+    """Common query path: gather candidate rows, score them exactly, keep the top k
+
+    Subclasses only decide which rows are candidates. Rows appended after
+    the build are kept in a small pending list that every query scans, so
+    the index stays exact for new books until the next rebuild.
+    """
+
+    SHARED_ARRAYS: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self.n_rows = 0
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @abstractmethod
+    def candidates(self, queries: np.ndarray) -> Iterable[np.ndarray]:
+        """Candidate rows of each query (pending rows are added by `search`)"""
+
+    def add(self, n_new: int):
+        """Register `n_new` rows appended to the end of the embeddings"""
+        new_rows = np.arange(self.n_rows, self.n_rows + n_new, dtype=np.int64)
+        self.pending = np.concatenate([self.pending, new_rows])
+        self.n_rows += n_new
+
+    def search(
+        self,
+        embeddings: BookEmbeddings,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the approximate top-k for each query, best first
+
+        `queries` is one vector or a (q x d) matrix; results are lists of
+        arrays for a matrix. Rows in `exclude` are never returned.
+        """
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries).astype(np.float32)
+        all_rows, all_scores = [], []
+        for query, rows in zip(queries, self.candidates(queries)):
+            rows = np.unique(np.concatenate([rows, self.pending]))
+            if exclude is not None and len(exclude):
+                rows = rows[~np.isin(rows, exclude)]
+            scores = embeddings.get(rows) @ query
+            top = _top_k(scores, k)
+            all_rows.append(rows[top])
+            all_scores.append(scores[top])
+        if single:
+            return all_rows[0], all_scores[0]
+        return all_rows, all_scores  # type: ignore[return-value]
+
+
+class IVFIndex(ANNIndex):
+    """Inverted-file index: k-means cells, query scans the `nprobe` closest cells
+
+    Inverted lists are stored CSR-style (rows sorted by cell plus offsets),
+    so probing a cell is an array slice. Raising `nprobe` trades latency for
+    recall; nprobe == n_lists is an exact scan.
+    """
+
+    # Arrays that can be published to shared memory (see ml.shared_model)
+    SHARED_ARRAYS = ('centroids', 'list_offsets', 'list_rows')
+
+    def __init__(self, n_lists: Optional[int] = None, nprobe: int = 8, n_iter: int = 10, random_state: int = 42):
+        super().__init__()
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.random_state = random_state
+        self.centroids: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None
+
+    def build(self, embeddings: BookEmbeddings) -> 'IVFIndex':
+        """Train the coarse quantizer and fill the inverted lists"""
+        n = len(embeddings)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        self.n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.random_state)
+
+        # Spherical k-means on a sample of at most 64 points per cell
+        sample_rows = np.sort(rng.choice(n, size=min(n, 64 * self.n_lists), replace=False))
+        sample = embeddings.get(sample_rows)
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignment = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            # Empty cells keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (centroids / norms).astype(np.float32)
+        self.centroids = centroids
+
+        assignment = np.concatenate([
+            _assign(embeddings.get(np.arange(start, min(start + ASSIGN_BLOCK_ROWS, n))), centroids)
+            for start in range(0, n, ASSIGN_BLOCK_ROWS)
+        ]) if n else np.empty(0, dtype=np.int64)
+        self.list_rows = np.argsort(assignment, kind='stable').astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))]).astype(np.int64)
+        self.n_rows = n
+        self.pending = np.empty(0, dtype=np.int64)
+        return self
+
+    def candidates(self, queries: np.ndarray) -> Iterable[np.ndarray]:
+        nprobe = max(1, min(self.nprobe, self.n_lists or 1))
+        cell_scores = queries @ self.centroids.T  # type: ignore[union-attr]
+        for scores in cell_scores:
+            cells = _top_k(scores, nprobe)
+            yield np.concatenate([
+                self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]]  # type: ignore[index]
+                for c in cells
+            ])
+
+
+class LSHIndex(ANNIndex):
+    """Random-hyperplane LSH: `n_tables` tables of `n_bits`-bit sign hashes
+
+    Each table keeps its codes sorted, so a bucket lookup is a searchsorted
+    range. `nprobe` extra buckets per table (Hamming-distance-1 neighbors
+    of the query code, least confident bits first) raise recall.
+    """
+
+    SHARED_ARRAYS = ('planes', 'sorted_codes', 'sorted_rows')
+
+    def __init__(self, n_tables: int = 8, n_bits: int = 12, nprobe: int = 0, random_state: int = 42):
+        super().__init__()
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.nprobe = nprobe
+        self.random_state = random_state
+        self.planes: Optional[np.ndarray] = None        # tables x bits x dim
+        self.sorted_codes: Optional[np.ndarray] = None  # tables x rows
+        self.sorted_rows: Optional[np.ndarray] = None   # tables x rows
+
+    def build(self, embeddings: BookEmbeddings) -> 'LSHIndex':
+        """Draw the hyperplanes and hash every row"""
+        n = len(embeddings)
+        dim = embeddings.n_components
+        rng = np.random.default_rng(self.random_state)
+        self.planes = rng.standard_normal((self.n_tables, self.n_bits, dim)).astype(np.float32)
+
+        codes = np.empty((self.n_tables, n), dtype=np.int64)
+        for start in range(0, n, ASSIGN_BLOCK_ROWS):
+            block = embeddings.get(np.arange(start, min(start + ASSIGN_BLOCK_ROWS, n)))
+            codes[:, start:start + len(block)] = self._hash(block)[0]
+        order = np.argsort(codes, axis=1, kind='stable')
+        self.sorted_rows = order.astype(np.int64)
+        self.sorted_codes = np.take_along_axis(codes, order, axis=1)
+        self.n_rows = n
+        self.pending = np.empty(0, dtype=np.int64)
+        return self
+
+    def _hash(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes tables x n, projections tables x n x bits)"""
+        projections = np.einsum('tbd,nd->tnb', self.planes, vectors)
+        weights = np.int64(1) << np.arange(self.n_bits, dtype=np.int64)
+        codes = ((projections > 0).astype(np.int64) * weights).sum(axis=2)
+        return codes, projections
+
+    def candidates(self, queries: np.ndarray) -> Iterable[np.ndarray]:
+        codes, projections = self._hash(queries)
+        for q in range(len(queries)):
+            found = []
+            for t in range(self.n_tables):
+                probe_codes = [codes[t, q]]
+                if self.nprobe > 0:
+                    # Flip the bits whose projections are closest to zero
+                    for bit in np.argsort(np.abs(projections[t, q]))[:self.nprobe]:
+                        probe_codes.append(codes[t, q] ^ (1 << int(bit)))
+                for code in probe_codes:
+                    lo = np.searchsorted(self.sorted_codes[t], code, side='left')  # type: ignore[index]
+                    hi = np.searchsorted(self.sorted_codes[t], code, side='right')  # type: ignore[index]
+                    found.append(self.sorted_rows[t, lo:hi])  # type: ignore[index]
+            yield np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+ANN_INDEXES = {
+    'ivf': IVFIndex,
+    'lsh': LSHIndex
+}
@@ -0,0 +1,243 @@
+"""
+Scaling benchmark for the Advanced Hybrid Recommender
+Times each component's fit, measures query latency percentiles and peak memory
+on synthetic Zipf-distributed data, and writes the results as JSON
+
+Usage:
+    python ml/benchmark.py --scales 10000,100000,1000000 --output bench.json
+"""
+
+import os
+import sys
+import argparse
+import json
+import logging
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.advanced_recommender import AdvancedHybridRecommender
+from ml.sample_data import generate_synthetic_data
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = [10000, 100000]
+STRATEGIES = ['popularity', 'trending', 'content', 'collaborative', 'demographic', 'context', 'quiz', 'association']
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+@contextmanager
+def measure(result: Dict, trace_memory: bool = True):
+    """Record wall time, peak traced allocations and failures of a block into `result`"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    except MemoryError as e:
+        result['error'] = f'MemoryError: {e}'
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        result['seconds'] = round(time.perf_counter() - start, 4)
+        if trace_memory:
+            result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+            tracemalloc.stop()
+
+
+def latency_summary(samples_ms: List[float]) -> Dict:
+    """Exact percentiles of a list of latencies"""
+    if not samples_ms:
+        return {'count': 0}
+    values = np.asarray(samples_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def fit_components(recommender: AdvancedHybridRecommender, books_df: pd.DataFrame, ratings_df: pd.DataFrame,
+                   args: argparse.Namespace) -> Dict:
+    """Fit every component separately, timing each (mirrors AdvancedHybridRecommender.fit)"""
+    steps = [
+        ('popularity', lambda: recommender.popularity_rec.fit(books_df, ratings_df)),
+        ('content', lambda: recommender.content_rec.fit(books_df)),
+        ('collaborative', lambda: recommender.collaborative_rec.fit(ratings_df)),
+        ('demographic', lambda: recommender.demographic_rec.fit(None, ratings_df, books_df)),
+        ('context', lambda: recommender.context_rec.fit(books_df)),
+        ('quiz', lambda: recommender.quiz_rec.fit(books_df)),
+        ('association', lambda: recommender.association_rec.fit(ratings_df))
+    ]
+    if args.embedding_dim:
+        steps.append(('embeddings', lambda: recommender.content_rec.fit_embeddings(args.embedding_dim, quantize=args.quantize)))
+        if args.ann:
+            steps.append(('ann_index', lambda: recommender.content_rec.build_ann_index(args.ann)))
+
+    results = {}
+    for name, step in steps:
+        logger.info(f"Fitting {name}...")
+        results[name] = {}
+        with measure(results[name], trace_memory=not args.no_tracemalloc):
+            step()
+        if 'error' in results[name]:
+            logger.error(f"  {name} failed: {results[name]['error']}")
+    return results
+
+
+def measure_latency(recommender: AdvancedHybridRecommender, ratings_df: pd.DataFrame, all_book_ids: List[int],
+                    args: argparse.Namespace) -> Dict:
+    """p50/p99 latency of hybrid and per-strategy queries for sampled users"""
+    rng = np.random.default_rng(args.seed)
+    rated_by_user = ratings_df.groupby('user_id')['book_id'].apply(list)
+    users = rng.choice(rated_by_user.index.to_numpy(), size=min(args.queries, len(rated_by_user)), replace=False)
+
+    samples: Dict[str, List[float]] = {'hybrid': []}
+    samples.update({f'strategy.{s}': [] for s in args.strategies})
+    errors: Dict[str, str] = {}
+
+    for user_id in users:
+        rated = rated_by_user[user_id]
+        calls = [('hybrid', lambda: recommender.get_hybrid_recommendations(
+            user_id=int(user_id), user_rated_books=rated, all_book_ids=all_book_ids, n_recommendations=10
+        ))]
+        rated_set = set(rated)
+        candidates = [bid for bid in all_book_ids if bid not in rated_set] if args.strategies else []
+        for strategy in args.strategies:
+            calls.append((f'strategy.{strategy}', lambda strategy=strategy: recommender.get_strategy_specific_recommendations(
+                strategy=strategy, user_id=int(user_id), book_id=int(rated[-1]), candidate_books=candidates,
+                context='evening', personality='adventurous', n=10, user_rated_books=rated
+            )))
+
+        for name, call in calls:
+            start = time.perf_counter()
+            try:
+                call()
+            except Exception as e:
+                errors.setdefault(name, f'{type(e).__name__}: {e}')
+                continue
+            samples[name].append((time.perf_counter() - start) * 1000)
+
+    results = {name: latency_summary(values) for name, values in samples.items()}
+    for name, error in errors.items():
+        results[name]['error'] = error
+    return results
+
+
+def run_scale(n_ratings: int, args: argparse.Namespace) -> Dict:
+    """Generate data at one scale, fit, and measure"""
+    logger.info("=" * 80)
+    logger.info(f"Scale: {n_ratings} ratings")
+    logger.info("=" * 80)
+
+    generation: Dict = {}
+    with measure(generation, trace_memory=False):
+        books_df, ratings_df = generate_synthetic_data(n_ratings, zipf_exponent=args.zipf, seed=args.seed)
+
+    result = {
+        'n_ratings': len(ratings_df),
+        'n_books': len(books_df),
+        'n_users': int(ratings_df['user_id'].nunique()),
+        'generate_seconds': generation['seconds']
+    }
+
+    recommender = AdvancedHybridRecommender()
+    fit_start = time.perf_counter()
+    result['fit'] = fit_components(recommender, books_df, ratings_df, args)
+    result['fit_total_seconds'] = round(time.perf_counter() - fit_start, 4)
+
+    logger.info(f"Measuring latency over {args.queries} users...")
+    # Warm up lazily built state before timing
+    recommender.popularity_rec.get_recommendations(n=10, trending=True)
+    result['latency'] = measure_latency(recommender, ratings_df, books_df['id'].tolist(), args)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    hybrid = result['latency']['hybrid']
+    logger.info(
+        f"fit {result['fit_total_seconds']}s, hybrid p50 {hybrid.get('p50_ms')}ms "
+        f"p99 {hybrid.get('p99_ms')}ms, peak RSS {result['peak_rss_mb']}MB"
+    )
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark recommender fit time, query latency and memory")
+    parser.add_argument('--scales', type=lambda v: [int(x) for x in v.split(',')], default=DEFAULT_SCALES,
+                        help="Comma-separated numbers of ratings to generate (e.g. 10000,1000000,10000000)")
+    parser.add_argument('--queries', type=int, default=100, help="Users sampled for latency measurements")
+    parser.add_argument('--strategies', type=lambda v: [s for s in v.split(',') if s], default=STRATEGIES,
+                        help="Comma-separated strategies to time (empty for hybrid only)")
+    parser.add_argument('--zipf', type=float, default=1.07, help="Zipf exponent of book popularity and user activity")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--embedding-dim', type=int, default=None, help="Also fit LSA embeddings of this size")
+    parser.add_argument('--quantize', action='store_true', help="Quantize the embeddings to int8")
+    parser.add_argument('--ann', choices=['ivf', 'lsh'], default=None, help="Also build an ANN index")
+    parser.add_argument('--no-tracemalloc', action='store_true',
+                        help="Skip per-component allocation tracing (faster; peak RSS is still recorded)")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.json'),
+                        help="Where to write the JSON results (default: next to this script)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run the benchmark at every requested scale"""
+    args = parse_args(argv)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k != 'output'}
+        },
+        'results': []
+    }
+
+    # Silence per-component training logs during timing
+    logging.getLogger('ml.advanced_recommender').setLevel(logging.WARNING)
+
+    for n_ratings in args.scales:
+        report['results'].append(run_scale(n_ratings, args))
+        # Write after every scale so partial results survive a crash at larger ones
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    logger.info(f"✅ Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
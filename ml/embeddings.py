@@ -0,0 +1,126 @@
+"""
+Dense low-rank book embeddings (LSA) over the content TF-IDF matrix
+Unit-length float32 or int8-quantized rows, saved as memory-mappable .npy
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+
+DEFAULT_EMBEDDING_DIM = 128
+
+# Rows scanned per block when scoring int8 codes, bounding the float32 temporary
+SCORE_BLOCK_ROWS = 1 << 16
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class BookEmbeddings:
+    """TruncatedSVD projection of the TF-IDF rows, one unit vector per book
+
+    With `quantize`, rows are stored as int8 codes plus one float32 scale
+    per row (4x smaller than float32); dot products are then computed in
+    float32 blocks. The arrays are not pickled; `save` writes them next to
+    the model as .npy files and `load` memory-maps them read-only.
+    """
+
+    def __init__(self, n_components: int = DEFAULT_EMBEDDING_DIM, quantize: bool = False, random_state: int = 42):
+        self.n_components = n_components
+        self.quantize = quantize
+        self.svd = TruncatedSVD(n_components=n_components, algorithm='randomized', random_state=random_state)
+        self.vectors: Optional[np.ndarray] = None  # float32 rows, or int8 codes when quantized
+        self.scales: Optional[np.ndarray] = None   # per-row dequantization scale
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['vectors'] = None
+        state['scales'] = None
+        return state
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def fit(self, tfidf_matrix) -> 'BookEmbeddings':
+        """Fit the projection and embed every row of the TF-IDF matrix"""
+        # TruncatedSVD needs n_components < n_features
+        self.n_components = max(1, min(self.n_components, tfidf_matrix.shape[1] - 1, tfidf_matrix.shape[0]))
+        self.svd.set_params(n_components=self.n_components)
+        self.svd.fit(tfidf_matrix)
+        # float32 components halve the size of the stored projection
+        self.svd.components_ = self.svd.components_.astype(np.float32)
+        self.vectors, self.scales = None, None
+        self.append(tfidf_matrix)
+        return self
+
+    def project(self, tfidf_rows) -> np.ndarray:
+        """Unit-length float32 embeddings of TF-IDF rows"""
+        return _normalize_rows(self.svd.transform(tfidf_rows))
+
+    def _encode(self, vectors: np.ndarray):
+        if not self.quantize:
+            return vectors, None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def append(self, tfidf_rows):
+        """Embed and append new rows (copies the arrays; meant for small batches)"""
+        codes, scales = self._encode(self.project(tfidf_rows))
+        if self.vectors is None:
+            self.vectors, self.scales = np.ascontiguousarray(codes), scales
+            return
+        # Grow the scales first so a concurrent reader never sees a row without one
+        if scales is not None:
+            self.scales = np.concatenate([self.scales, scales])
+        self.vectors = np.concatenate([self.vectors, codes])
+
+    def get(self, rows) -> np.ndarray:
+        """float32 embeddings of the given row positions"""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)  # type: ignore[index]
+        if self.scales is not None:
+            vectors = vectors * self.scales[rows][..., None]
+        return vectors
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of query embeddings (q x d, or d) against every book"""
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries).astype(np.float32)
+        if self.scales is None:
+            result = queries @ self.vectors.T  # type: ignore[union-attr]
+        else:
+            result = np.empty((len(queries), len(self)), dtype=np.float32)
+            for start in range(0, len(self), SCORE_BLOCK_ROWS):
+                block = self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32)  # type: ignore[index]
+                result[:, start:start + len(block)] = (queries @ block.T) * self.scales[start:start + len(block)]
+        return result[0] if single else result
+
+    def profile(self, rows: List[int], weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unit-length weighted mean of several books' embeddings"""
+        centroid = np.average(self.get(rows), axis=0, weights=weights)
+        return _normalize_rows(centroid[None, :])[0]
+
+    def save(self, path: str):
+        """Write the arrays as <path>.npy (and <path>_scales.npy when quantized)"""
+        if self.vectors is None:
+            return
+        np.save(f'{path}.npy', np.ascontiguousarray(self.vectors))
+        if self.scales is not None:
+            np.save(f'{path}_scales.npy', self.scales)
+
+    def load(self, path: str, mmap: bool = True) -> bool:
+        """Attach the saved arrays, memory-mapped read-only by default"""
+        if not os.path.exists(f'{path}.npy'):
+            return False
+        mode = 'r' if mmap else None
+        self.vectors = np.load(f'{path}.npy', mmap_mode=mode)
+        scales_path = f'{path}_scales.npy'
+        self.scales = np.load(scales_path, mmap_mode=mode) if self.quantize and os.path.exists(scales_path) else None
+        return True
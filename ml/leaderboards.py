@@ -0,0 +1,223 @@
+"""
+Precomputed per-genre popularity leaderboards
+Bayesian-average ranked book ids kept as compact sorted arrays
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Key of the leaderboard that holds every book
+GLOBAL_LEADERBOARD = '*'
+
+# Database exports carry the real genre names '|'-joined in this column; the
+# space-joined 'genres' text would split multi-word names like "Science Fiction"
+GENRE_NAMES_COLUMN = 'genre_names'
+GENRE_SEPARATOR = '|'
+
+
+def genre_lists(books_df: pd.DataFrame) -> pd.Series:
+    """Lowercased genre names of each book
+
+    Read from GENRE_NAMES_COLUMN when present, else from whitespace-split
+    'genres' (sample data, where every genre is a single token).
+    """
+    if GENRE_NAMES_COLUMN in books_df.columns:
+        return books_df[GENRE_NAMES_COLUMN].fillna('').astype(str).map(
+            lambda names: [name.strip().lower() for name in names.split(GENRE_SEPARATOR) if name.strip()]
+        )
+    if 'genres' in books_df.columns:
+        return books_df['genres'].fillna('').astype(str).str.lower().str.split()
+    return pd.Series([[] for _ in range(len(books_df))], index=books_df.index, dtype=object)
+
+
+def _rank(scores: np.ndarray, score: float, lo: int, hi: int, after_ties: bool) -> int:
+    """Insertion index for `score` within scores[lo:hi], sorted descending
+
+    A plain binary search: np.searchsorted would need a negated copy of the
+    whole array to search a descending one.
+    """
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if scores[mid] > score or (after_ties and scores[mid] == score):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class GenreLeaderboards:
+    """Bayesian-average popularity lists for every genre plus a global one
+
+    score = (prior_count * global_mean + rating_sum) / (prior_count + rating_count)
+
+    Each leaderboard is a pair of aligned arrays (book ids, scores) sorted by
+    descending score, so top-N for a genre is an array slice. Rating writes
+    move a single book within the arrays of its genres: it is found by binary
+    search on its previous score and only the entries between its old and new
+    rank shift, in place.
+    """
+
+    def __init__(self, prior_count: Optional[float] = None):
+        self.prior_count = prior_count
+        self.global_mean = 3.0
+        self.book_stats: Dict[int, Tuple[float, float]] = {}  # book_id -> (rating_count, rating_sum)
+        self.book_genres: Dict[int, List[str]] = {}
+        self.ids: Dict[str, np.ndarray] = {}
+        self.scores: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def genres(self) -> List[str]:
+        return sorted(g for g in self.ids if g != GLOBAL_LEADERBOARD)
+
+    def fit(self, books_df: pd.DataFrame):
+        """Build every leaderboard from book averages and rating counts"""
+        if len(books_df) == 0:
+            return
+
+        counts = books_df['rating_count'].fillna(0).to_numpy(dtype=float)
+        sums = books_df['average_rating'].fillna(0).to_numpy(dtype=float) * counts
+        total = counts.sum()
+        self.global_mean = float(sums.sum() / total) if total > 0 else 3.0
+        if self.prior_count is None:
+            rated = counts[counts > 0]
+            self.prior_count = float(np.median(rated)) if len(rated) else 1.0
+
+        book_ids = books_df['id'].to_numpy(dtype=np.int64)
+        book_genre_lists = genre_lists(books_df)
+        self.book_stats = {int(b): (float(c), float(s)) for b, c, s in zip(book_ids, counts, sums)}
+        self.book_genres = {int(b): list(dict.fromkeys(g)) for b, g in zip(book_ids, book_genre_lists)}
+
+        scores = self._bayesian(counts, sums)
+        members: Dict[str, List[int]] = {GLOBAL_LEADERBOARD: list(range(len(book_ids)))}
+        for row, genres in enumerate(book_genre_lists):
+            for genre in set(genres):
+                members.setdefault(genre, []).append(row)
+
+        with self._lock:
+            self.ids, self.scores = {}, {}
+            for genre, rows in members.items():
+                rows_arr = np.asarray(rows, dtype=np.int64)
+                order = np.argsort(-scores[rows_arr], kind='stable')
+                self.ids[genre] = book_ids[rows_arr][order]
+                self.scores[genre] = scores[rows_arr][order].astype(np.float32)
+
+    def _bayesian(self, counts, sums):
+        prior = self.prior_count or 1.0
+        return (prior * self.global_mean + sums) / (prior + counts)
+
+    def update_book(self, book_id: int, average_rating: float, rating_count: int, genres: Optional[List[str]] = None):
+        """Re-rank one book after its rating aggregates changed (or add a new book)"""
+        count = float(rating_count or 0)
+        rating_sum = float(average_rating or 0.0) * count
+        score = np.float32(self._bayesian(count, rating_sum))
+
+        with self._lock:
+            previous = self.book_stats.get(book_id)
+            old_score = np.float32(self._bayesian(*previous)) if previous is not None else None
+            if genres is not None or book_id not in self.book_genres:
+                old_genres = self.book_genres.get(book_id, [])
+                new_genres = list(dict.fromkeys(g.strip().lower() for g in (genres or [])))
+                for genre in set(old_genres) - set(new_genres):
+                    self._remove(genre, book_id, old_score)
+                self.book_genres[book_id] = new_genres
+
+            self.book_stats[book_id] = (count, rating_sum)
+            for genre in [GLOBAL_LEADERBOARD] + self.book_genres[book_id]:
+                self._move(genre, book_id, old_score, score)
+
+    def _position(self, genre: str, book_id: int, score: Optional[np.float32]) -> Optional[int]:
+        """Index of a book on a leaderboard, searched among entries with its score first"""
+        ids = self.ids.get(genre)
+        if ids is None:
+            return None
+        if score is not None:
+            scores = self.scores[genre]
+            start = _rank(scores, score, 0, len(scores), after_ties=False)
+            end = _rank(scores, score, start, len(scores), after_ties=True)
+            hits = np.flatnonzero(ids[start:end] == book_id)
+            if len(hits):
+                return start + int(hits[0])
+        # Not on the board, or its stored score differs (e.g. a changed prior)
+        hits = np.flatnonzero(ids == book_id)
+        return int(hits[0]) if len(hits) else None
+
+    def _move(self, genre: str, book_id: int, old_score: Optional[np.float32], score: np.float32):
+        position = self._position(genre, book_id, old_score)
+        if position is None:
+            self._insert(genre, book_id, score)
+            return
+
+        ids, scores = self.ids[genre], self.scores[genre]
+        if score > scores[position]:
+            # Up: shift the books it passes one rank down
+            target = _rank(scores, score, 0, position, after_ties=True)
+            ids[target + 1:position + 1] = ids[target:position]
+            scores[target + 1:position + 1] = scores[target:position]
+        else:
+            # Down (or level): shift the books it falls behind one rank up
+            target = _rank(scores, score, position + 1, len(scores), after_ties=True) - 1
+            ids[position:target] = ids[position + 1:target + 1]
+            scores[position:target] = scores[position + 1:target + 1]
+        ids[target] = book_id
+        scores[target] = score
+
+    def _remove(self, genre: str, book_id: int, score: Optional[np.float32] = None):
+        position = self._position(genre, book_id, score)
+        if position is not None:
+            self.ids[genre] = np.delete(self.ids[genre], position)
+            self.scores[genre] = np.delete(self.scores[genre], position)
+
+    def _insert(self, genre: str, book_id: int, score: np.float32):
+        # Only for books new to this board; growing the arrays copies them
+        ids = self.ids.get(genre, np.empty(0, dtype=np.int64))
+        scores = self.scores.get(genre, np.empty(0, dtype=np.float32))
+        position = _rank(scores, score, 0, len(scores), after_ties=True)
+        self.ids[genre] = np.insert(ids, position, book_id)
+        self.scores[genre] = np.insert(scores, position, score)
+
+    def top(self, genres: Optional[List[str]] = None, n: int = 10, match: str = 'any') -> List[Tuple[int, float]]:
+        """Top-N books for a genre, or for books in any/all of several genres"""
+        keys = [g.strip().lower() for g in genres] if genres else [GLOBAL_LEADERBOARD]
+        if len(keys) == 1:
+            return self._slice(keys[0], n)
+
+        if match == 'all':
+            required = set(keys)
+            if any(key not in self.ids for key in required):
+                return []
+            # Walk the shortest list in rank order, keep books carrying every genre
+            shortest = min(required, key=lambda g: len(self.ids[g]))
+            results = []
+            for book_id, score in zip(self.ids[shortest], self.scores[shortest]):
+                if required.issubset(self.book_genres.get(int(book_id), ())):
+                    results.append((int(book_id), float(score)))
+                    if len(results) >= n:
+                        break
+            return results
+
+        # Any top-N book of the union is in the top-N of one of its genres
+        merged: Dict[int, float] = {}
+        for key in keys:
+            for book_id, score in self._slice(key, n):
+                merged[book_id] = score
+        return sorted(merged.items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def _slice(self, genre: str, n: int) -> List[Tuple[int, float]]:
+        ids = self.ids.get(genre)
+        if ids is None:
+            return []
+        return list(zip(ids[:n].tolist(), self.scores[genre][:n].tolist()))
@@ -0,0 +1,140 @@
+"""
+Lightweight latency and counter instrumentation for the recommenders
+Aggregates per-stage timings into fixed-bucket histograms
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +inf)
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        """Record a single observation"""
+        self.counts[bisect_left(self.buckets, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (bucket upper bound) for q in [0, 1]"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for i, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        """Serializable view of the histogram"""
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': buckets
+        }
+
+
+class StageRecord:
+    """Timing and candidate count for one stage of one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.elapsed_ms = 0.0
+        self.candidates = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'stage': self.name,
+            'elapsed_ms': round(self.elapsed_ms, 3),
+            'candidates': self.candidates
+        }
+
+
+class RequestTrace:
+    """Per-request stage breakdown, returned by debug requests"""
+
+    def __init__(self):
+        self.stages: List[StageRecord] = []
+
+    def to_dict(self) -> Dict:
+        return {
+            'total_ms': round(sum(s.elapsed_ms for s in self.stages), 3),
+            'stages': [s.to_dict() for s in self.stages]
+        }
+
+
+class RecommenderMetrics:
+    """Process-wide registry of stage latency histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str, trace: Optional[RequestTrace] = None) -> Iterator[StageRecord]:
+        """Time a block; set `record.candidates` inside it to count candidates touched"""
+        record = StageRecord(name)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.latency[name].observe(record.elapsed_ms)
+                self.counters[f'{name}.calls'] += 1
+                self.counters[f'{name}.candidates'] += record.candidates
+            if trace is not None:
+                trace.stages.append(record)
+
+    def increment(self, name: str, value: int = 1):
+        """Bump a named counter"""
+        with self._lock:
+            self.counters[name] += value
+
+    def snapshot(self) -> Dict:
+        """Serializable view of all histograms and counters"""
+        with self._lock:
+            return {
+                'latency': {name: hist.snapshot() for name, hist in sorted(self.latency.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+    def reset(self):
+        """Drop all collected metrics"""
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+
+
+# Global metrics registry shared by the recommenders and the API
+recommender_metrics = RecommenderMetrics()
@@ -3,6 +3,7 @@ import numpy as np
 import random
 from datetime import datetime, timedelta
 import os
+from typing import List, Optional
 
 # Sample book data
 SAMPLE_BOOKS = [
@@ -263,5 +264,90 @@ def create_sample_data():
     return books_df, ratings_df
 
 
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    """Normalized Zipf probabilities for ranks 1..n"""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    return weights / weights.sum()
+
+
+def generate_synthetic_data(
+    n_ratings: int,
+    n_books: Optional[int] = None,
+    n_users: Optional[int] = None,
+    zipf_exponent: float = 1.07,
+    seed: int = 42
+):
+    """Generate a synthetic catalog and ratings at arbitrary scale
+    
+    Book popularity and user activity both follow Zipf distributions, so a
+    few books and users account for most ratings, as in real catalogs.
+    Titles, descriptions and genres are drawn from the sample books'
+    vocabulary. (user, book) pairs are distinct; heavy users are capped at a
+    fifth of the catalog. Nothing is written to disk.
+    """
+    rng = np.random.default_rng(seed)
+    n_books = n_books or max(1000, n_ratings // 50)
+    n_users = n_users or max(100, n_ratings // 20)
+    
+    words = np.array(sorted({
+        word.strip('.,').lower()
+        for book in SAMPLE_BOOKS
+        for word in (book['title'] + ' ' + book['description']).split()
+    }))
+    genre_names = np.array(sorted({g for book in SAMPLE_BOOKS for g in book['genres'].split()} | {
+        'fiction', 'adventure', 'fantasy', 'romance', 'science', 'history', 'poetry', 'business', 'technical'
+    }))
+    
+    def phrases(n_rows: int, length: int, vocabulary: np.ndarray) -> List[str]:
+        picks = vocabulary[rng.integers(0, len(vocabulary), size=(n_rows, length))]
+        return [' '.join(row) for row in picks]
+    
+    book_ids = np.arange(1, n_books + 1)
+    books_df = pd.DataFrame({
+        'id': book_ids,
+        'title': phrases(n_books, 3, words),
+        'author': phrases(n_books, 2, words),
+        'description': phrases(n_books, 25, words),
+        'genres': phrases(n_books, 3, genre_names),
+        'publication_year': rng.integers(1950, 2025, size=n_books),
+        'price': np.round(rng.uniform(5, 30, size=n_books), 2)
+    })
+    
+    # Popularity rank is shuffled so it is not correlated with the id
+    book_popularity = _zipf_weights(n_books, zipf_exponent)[rng.permutation(n_books)]
+    # No user can rate more than a fifth of the catalog
+    user_activity = np.minimum(_zipf_weights(n_users, zipf_exponent) * n_ratings, n_books / 5)
+    user_activity = (user_activity / user_activity.sum())[rng.permutation(n_users)]
+    quality = rng.normal(3.8, 0.5, size=n_books)
+    
+    # Redraw until enough distinct (user, book) pairs exist
+    pairs = pd.DataFrame({'user_id': np.empty(0, dtype=np.int64), 'book_id': np.empty(0, dtype=np.int64)})
+    for _ in range(20):
+        missing = n_ratings - len(pairs)
+        if missing <= 0:
+            break
+        size = int(missing * 1.2) + 1
+        drawn = pd.DataFrame({
+            'user_id': rng.choice(np.arange(1, n_users + 1), size=size, p=user_activity),
+            'book_id': rng.choice(book_ids, size=size, p=book_popularity)
+        })
+        pairs = pd.concat([pairs, drawn], ignore_index=True).drop_duplicates(['user_id', 'book_id'])
+    ratings_df = pairs.iloc[:n_ratings].reset_index(drop=True)
+    
+    # Each book has a latent quality; ratings skew high like real ratings
+    size = len(ratings_df)
+    noise = rng.normal(0, 0.8, size=size)
+    ratings_df['rating'] = np.clip(np.round(quality[ratings_df['book_id'].to_numpy() - 1] + noise), 1, 5)
+    seconds_ago = rng.integers(0, 730 * 24 * 3600, size=size)
+    ratings_df['created_at'] = pd.Timestamp.now().floor('s') - pd.to_timedelta(seconds_ago, unit='s')
+    ratings_df.insert(0, 'id', np.arange(1, size + 1))
+    
+    stats = ratings_df.groupby('book_id')['rating'].agg(['mean', 'count'])
+    books_df['average_rating'] = books_df['id'].map(stats['mean']).fillna(0.0).round(2)
+    books_df['rating_count'] = books_df['id'].map(stats['count']).fillna(0).astype(int)
+    
+    return books_df, ratings_df
+
+
 if __name__ == "__main__":
     create_sample_data()
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Shared, memory-mapped model state for multi-worker serving
+One process publishes the large arrays as .npy files; every worker maps them read-only
+"""
+
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ml.advanced_recommender import AdvancedHybridRecommender
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows); there open files cannot be deleted anyway
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+STATE_FILE = 'state.pkl'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.lock'
+
+
+class CooccurrenceView(Mapping):
+    """Read-only book -> {book: count} mapping over a shared CSR matrix
+
+    Stands in for AssociationRuleRecommender.book_cooccurrence, whose
+    dict-of-dicts form costs far more memory per worker than the counts.
+    """
+
+    def __init__(self, book_ids: np.ndarray, matrix: sparse.csr_matrix):
+        self.book_ids = book_ids
+        self.matrix = matrix
+
+    @classmethod
+    def from_dict(cls, cooccurrence: Mapping) -> 'CooccurrenceView':
+        book_ids = np.asarray(sorted(set(cooccurrence) | {b for row in cooccurrence.values() for b in row}), dtype=np.int64)
+        rows, cols, counts = [], [], []
+        for book, row in cooccurrence.items():
+            rows.append(np.full(len(row), book, dtype=np.int64))
+            cols.append(np.fromiter(row.keys(), dtype=np.int64, count=len(row)))
+            counts.append(np.fromiter(row.values(), dtype=np.int32, count=len(row)))
+        if not rows:
+            return cls(book_ids, sparse.csr_matrix((0, 0), dtype=np.int32))
+        matrix = sparse.csr_matrix(
+            (np.concatenate(counts), (np.searchsorted(book_ids, np.concatenate(rows)), np.searchsorted(book_ids, np.concatenate(cols)))),
+            shape=(len(book_ids), len(book_ids))
+        )
+        return cls(book_ids, matrix)
+
+    def _position(self, book_id) -> Optional[int]:
+        pos = int(np.searchsorted(self.book_ids, book_id))
+        if pos < len(self.book_ids) and self.book_ids[pos] == book_id:
+            return pos
+        return None
+
+    def __contains__(self, book_id) -> bool:
+        pos = self._position(book_id)
+        return pos is not None and self.matrix.indptr[pos + 1] > self.matrix.indptr[pos]
+
+    def __getitem__(self, book_id) -> Dict[int, int]:
+        pos = self._position(book_id)
+        if pos is None:
+            raise KeyError(book_id)
+        start, end = self.matrix.indptr[pos], self.matrix.indptr[pos + 1]
+        return dict(zip(self.book_ids[self.matrix.indices[start:end]].tolist(), self.matrix.data[start:end].tolist()))
+
+    def __iter__(self) -> Iterator[int]:
+        nonempty = np.flatnonzero(np.diff(self.matrix.indptr))
+        return iter(self.book_ids[nonempty].tolist())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(np.diff(self.matrix.indptr)))
+
+
+def _array_slots(model: AdvancedHybridRecommender) -> List[Tuple[str, object, str]]:
+    """(name, owner, attribute) of every large array-like attribute worth sharing"""
+    content = model.content_rec
+    collaborative = model.collaborative_rec
+    slots = [
+        ('association.book_cooccurrence', model.association_rec, 'book_cooccurrence'),
+        ('content.tfidf_matrix', content, 'tfidf_matrix'),
+        ('collaborative.user_book_matrix', collaborative, 'user_book_matrix'),
+        ('collaborative.item_similarity', collaborative, 'item_similarity'),
+        ('collaborative.user_similarity', collaborative, 'user_similarity')
+    ]
+
+    embeddings = getattr(content, 'embeddings', None)
+    if embeddings is not None:
+        slots += [('embeddings.vectors', embeddings, 'vectors'), ('embeddings.scales', embeddings, 'scales')]
+
+    ann_index = getattr(content, 'ann_index', None)
+    if ann_index is not None:
+        slots += [(f'ann.{attr}', ann_index, attr) for attr in ann_index.SHARED_ARRAYS]
+    return slots
+
+
+class SharedModelStore:
+    """Versioned directory of memory-mappable model arrays
+
+    Layout: <root>/<version>/ holds one .npy per array, the rest of the
+    model pickled with those arrays detached (state.pkl), and a manifest
+    describing how to rebuild each array-backed attribute (plain array,
+    CSR matrix, DataFrame or co-occurrence counts). <root>/CURRENT names
+    the live version and is swapped with os.replace, so readers always see
+    a complete version.
+    Pages of the mapped files are shared by every process through the OS
+    page cache; a new worker costs only its pickled remainder.
+    Publishing and pruning hold <root>/.lock exclusively and attaching
+    holds it shared, so a version is never removed while a worker is
+    still opening its files; once mapped, they survive removal.
+    """
+
+    def __init__(self, root: str, keep_versions: int = 2):
+        self.root = root
+        self.keep_versions = keep_versions
+
+    def current_version(self) -> Optional[str]:
+        """Name of the live version, None when nothing has been published"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        os.makedirs(self.root, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, model: AdvancedHybridRecommender) -> str:
+        """Write the model as a new version and make it current"""
+        with self._locked(exclusive=True):
+            return self._publish(model)
+
+    def ensure_published(self, load: Callable[[], Optional[AdvancedHybridRecommender]]) -> Optional[str]:
+        """The current version, publishing load() first when there is none
+
+        Workers starting together all call this; the first one publishes
+        and the others find its version once they get the lock.
+        """
+        with self._locked(exclusive=True):
+            version = self.current_version()
+            if version is not None:
+                return version
+            model = load()
+            return self._publish(model) if model is not None else None
+
+    def _publish(self, model: AdvancedHybridRecommender) -> str:
+        # Buffered appended books must be in the arrays written below
+        model.content_rec.compact()
+        version = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        staging = os.path.join(self.root, f'.{version}.tmp')
+        os.makedirs(staging)
+
+        manifest: Dict[str, Dict] = {}
+        detached = []
+        try:
+            for name, owner, attr in _array_slots(model):
+                value = getattr(owner, attr, None)
+                if value is None:
+                    continue
+                manifest[name] = self._write(staging, name, value)
+                detached.append((owner, attr, value))
+                setattr(owner, attr, None)
+
+            with open(os.path.join(staging, STATE_FILE), 'wb') as f:
+                pickle.dump(model.get_state(), f)
+        finally:
+            for owner, attr, value in detached:
+                setattr(owner, attr, value)
+
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f)
+
+        os.rename(staging, os.path.join(self.root, version))
+        pointer = os.path.join(self.root, f'.{CURRENT_FILE}.{os.getpid()}.tmp')
+        with open(pointer, 'w') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.root, CURRENT_FILE))
+
+        self._prune(version)
+        logger.info(f"Published shared model version {version} ({len(manifest)} arrays)")
+        return version
+
+    def attach(self, version: Optional[str] = None) -> Optional[Tuple[str, AdvancedHybridRecommender]]:
+        """Load a version (default: current) with its arrays memory-mapped read-only"""
+        with self._locked(exclusive=False):
+            version = version or self.current_version()
+            if version is None:
+                return None
+            return version, self._attach(os.path.join(self.root, version))
+
+    def _attach(self, directory: str) -> AdvancedHybridRecommender:
+        model = AdvancedHybridRecommender()
+        with open(os.path.join(directory, STATE_FILE), 'rb') as f:
+            model.set_state(pickle.load(f))
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        for name, owner, attr in _array_slots(model):
+            spec = manifest.get(name)
+            if spec is not None:
+                setattr(owner, attr, self._read(directory, name, spec))
+        return model
+
+    @staticmethod
+    def _write(directory: str, name: str, value) -> Dict:
+        def save(suffix: str, array) -> None:
+            np.save(os.path.join(directory, f'{name}{suffix}.npy'), np.ascontiguousarray(array))
+
+        if isinstance(value, Mapping):
+            view = value if isinstance(value, CooccurrenceView) else CooccurrenceView.from_dict(value)
+            save('.books', view.book_ids)
+            return {**SharedModelStore._write(directory, name, view.matrix), 'kind': 'cooccurrence'}
+        if sparse.issparse(value):
+            csr = value.tocsr()
+            save('.data', csr.data)
+            save('.indices', csr.indices)
+            save('.indptr', csr.indptr)
+            return {'kind': 'csr', 'shape': list(csr.shape)}
+        if isinstance(value, pd.DataFrame):
+            save('', value.to_numpy())
+            save('.index', value.index.to_numpy())
+            save('.columns', value.columns.to_numpy())
+            return {'kind': 'frame', 'index_name': value.index.name, 'columns_name': value.columns.name}
+        save('', value)
+        return {'kind': 'array'}
+
+    @staticmethod
+    def _read(directory: str, name: str, spec: Dict):
+        def load(suffix: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f'{name}{suffix}.npy'), mmap_mode='r')
+
+        if spec['kind'] == 'cooccurrence':
+            return CooccurrenceView(load('.books'), SharedModelStore._read(directory, name, {**spec, 'kind': 'csr'}))
+        if spec['kind'] == 'csr':
+            return sparse.csr_matrix((load('.data'), load('.indices'), load('.indptr')), shape=tuple(spec['shape']))
+        if spec['kind'] == 'frame':
+            index = pd.Index(np.asarray(load('.index')), name=spec.get('index_name'))
+            columns = pd.Index(np.asarray(load('.columns')), name=spec.get('columns_name'))
+            return pd.DataFrame(load(''), index=index, columns=columns, copy=False)
+        return load('')
+
+    def _prune(self, current: str):
+        """Remove all but the newest versions (called with the lock held exclusively)"""
+        versions = sorted(
+            entry for entry in os.listdir(self.root)
+            if not entry.startswith('.') and entry != CURRENT_FILE
+            and os.path.isdir(os.path.join(self.root, entry))
+        )
+        for old in versions[:-self.keep_versions]:
+            if old != current:
+                shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
@@ -0,0 +1,163 @@
+"""
+Out-of-core TF-IDF for catalogs too large to vectorize in memory
+Hashing features with document frequencies gathered in a first pass
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+# Columns concatenated into each book's content text
+CONTENT_COLUMNS = ('title', 'author', 'description', 'genres')
+
+# 2^20 hashed features keeps collisions rare for bigram vocabularies
+DEFAULT_N_FEATURES = 1 << 20
+DEFAULT_CHUNK_SIZE = 50000
+
+# A zero-argument callable returning a fresh iterator of book chunks,
+# since fitting has to read the corpus twice
+ChunkSource = Callable[[], Iterable[pd.DataFrame]]
+
+
+def content_text(books_df: pd.DataFrame) -> pd.Series:
+    """Title, author, description and genres joined into one document per book"""
+    text = pd.Series('', index=books_df.index)
+    for i, column in enumerate(CONTENT_COLUMNS):
+        values = books_df[column].fillna('').astype(str) if column in books_df.columns else ''
+        text = text + values if i == 0 else text + ' ' + values
+    return text
+
+
+def csv_chunk_source(path: str, chunksize: int = DEFAULT_CHUNK_SIZE) -> ChunkSource:
+    """Read a books export in chunks of `chunksize` rows"""
+    def chunks():
+        yield from pd.read_csv(path, chunksize=chunksize)
+    return chunks
+
+
+def sql_chunk_source(query: str, con, chunksize: int = DEFAULT_CHUNK_SIZE) -> ChunkSource:
+    """Stream books from a database query (SQLAlchemy engine or DB-API connection)"""
+    def chunks():
+        yield from pd.read_sql(query, con, chunksize=chunksize)
+    return chunks
+
+
+def _hash_texts(vectorizer: HashingVectorizer, texts: List[str]) -> sparse.csr_matrix:
+    return vectorizer.transform(texts).tocsr()
+
+
+def _document_frequency(vectorizer: HashingVectorizer, texts: List[str]) -> np.ndarray:
+    # Hashed CSR rows hold each feature at most once, so counting column
+    # indices counts documents
+    counts = _hash_texts(vectorizer, texts)
+    return np.bincount(counts.indices, minlength=vectorizer.n_features).astype(np.int64)
+
+
+def _bounded_map(executor: Optional[Executor], fn, items: Iterable, window: int) -> Iterator:
+    """Ordered map keeping at most `window` tasks in flight
+
+    Executor.map submits the whole iterable up front, which would read the
+    entire corpus into memory; this only reads ahead `window` chunks.
+    """
+    if executor is None:
+        for item in items:
+            yield fn(item)
+        return
+
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class StreamingTfidfVectorizer:
+    """Two-pass TF-IDF over hashed features
+
+    Pass 1 hashes every chunk and sums document frequencies; pass 2 hashes
+    again, scales by the smoothed IDF and L2-normalizes, matching
+    TfidfVectorizer's defaults. Only the IDF vector is kept, never a
+    vocabulary, so memory is bounded by one chunk per worker plus the output.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES, n_jobs: Optional[int] = None):
+        self.n_features = n_features
+        self.n_jobs = n_jobs
+        self.hashing_vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+        self.idf: Optional[np.ndarray] = None
+        self.n_documents = 0
+
+    def _workers(self) -> int:
+        return self.n_jobs or os.cpu_count() or 1
+
+    def _map_chunks(self, fn, chunk_source: ChunkSource, executor: Optional[Executor]) -> Iterator[Tuple[pd.DataFrame, object]]:
+        chunks = (chunk for chunk in chunk_source() if len(chunk))
+        # Hold each chunk's frame until its result is consumed
+        frames: deque = deque()
+
+        def texts():
+            for chunk in chunks:
+                frames.append(chunk)
+                yield content_text(chunk).tolist()
+
+        for result in _bounded_map(executor, partial(fn, self.hashing_vectorizer), texts(), 2 * self._workers()):
+            yield frames.popleft(), result
+
+    def fit_transform_chunks(
+        self,
+        chunk_source: ChunkSource,
+        keep_columns: Optional[List[str]] = None
+    ) -> Tuple[sparse.csr_matrix, pd.DataFrame]:
+        """Fit IDF weights and vectorize the corpus; returns (matrix, kept columns)"""
+        workers = self._workers()
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            document_frequency = np.zeros(self.n_features, dtype=np.int64)
+            n_documents = 0
+            for frame, df in self._map_chunks(_document_frequency, chunk_source, executor):
+                document_frequency += df
+                n_documents += len(frame)
+
+            self.n_documents = n_documents
+            self.idf = (np.log((1 + n_documents) / (1 + document_frequency)) + 1).astype(np.float64)
+
+            blocks, frames = [], []
+            for frame, counts in self._map_chunks(_hash_texts, chunk_source, executor):
+                blocks.append(self._weight(counts))
+                columns = [c for c in (keep_columns or []) if c in frame.columns]
+                frames.append(frame[columns].reset_index(drop=True))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if not blocks:
+            return sparse.csr_matrix((0, self.n_features)), pd.DataFrame(columns=keep_columns or [])
+        return sparse.vstack(blocks, format='csr'), pd.concat(frames, ignore_index=True)
+
+    def _weight(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        weighted = counts.astype(np.float64)
+        weighted.data *= self.idf[weighted.indices]  # type: ignore[index]
+        return normalize(weighted, norm='l2', copy=False)
+
+    def transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        """Vectorize new documents with the fitted IDF weights"""
+        if self.idf is None:
+            raise ValueError("StreamingTfidfVectorizer is not fitted")
+        return self._weight(_hash_texts(self.hashing_vectorizer, list(texts)))
@@ -5,6 +5,7 @@ Run this to train all 15 recommendation models
 
 import os
 import sys
+import argparse
 import pandas as pd
 import logging
 
@@ -12,6 +13,7 @@ import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from advanced_recommender import AdvancedHybridRecommender
+from ml.text_streaming import DEFAULT_CHUNK_SIZE, csv_chunk_source
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,11 +22,19 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def load_data():
-    """Load books and ratings data"""
+def books_csv_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books.csv')
+
+
+def load_data(streaming=False):
+    """Load books and ratings data
+    
+    In streaming mode descriptions are left on disk; the content model
+    reads them in chunks instead.
+    """
     ml_dir = os.path.dirname(os.path.abspath(__file__))
     
-    books_path = os.path.join(ml_dir, 'books.csv')
+    books_path = books_csv_path()
     ratings_path = os.path.join(ml_dir, 'ratings.csv')
     
     if not os.path.exists(books_path) or not os.path.exists(ratings_path):
@@ -32,7 +42,10 @@ def load_data():
         logger.info("You can export data by calling the /recommend/retrain API endpoint")
         return None, None
     
-    books_df = pd.read_csv(books_path)
+    if streaming:
+        books_df = pd.read_csv(books_path, usecols=lambda col: col != 'description')
+    else:
+        books_df = pd.read_csv(books_path)
     ratings_df = pd.read_csv(ratings_path)
     
     logger.info(f"Loaded {len(books_df)} books and {len(ratings_df)} ratings")
@@ -40,7 +53,8 @@ def load_data():
     return books_df, ratings_df
 
 
-def train_models(books_df, ratings_df):
+def train_models(books_df, ratings_df, streaming=False, chunksize=DEFAULT_CHUNK_SIZE, n_jobs=None,
+                 embedding_dim=None, quantize=False, ann=None, nprobe=None):
     """Train all recommendation models"""
     logger.info("=" * 80)
     logger.info("Starting Advanced Hybrid Recommender Training")
@@ -50,7 +64,12 @@ def train_models(books_df, ratings_df):
     recommender = AdvancedHybridRecommender()
     
     # Train all models
-    recommender.fit(books_df, ratings_df)
+    content_chunks = csv_chunk_source(books_csv_path(), chunksize) if streaming else None
+    recommender.fit(
+        books_df, ratings_df, content_chunks=content_chunks, n_jobs=n_jobs,
+        embedding_dim=embedding_dim, quantize_embeddings=quantize,
+        ann_index=ann, ann_params={'nprobe': nprobe} if nprobe is not None else None
+    )
     
     # Save models
     models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
@@ -117,10 +136,34 @@ def test_recommendations(recommender, books_df, ratings_df):
                 logger.info(f"  {i}. {book['title']} by {book['author']} (Score: {score:.3f})")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the advanced hybrid recommender")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Vectorize book content out of core in chunks (for very large catalogs)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Books per chunk in streaming mode")
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help="Worker processes for streaming vectorization (default: all cores)")
+    parser.add_argument('--embedding-dim', type=int, default=None,
+                        help="Project content vectors to dense LSA embeddings of this size (e.g. 64-256)")
+    parser.add_argument('--quantize', action='store_true',
+                        help="Store the content embeddings as int8")
+    parser.add_argument('--ann', choices=['ivf', 'lsh'], default=None,
+                        help="Build an approximate nearest-neighbor index over the embeddings")
+    parser.add_argument('--nprobe', type=int, default=None,
+                        help="ANN recall/latency knob: IVF cells or LSH extra buckets probed per query")
+    return parser.parse_args()
+
+
 def main():
     """Main training function"""
+    args = parse_args()
+    if args.ann and not args.embedding_dim:
+        logger.error("--ann requires --embedding-dim")
+        return
+    
     # Load data
-    books_df, ratings_df = load_data()
+    books_df, ratings_df = load_data(streaming=args.streaming)
     
     if books_df is None or ratings_df is None:
         logger.error("Failed to load data. Exiting.")
@@ -135,7 +178,12 @@ def main():
         logger.warning("Low number of ratings (< 20). Recommendations may not be optimal.")
     
     # Train models
-    recommender = train_models(books_df, ratings_df)
+    recommender = train_models(
+        books_df, ratings_df,
+        streaming=args.streaming, chunksize=args.chunksize, n_jobs=args.n_jobs,
+        embedding_dim=args.embedding_dim, quantize=args.quantize,
+        ann=args.ann, nprobe=args.nprobe
+    )
     
     # Test recommendations
     test_recommendations(recommender, books_df, ratings_df)
@@ -0,0 +1,144 @@
+"""
+Incrementally maintained, time-decayed trending counters
+Uses forward exponential decay so each rating write is an O(1) update
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Decay lifetime of each trending window, in hourly buckets
+TRENDING_WINDOWS = {
+    '1d': 24,
+    '7d': 24 * 7,
+    '30d': 24 * 30
+}
+DEFAULT_TRENDING_WINDOW = '7d'
+
+# Rebase scores before exp() of the landmark offset can overflow
+MAX_DECAY_EXPONENT = 50.0
+
+
+def to_hour_bucket(timestamp: Optional[datetime] = None) -> int:
+    """Hourly bucket index (hours since the epoch) of a timestamp, default now
+
+    Naive timestamps (as stored by the database) are taken as UTC, matching `seed`.
+    """
+    if timestamp is None:
+        seconds = time.time()
+    elif timestamp.tzinfo is None:
+        seconds = timestamp.replace(tzinfo=timezone.utc).timestamp()
+    else:
+        seconds = timestamp.timestamp()
+    return int(seconds // 3600)
+
+
+class TrendingCounters:
+    """Exponentially decayed per-book counters with an incrementally kept top-N
+
+    Every rating adds `rating / 5` to the book's score in each window, weighted
+    by exp((hour - landmark) / lifetime). Older events are never touched again:
+    decay relative to "now" is the same factor for every book, so ranking on
+    the stored values is exact and scores only ever grow between rebases.
+    That lets the top-N of each window be kept with a constant-size update.
+    """
+
+    def __init__(self, windows: Optional[Dict[str, int]] = None, top_n: int = 100):
+        self.windows = dict(windows or TRENDING_WINDOWS)
+        self.top_n = top_n
+        self.landmark_hour = to_hour_bucket()
+        self.scores: Dict[str, Dict[int, float]] = {w: {} for w in self.windows}
+        self.top: Dict[str, Dict[int, float]] = {w: {} for w in self.windows}
+        self._ranked: Dict[str, Optional[List[Tuple[int, float]]]] = {w: None for w in self.windows}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return max((len(scores) for scores in self.scores.values()), default=0)
+
+    def seed(self, ratings_df: pd.DataFrame):
+        """Bulk-load counters from a ratings frame with a created_at column"""
+        if len(ratings_df) == 0 or 'created_at' not in ratings_df.columns:
+            return
+
+        created = pd.to_datetime(ratings_df['created_at'], errors='coerce', utc=True)
+        valid = created.notna().to_numpy()
+        if not valid.any():
+            return
+
+        hours = (
+            (created[valid] - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(hours=1)
+        ).to_numpy(dtype=np.int64)
+        book_ids = ratings_df['book_id'].to_numpy()[valid]
+        weights = ratings_df['rating'].to_numpy(dtype=float)[valid] / 5.0
+
+        with self._lock:
+            self.landmark_hour = max(self.landmark_hour, int(hours.max()))
+            for window, lifetime in self.windows.items():
+                decayed = weights * np.exp((hours - self.landmark_hour) / lifetime)
+                totals = pd.Series(decayed).groupby(book_ids).sum()
+                self.scores[window] = {int(b): float(s) for b, s in totals.items()}
+                self.top[window] = {int(b): float(s) for b, s in totals.nlargest(self.top_n).items()}
+                self._ranked[window] = None
+
+    def record(self, book_id: int, rating: float, timestamp: Optional[datetime] = None):
+        """Count one rating write"""
+        hour = to_hour_bucket(timestamp)
+        with self._lock:
+            if (hour - self.landmark_hour) / min(self.windows.values()) > MAX_DECAY_EXPONENT:
+                self._rebase(hour)
+
+            for window, lifetime in self.windows.items():
+                weight = (rating / 5.0) * math.exp((hour - self.landmark_hour) / lifetime)
+                score = self.scores[window].get(book_id, 0.0) + weight
+                self.scores[window][book_id] = score
+                self._update_top(window, book_id, score)
+
+    def _update_top(self, window: str, book_id: int, score: float):
+        """Keep the window's top-N membership current after a score increase"""
+        top = self.top[window]
+        if book_id in top or len(top) < self.top_n:
+            top[book_id] = score
+        else:
+            weakest = min(top, key=top.__getitem__)
+            if score <= top[weakest]:
+                return
+            del top[weakest]
+            top[book_id] = score
+        self._ranked[window] = None
+
+    def _rebase(self, hour: int):
+        """Move the landmark forward, scaling stored scores so nothing overflows"""
+        for window, lifetime in self.windows.items():
+            factor = math.exp((self.landmark_hour - hour) / lifetime)
+            self.scores[window] = {b: s * factor for b, s in self.scores[window].items() if s * factor > 0.0}
+            self.top[window] = {b: s * factor for b, s in self.top[window].items()}
+            self._ranked[window] = None
+        self.landmark_hour = hour
+
+    def get_top(self, window: str = DEFAULT_TRENDING_WINDOW, n: int = 10) -> List[Tuple[int, float]]:
+        """Top-N trending books of a window with scores normalized to [0, 1]"""
+        if window not in self.windows:
+            window = DEFAULT_TRENDING_WINDOW
+        ranked = self._ranked[window]
+        if ranked is None:
+            with self._lock:
+                top = sorted(self.top[window].items(), key=lambda x: x[1], reverse=True)
+                best = top[0][1] if top and top[0][1] > 0 else 1.0
+                ranked = [(book_id, score / best) for book_id, score in top]
+                self._ranked[window] = ranked
+        return ranked[:n]